@@ -14,6 +14,9 @@ The following packages and modules are included:
 :mod:`~sapphire.api`
     publicdb api interface
 
+:mod:`~sapphire.cache`
+    cache responses from the public database
+
 :mod:`~sapphire.clusters`
     definitions for HiSPARC detectors, stations and clusters
 
@@ -50,6 +53,9 @@ The following packages and modules are included:
 :mod:`~sapphire.transformations`
     transformations between different systems
 
+:mod:`~sapphire.transport`
+    shared HTTP client for the public database
+
 :mod:`~sapphire.utils`
     commonly used functions such as a progressbar
 
@@ -58,6 +64,7 @@ The following packages and modules are included:
 from . import (
     analysis,
     api,
+    cache,
     clusters,
     corsika,
     data,
@@ -69,6 +76,7 @@ from . import (
     storage,
     time_util,
     transformations,
+    transport,
     utils,
 )
 from .analysis.calibration import DetermineStationTimingOffsets, determine_detector_timing_offsets
@@ -84,7 +92,7 @@ from .analysis.process_events import (
     ProcessWeather,
     ProcessWeatherFromSource,
 )
-from .analysis.process_traces import DataReduction, MeanFilter, TraceObservables
+from .analysis.process_traces import BatchTraceObservables, DataReduction, MeanFilter, TraceObservables
 from .analysis.reconstructions import (
     ReconstructESDCoincidences,
     ReconstructESDEvents,
@@ -94,7 +102,15 @@ from .analysis.time_deltas import ProcessTimeDeltas
 from .api import Network, Station
 from .clusters import HiSPARCNetwork, HiSPARCStations, ScienceParkCluster
 from .corsika.corsika_queries import CorsikaQuery
-from .esd import download_coincidences, download_data, download_lightning, load_data, quick_download
+from .esd import (
+    download_array,
+    download_coincidences,
+    download_data,
+    download_lightning,
+    download_many,
+    load_data,
+    quick_download,
+)
 from .simulations.groundparticles import GroundParticlesSimulation, MultipleGroundParticlesSimulation
 from .simulations.ldf import KascadeLdfSimulation, NkgLdfSimulation
 from .simulations.showerfront import ConeFrontSimulation, FlatFrontSimulation
@@ -105,6 +121,7 @@ from .transformations.clock import datetime_to_gps, gps_to_datetime
 __all__ = [
     'analysis',
     'api',
+    'cache',
     'clusters',
     'corsika',
     'data',
@@ -116,6 +133,7 @@ __all__ = [
     'storage',
     'time_util',
     'transformations',
+    'transport',
     'utils',
     'determine_detector_timing_offsets',
     'DetermineStationTimingOffsets',
@@ -131,6 +149,7 @@ __all__ = [
     'ProcessSingles',
     'ProcessSinglesFromSource',
     'TraceObservables',
+    'BatchTraceObservables',
     'MeanFilter',
     'DataReduction',
     'ReconstructESDEvents',
@@ -145,8 +164,10 @@ __all__ = [
     'CorsikaQuery',
     'quick_download',
     'load_data',
+    'download_array',
     'download_data',
     'download_lightning',
+    'download_many',
     'download_coincidences',
     'GroundParticlesSimulation',
     'MultipleGroundParticlesSimulation',
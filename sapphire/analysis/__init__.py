@@ -54,6 +54,9 @@ Modules in this package:
 :mod:`~sapphire.analysis.time_deltas`
     determine time deltas for station pairs
 
+:mod:`~sapphire.analysis.trace_store`
+    read traces and store them in a binary format
+
 """
 
 from . import (
@@ -70,6 +73,7 @@ from . import (
     reconstructions,
     signal_calibration,
     time_deltas,
+    trace_store,
 )
 
 __all__ = [
@@ -86,4 +90,5 @@ __all__ = [
     'reconstructions',
     'signal_calibration',
     'time_deltas',
+    'trace_store',
 ]
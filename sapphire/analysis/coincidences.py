@@ -36,8 +36,6 @@ import os.path
 import numpy as np
 import tables
 
-from progressbar import ETA, Bar, Percentage, ProgressBar
-
 from .. import storage
 from ..utils import pbar
 from . import process_events
@@ -207,11 +205,11 @@ class Coincidences:
             events.
 
         """
-        c_index, timestamps = self._search_coincidences(window, shifts, limit)
-        timestamps = np.array(timestamps, dtype=np.uint64)
+        timestamps, offsets, indices = self._find_coincidences(window, shifts, limit)
+        timestamps = np.column_stack([timestamps[field] for field in timestamps.dtype.names]).astype(np.uint64)
         self.data.create_array(self.coincidence_group, '_src_timestamps', timestamps)
         src_c_index = self.data.create_vlarray(self.coincidence_group, '_src_c_index', tables.UInt32Atom())
-        for coincidence in c_index:
+        for coincidence in self._iter_coincidences(offsets, indices):
             src_c_index.append(coincidence)
 
     def process_events(self, overwrite=None):
@@ -349,6 +347,23 @@ class Coincidences:
             station which measured the event, and finally an index into that
             station's event table.
 
+        """
+        timestamps, offsets, indices = self._find_coincidences(window, shifts, limit)
+        coincidences = [coincidence.tolist() for coincidence in self._iter_coincidences(offsets, indices)]
+
+        return coincidences, timestamps.tolist()
+
+    def _find_coincidences(self, window=10_000, shifts=None, limit=None):
+        """Search for coincidences using arrays
+
+        See :meth:`_search_coincidences`, which returns the same results as
+        lists.
+
+        :return: timestamps, offsets and indices.  The timestamps are a
+            structured array as returned by :meth:`_retrieve_timestamp_array`,
+            offsets and indices as returned by
+            :meth:`_search_coincidence_arrays`.
+
         """
         # get the 'events' tables from the groups or groupnames
         event_tables = []
@@ -357,10 +372,23 @@ class Coincidences:
             if 'events' in station_group:
                 event_tables.append(self.data.get_node(station_group, 'events'))
 
-        timestamps = self._retrieve_timestamps(event_tables, shifts, limit)
-        coincidences = self._do_search_coincidences(timestamps, window)
+        timestamps = self._retrieve_timestamp_array(event_tables, shifts, limit)
+        offsets, indices = self._search_coincidence_arrays(timestamps['timestamp'], window)
+
+        return timestamps, offsets, indices
+
+    def _iter_coincidences(self, offsets, indices):
+        """Iterate over the coincidences found by :meth:`_search_coincidence_arrays`
 
-        return coincidences, timestamps
+        A progressbar is shown if progress is enabled.
+
+        :return: iterator over arrays with the indexes into the timestamps
+            array of the events making up each coincidence.
+
+        """
+        bounds = zip(offsets[:-1].tolist(), offsets[1:].tolist())
+        for start, stop in pbar(bounds, length=len(offsets) - 1, show=self.progress):
+            yield indices[start:stop]
 
     def _retrieve_timestamps(self, event_tables, shifts=None, limit=None):
         """Retrieve all timestamps from all stations, optionally shifting them
@@ -381,30 +409,48 @@ class Coincidences:
             station which measured the event, and finally an index of the
             event into the station's event table.
 
+        """
+        return self._retrieve_timestamp_array(event_tables, shifts, limit).tolist()
+
+    def _retrieve_timestamp_array(self, event_tables, shifts=None, limit=None):
+        """Retrieve all timestamps from all stations in a sorted array
+
+        The timestamps of all stations are merged using a stable sort, so
+        events with the same timestamp are ordered by station and then by
+        their index into the station's event table.  See
+        :meth:`_retrieve_timestamps`.
+
+        :return: structured array with the fields timestamp, station and
+            index.
+
         """
         # calculate the shifts in nanoseconds and cast them to int.
         # (prevent upcasting timestamps to float64 further on)
         if shifts is not None:
             shifts = [int(shift * 1_000_000_000) if shift is not None else shift for shift in shifts]
 
-        timestamps = []
+        dtype = [('timestamp', np.uint64), ('station', np.uint64), ('index', np.uint64)]
+        station_timestamps = [np.empty(0, dtype=dtype)]
         for s_id, event_table in enumerate(event_tables):
-            ts = [(x, s_id, j) for j, x in enumerate(event_table.col('ext_timestamp')[:limit])]
+            ts = np.asarray(event_table.col('ext_timestamp')[:limit], dtype=np.uint64)
             try:
                 # shift data. carefully avoid upcasting (we're adding two
-                # ints, which is an int, and casting that back to uint64. if
-                # we're not careful, an intermediate value will be a float64,
-                # which doesn't hold the precision to store nanoseconds.
-                ts = [(np.uint64(int(x) + shifts[i]), i, j) for x, i, j in ts]
+                # ints as uint64. if we're not careful, an intermediate value
+                # will be a float64, which doesn't hold the precision to
+                # store nanoseconds.  Negative shifts wrap around.)
+                ts = ts + np.uint64(shifts[s_id] % 2**64)
             except (TypeError, IndexError):
                 # shift is None or doesn't exist
                 pass
-            timestamps.extend(ts)
-
-        # sort the timestamps
-        timestamps.sort()
+            timestamps = np.empty(len(ts), dtype=dtype)
+            timestamps['timestamp'] = ts
+            timestamps['station'] = s_id
+            timestamps['index'] = np.arange(len(ts))
+            station_timestamps.append(timestamps)
 
-        return timestamps
+        # sort the timestamps, the stations are already in order
+        timestamps = np.concatenate(station_timestamps)
+        return timestamps[np.argsort(timestamps['timestamp'], kind='stable')]
 
     def _do_search_coincidences(self, timestamps, window):
         """Search for coincidences in a set of timestamps
@@ -424,44 +470,52 @@ class Coincidences:
             making up the coincidence
 
         """
-        coincidences = []
+        ts = np.array([timestamp[0] for timestamp in timestamps], dtype=np.uint64)
+        offsets, indices = self._search_coincidence_arrays(ts, window)
+        return [coincidence.tolist() for coincidence in self._iter_coincidences(offsets, indices)]
 
-        # traverse all timestamps
-        prev_coincidence = []
+    @staticmethod
+    def _search_coincidence_arrays(timestamps, window):
+        """Search for coincidences in an array of sorted timestamps
 
-        if self.progress and len(timestamps):
-            pbar = ProgressBar(max_value=len(timestamps), widgets=[Percentage(), Bar(), ETA()]).start()
+        Each event starts a coincidence with all following events within
+        the time window.  Since the timestamps are sorted, these are the
+        events up to the end of the window, which is found using
+        :func:`numpy.searchsorted`.  Coincidences consisting of a single
+        event, or which are part of the previous coincidence, are skipped.
 
-        for i in range(len(timestamps)):
-            # build coincidence, starting with the current timestamp
-            c = [i]
-            t0 = timestamps[i][0]
-
-            # traverse the rest of the timestamps
-            for j in range(i + 1, len(timestamps)):
-                # if a timestamp is within the coincidence window, add it
-                if timestamps[j][0] - t0 < window:
-                    c.append(j)
-                else:
-                    # coincidence window has passed, break for-loop
-                    break
-
-            # if we have more than one event in the coincidence, save it
-            if len(c) > 1:
-                # is this coincidence part of the previous coincidence?
-                is_part_of_prev = np.array([u in prev_coincidence for u in c]).all()
-                if not is_part_of_prev:
-                    # no, so it's a new one
-                    coincidences.append(c)
-                    prev_coincidence = c
-
-            if self.progress and not i % 5000:
-                pbar.update(i)
+        :param timestamps: sorted array of timestamps.
+        :param window: the time window in nanoseconds which will be searched
+            for coincidences.
 
-        if self.progress and len(timestamps):
-            pbar.finish()
+        :return: offsets and indices.  The indexes into the timestamps
+            array of the events making up the n-th coincidence are
+            ``indices[offsets[n]:offsets[n + 1]]``.
 
-        return coincidences
+        """
+        timestamps = np.asarray(timestamps, dtype=np.uint64)
+        # Time differences are integers, so d < window equals d < ceil(window)
+        window = max(int(np.ceil(window)), 0)
+        starts = np.arange(len(timestamps))
+        stops = np.maximum(np.searchsorted(timestamps, timestamps + np.uint64(window), side='left'), starts + 1)
+
+        # The window ends never decrease, so a coincidence is part of the
+        # previous coincidence if it ends at the same event.
+        is_coincidence = stops - starts > 1
+        starts = starts[is_coincidence]
+        stops = stops[is_coincidence]
+        is_new = np.ones(len(stops), dtype=bool)
+        is_new[1:] = stops[1:] != stops[:-1]
+        starts = starts[is_new]
+        stops = stops[is_new]
+
+        lengths = stops - starts
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Consecutive indexes from each start
+        indices = np.arange(offsets[-1]) - np.repeat(offsets[:-1] - starts, lengths)
+
+        return offsets, indices
 
     def __repr__(self):
         if not self.data.isopen:
@@ -18,7 +18,7 @@ reconstructed theta and phi coordinates.
 
 import warnings
 
-from itertools import combinations, zip_longest
+from itertools import combinations, repeat, zip_longest
 
 import numpy as np
 
@@ -122,15 +122,35 @@ class EventDirectionReconstruction:
         """
         if initials is None:
             initials = []
+        if isinstance(offsets, Station) and hasattr(events, 'col'):
+            # Look up the offsets for all events at once
+            event_offsets = self._detector_offsets_for_timestamps(offsets, events.col('timestamp'))
+        else:
+            event_offsets = repeat(offsets)
         events = pbar(events, show=progress)
-        events_init = zip_longest(events, initials)
-        angles = [self.reconstruct_event(event, detector_ids, offsets, initial) for event, initial in events_init]
+        events_init = zip(zip_longest(events, initials), event_offsets)
+        angles = [
+            self.reconstruct_event(event, detector_ids, event_offset, initial)
+            for (event, initial), event_offset in events_init
+        ]
         if len(angles):
             theta, phi, ids = zip(*angles)
         else:
             theta, phi, ids = ((), (), ())
         return theta, phi, ids
 
+    @staticmethod
+    def _detector_offsets_for_timestamps(station, timestamps):
+        """Get the detector timing offsets for many timestamps
+
+        :param station: :class:`~sapphire.api.Station` object.
+        :param timestamps: array of event timestamps.
+        :return: list with the offsets of each detector for each timestamp.
+
+        """
+        offsets = station.detector_timing_offset_array(timestamps)
+        return np.column_stack([offsets[f'offset{detector_id}'] for detector_id in range(1, 5)]).tolist()
+
     def __repr__(self):
         return '<%s, station: %r, direct: %r, fit: %r>' % (self.__class__.__name__, self.station, self.direct, self.fit)
 
@@ -28,10 +28,14 @@ Example usage::
 
 """
 
-import operator
 import os
 import warnings
-import zlib
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from math import ceil
+from multiprocessing import get_context
 
 import numpy as np
 import tables
@@ -40,6 +44,15 @@ from ..api import Station
 from ..utils import ERR, pbar
 from .find_mpv import FindMostProbableValueInSpectrum
 from .process_traces import ADC_HIGH_THRESHOLD, ADC_LOW_THRESHOLD, ADC_TIME_PER_SAMPLE
+from .trace_store import (  # noqa: F401
+    TRACE_DTYPE,
+    TRACE_PAD,
+    TraceStore,
+    decode_trace,
+    decode_traces,
+    pad_traces,
+    trace_cache,
+)
 
 ADC_THRESHOLD = 20  #: Threshold for arrival times, relative to the baseline
 ADC_LIMIT = 2**12
@@ -51,6 +64,81 @@ TRIGGER_2 = (2, 0, False, 0)
 #: 3 low or 2 high, no external
 TRIGGER_4 = (3, 2, True, 0)
 
+#: Estimated memory in bytes used for intermediate results of an event
+EVENT_OVERHEAD = 512
+#: Number of events of which the traces are processed at once
+TRACES_CHUNKSIZE = 1_000
+
+
+def _process_traces_in_worker(cls, state, nodes, start, stop):
+    """Process the traces of a range of events in a worker process
+
+    A copy of the processing object is created, with the PyTables files
+    and nodes opened read-only.
+
+    :param cls: class of the processing object.
+    :param state: attributes of the processing object, except for the
+        PyTables files and nodes.
+    :param nodes: dictionary with the attribute names of the PyTables files
+        and nodes and their filename and node path (None for files).
+    :param start,stop: range of rows in the source table to process.
+    :return: array with the arrival times of the events.
+
+    """
+    files = {}
+    try:
+        processor = cls.__new__(cls)
+        processor.__dict__.update(state)
+        for name, (filename, path) in nodes.items():
+            if filename not in files:
+                files[filename] = tables.open_file(filename, 'r')
+            setattr(processor, name, files[filename] if path is None else files[filename].get_node(path))
+        return processor._process_traces_in_range(start, stop)
+    finally:
+        for file in files.values():
+            file.close()
+
+
+def _reopen_file(file, mode):
+    """Close a PyTables file and open it again with another mode
+
+    The file is reopened in place, so references to the File object remain
+    valid.  References to nodes of the file need to be retrieved again.
+
+    :param file: open PyTables file.
+    :param mode: mode in which to open the file again.
+
+    """
+    filename = file.filename
+    root_uep = file.root_uep
+    file.close()
+    file.__init__(filename, mode, root_uep=root_uep)
+
+
+def _file_identity(file):
+    """Identify the contents of a PyTables file, for the trace cache
+
+    A file which is rewritten at the same path gets another identity.  The
+    modification time and size of files stored on disk are included, files
+    kept in memory are identified by the File object.
+
+    :param file: open PyTables file.
+    :return: hashable identity of the file.
+
+    """
+    if file.params.get('DRIVER') in (None, 'H5FD_SEC2'):
+        stat = os.stat(file.filename)
+        return (file.filename, stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    return (file.filename, id(file))
+
+
+def _as_trace_array(trace):
+    """Return the trace as array, consuming it if it is an iterator"""
+
+    if isinstance(trace, np.ndarray):
+        return trace
+    return np.array(list(trace))
+
 
 class ProcessEvents:
     """Process HiSPARC events to obtain several observables.
@@ -59,6 +147,12 @@ class ProcessEvents:
     few observables like particle arrival time and number of particles in
     the detector to a copy of the event table.
 
+    When the results are stored in the default destination, the original
+    events are moved to the internal '_events' table and the results are
+    stored in 'events'.  Events which are stored in the group afterwards,
+    and are therefore appended to 'events', are moved to '_events' when
+    the events are processed incrementally.
+
     """
 
     processed_events_description = {
@@ -86,6 +180,13 @@ class ProcessEvents:
         't_trigger': tables.Float32Col(pos=21, dflt=-1),
     }
 
+    #: Columns in which the results of :meth:`process_traces` are stored
+    timing_columns = ('t1', 't2', 't3', 't4')
+
+    #: Cache for the traces returned by :meth:`get_traces_for_event` and
+    #: :meth:`get_traces_for_events`, see :class:`~sapphire.analysis.trace_store.TraceCache`
+    trace_cache = trace_cache
+
     def __init__(self, data, group, source=None, progress=True):
         """Initialize the class.
 
@@ -103,8 +204,20 @@ class ProcessEvents:
         self.source = self._get_source(source)
         self.progress = progress
         self.limit = None
-
-    def process_and_store_results(self, destination=None, overwrite=False, limit=None):
+        self.n_workers = 1
+        self.chunksize = None
+        self.mpv_window = None
+
+    def process_and_store_results(
+        self,
+        destination=None,
+        overwrite=False,
+        limit=None,
+        n_workers=1,
+        max_memory=None,
+        incremental=False,
+        mpv_window=None,
+    ):
         """Process events and store the results.
 
         :param destination: name of the table where the results will be
@@ -112,11 +225,38 @@ class ProcessEvents:
         :param overwrite: if True, overwrite previously obtained results.
         :param limit: the maximum number of events that will be stored.
             The default, None, corresponds to no limit.
+        :param n_workers: number of worker processes used to process the
+            traces, see :meth:`process_traces`.
+        :param max_memory: approximate maximum memory in bytes to use for
+            event data.  The events are then copied, processed and stored
+            in blocks of rows.  The default, None, processes all events at
+            once.
+        :param incremental: if True, only process the events which were
+            added to the source since the previous run and merge them into
+            the previously obtained results.  Events appended to the
+            results of a previous run in place are treated as new source
+            events.  If there are no previous results all events are
+            processed.
+        :param mpv_window: length in seconds of the time windows in which
+            the MPVs of the pulseintegrals are determined separately, for
+            example 86400 for each (UTC) day.  The default, None, uses a
+            single MPV for all events.
 
         """
+        if incremental and limit is not None:
+            raise ValueError('A limit can not be used to process events incrementally.')
+
         self.limit = limit
+        self.n_workers = n_workers
+        self.chunksize = self._get_chunksize(max_memory)
+        self.mpv_window = mpv_window
 
-        self._check_destination(destination, overwrite)
+        self._check_destination(destination, overwrite or incremental)
+
+        results = self._get_processed_results() if incremental else None
+        if results is not None:
+            self._process_and_store_new_results(results)
+            return
 
         self._clean_events_table()
 
@@ -124,20 +264,75 @@ class ProcessEvents:
         self._store_results_from_traces()
         self._store_number_of_particles()
         self._move_results_table_into_destination()
+        if limit is None:
+            self._tmp_events._v_attrs.n_source_events = self._count_source_events()
+
+    def _get_chunksize(self, max_memory):
+        """Get the number of events that fit in the memory budget
+
+        :param max_memory: maximum memory in bytes, or None.
+        :return: number of rows per block, None for no limit.
+
+        """
+        if max_memory is None:
+            return None
+        results_rowsize = tables.Description(self.processed_events_description)._v_dtype.itemsize
+        # Include the intermediate Python objects created for each event
+        rowsize = self.source.rowsize + results_rowsize + EVENT_OVERHEAD
+        return max(1, int(max_memory // rowsize))
+
+    def _row_ranges(self, n_rows):
+        """Divide rows into blocks of at most chunksize rows
+
+        :param n_rows: total number of rows.
+        :return: generator of the start and stop of each block.
+
+        """
+        chunksize = n_rows if self.chunksize is None else self.chunksize
+        for start in range(0, n_rows, max(chunksize, 1)):
+            yield start, min(start + chunksize, n_rows)
+
+    def _n_events(self):
+        """Number of source events to process, taking the limit into account"""
+
+        if self.limit is None:
+            return len(self.source)
+        return min(self.limit, len(self.source))
 
     def get_traces_for_event(self, event):
         """Return the traces from an event.
 
         :param event: a row from the events table.
-        :return: the traces: an array of pulseheight values.
+        :return: the traces: an array of pulseheight values, as 64-bit
+                 integers.
 
         """
-        traces = [list(self._get_trace(idx)) for idx in event['traces'] if idx >= 0]
+        traces = [self._get_trace(idx) for idx in event['traces'] if idx >= 0]
 
         # Make traces follow NumPy conventions
-        traces = np.array(traces).T
+        traces = np.array(traces, dtype=np.int64).T
         return traces
 
+    def get_traces_for_events(self, events):
+        """Return the traces of many events.
+
+        :param events: array of rows from the events table, e.g. from
+            :meth:`tables.Table.read`.
+        :return: the traces: an array with the pulseheight values with
+                 shape (events, samples, detectors), of the compact
+                 :data:`TRACE_DTYPE`.  Missing and shorter traces are
+                 padded with :data:`TRACE_PAD`.
+
+        """
+        trace_idx = np.asarray(events['traces']).reshape(-1, 4)
+        present = trace_idx >= 0
+        decoded = self._get_traces(trace_idx[present])
+
+        traces = np.full(trace_idx.shape + decoded.shape[1:], TRACE_PAD, dtype=TRACE_DTYPE)
+        traces[present] = decoded
+        # Make traces follow NumPy conventions
+        return traces.transpose(0, 2, 1)
+
     def get_traces_for_event_index(self, idx):
         """Return the traces from event #idx.
 
@@ -190,27 +385,51 @@ class ProcessEvents:
         """
         events = self.source
 
-        enumerated_timestamps = list(enumerate(events.col('ext_timestamp')))
-        enumerated_timestamps.sort(key=operator.itemgetter(1))
-
-        unique_sorted_ids = self._find_unique_row_ids(enumerated_timestamps)
+        unique_sorted_ids = self._find_unique_sorted_row_ids(events.col('ext_timestamp'))
 
         new_events = self._replace_table_with_selected_rows(events, unique_sorted_ids)
         self.source = new_events
         self._normalize_event_ids(new_events)
 
     def _find_unique_row_ids(self, enumerated_timestamps):
-        """Find the unique row_ids from enumerated timestamps."""
+        """Find the unique row_ids from enumerated timestamps.
+
+        :param enumerated_timestamps: list of (row_id, timestamp) tuples,
+            sorted by timestamp.
+        :return: list of row ids of the first row with each timestamp.
+
+        """
+        if not enumerated_timestamps:
+            return []
+        row_ids, timestamps = (np.array(values) for values in zip(*enumerated_timestamps))
+        return row_ids[self._is_first_of_each_timestamp(timestamps)].tolist()
+
+    def _find_unique_sorted_row_ids(self, timestamps):
+        """Find the unique row ids, sorted by timestamp.
 
-        prev_timestamp = 0
-        unique_sorted_ids = []
-        for row_id, timestamp in enumerated_timestamps:
-            if timestamp != prev_timestamp:
-                # event is unique, so add it
-                unique_sorted_ids.append(row_id)
-            prev_timestamp = timestamp
+        For rows with equal timestamps the first row is kept.
 
-        return unique_sorted_ids
+        :param timestamps: array of timestamps of all rows.
+        :return: array of row ids.
+
+        """
+        row_ids = np.argsort(timestamps, kind='stable')
+        return row_ids[self._is_first_of_each_timestamp(timestamps[row_ids])]
+
+    @staticmethod
+    def _is_first_of_each_timestamp(sorted_timestamps):
+        """Mark the first of each run of equal timestamps
+
+        Rows with timestamp 0 are not considered valid.
+
+        :param sorted_timestamps: sorted array of timestamps.
+        :return: boolean array.
+
+        """
+        is_first = np.empty(len(sorted_timestamps), dtype=bool)
+        is_first[:1] = sorted_timestamps[:1] != 0
+        is_first[1:] = sorted_timestamps[1:] != sorted_timestamps[:-1]
+        return is_first
 
     def _replace_table_with_selected_rows(self, table, row_ids):
         """Replace events table with selected rows.
@@ -221,13 +440,23 @@ class ProcessEvents:
 
         """
         tmptable = self.data.create_table(self.group, 't__events', description=table.description)
-        selected_rows = table.read_coordinates(row_ids)
-        tmptable.append(selected_rows)
-        tmptable.flush()
+        self._append_selected_rows(table, row_ids, tmptable)
         self.data.rename_node(tmptable, table.name, overwrite=True)
         return tmptable
 
-    def _normalize_event_ids(self, events):
+    def _append_selected_rows(self, table, row_ids, destination):
+        """Append selected rows of a table to another table, in blocks.
+
+        :param table: original table.
+        :param row_ids: row ids of the selected rows.
+        :param destination: table to which the rows are appended.
+
+        """
+        for start, stop in self._row_ranges(len(row_ids)):
+            destination.append(table.read_coordinates(row_ids[start:stop]))
+        destination.flush()
+
+    def _normalize_event_ids(self, events, start=0):
         """Normalize event ids.
 
         After sorting, the event ids no longer correspond to the row
@@ -236,10 +465,214 @@ class ProcessEvents:
         the row id.
 
         :param events: the events table to normalize.
+        :param start: first row to normalize, preceding rows are assumed
+            to be normalized already.
+
+        """
+        for block_start, block_stop in self._row_ranges(len(events) - start):
+            events.modify_column(
+                start + block_start,
+                start + block_stop,
+                column=np.arange(start + block_start, start + block_stop),
+                colname='event_id',
+            )
+
+    def _get_processed_results(self):
+        """Return the table with the results of a previous run
+
+        :return: table object, or None if there are no results which can
+                 be extended incrementally.
+
+        """
+        if self.destination not in self.group:
+            return None
+        results = self.group._f_get_child(self.destination)
+        if 'n_source_events' not in results._v_attrs:
+            return None
+        return results
+
+    def _get_processed_events(self):
+        """Return the sorted and deduplicated copy of the source events"""
+
+        return self.source
+
+    def _count_source_events(self):
+        """Number of rows in the source which have been processed"""
+
+        return len(self.source)
+
+    def _process_and_store_new_results(self, results):
+        """Process the new events and merge them into previous results.
+
+        Only the source rows added since the previous run are processed.
+        The new events are deduplicated, also against the previously
+        processed events, and sorted.  The events and the results are then
+        merged into the sorted tables of the previous run.  The number of
+        particles of the new events is estimated using the MPVs of all
+        events, previous results are not updated.
+
+        :param results: table with the results of the previous run.
+
+        """
+        source = self.source
+        events = self._get_processed_events()
+        n_processed = int(results._v_attrs.n_source_events)
+        if events is source:
+            self._move_rows_appended_to_results(results, n_processed)
+        n_previous = len(results)
+
+        previous_timestamps = events.read(stop=n_previous, field='ext_timestamp')
+        new_row_ids, insert_at = self._find_new_row_ids(source, n_processed, previous_timestamps)
+
+        file = results._v_file
+        group = results._v_parent
+        new_events = self._create_temporary_table(file, group, '_t_new_events', events.description)
+        self._append_selected_rows(source, new_row_ids, new_events)
+        if events is source:
+            # The new rows are merged back in sorted order
+            events.truncate(n_previous)
+
+        mpvs = self._determine_mpvs([events, new_events])
+        # The nodes are retrieved again after processing the traces, since
+        # the files may be reopened for the worker processes
+        paths = [(node._v_file, node._v_pathname) for node in (source, events, results, new_events)]
+        self.source = new_events
+        try:
+            self._tmp_events = self._create_temporary_table(
+                file,
+                group,
+                '_t_new_results',
+                self.processed_events_description,
+                length=len(new_events),
+            )
+            self._copy_events_into_table()
+            self._store_results_from_traces()
+            self._store_number_of_particles(mpvs)
+        finally:
+            source, events, results, new_events = (node_file.get_node(path) for node_file, path in paths)
+            self.source = source
+
+        events = self._merge_sorted_rows(events, new_events, insert_at)
+        results = self._merge_sorted_rows(results, self._tmp_events, insert_at)
+        file.remove_node(new_events)
+        file.remove_node(self._tmp_events)
+        self._tmp_events = results
+
+        self.source = events
+        results._v_attrs.n_source_events = self._count_source_events()
+
+    def _move_rows_appended_to_results(self, results, n_results):
+        """Move rows appended to the results in place to the source
+
+        After processing in place the results replace the 'events' table,
+        so new events, for example from a later download, are appended to
+        the results.  Those rows are appended to the source instead, where
+        they are processed as new events.
+
+        :param results: table with the results of the previous run.
+        :param n_results: number of rows of the results of the previous run.
+
+        """
+        if len(results) <= n_results:
+            return
+
+        for start, stop in self._row_ranges(len(results) - n_results):
+            rows = results.read(n_results + start, n_results + stop)
+            new_events = np.empty(len(rows), dtype=self.source.dtype)
+            for name in new_events.dtype.names:
+                new_events[name] = rows[name]
+            self.source.append(new_events)
+        self.source.flush()
+        results.truncate(n_results)
+
+    def _find_new_row_ids(self, source, start, previous_timestamps):
+        """Find the unique row ids of new events, sorted by ext_timestamp.
+
+        :param source: table containing the events.
+        :param start: first row of the new events.
+        :param previous_timestamps: sorted ext_timestamps of previously
+            processed events.
+        :return: row ids of the unique new events and for each of them the
+                 row of the previously processed events before which it
+                 should be inserted.
 
         """
-        row_ids = list(range(len(events)))
-        events.modify_column(column=row_ids, colname='event_id')
+        ext_timestamps = source.read(start, field='ext_timestamp')
+        row_ids = self._find_unique_sorted_row_ids(ext_timestamps)
+        ext_timestamps = ext_timestamps[row_ids]
+
+        insert_at = previous_timestamps.searchsorted(ext_timestamps)
+        if len(previous_timestamps):
+            matches = previous_timestamps[np.minimum(insert_at, len(previous_timestamps) - 1)]
+            is_new = matches != ext_timestamps
+            row_ids = row_ids[is_new]
+            insert_at = insert_at[is_new]
+
+        return start + row_ids, insert_at
+
+    def _create_temporary_table(self, file, group, name, description, length=0):
+        """Create a table, replacing a leftover table with the same name
+
+        :param file,group: the PyTables file and group in which to create
+            the table.
+        :param name: name of the table.
+        :param description: description of the table.
+        :param length: number of rows with default values to add.
+        :return: table object
+
+        """
+        if name in group:
+            file.remove_node(group, name)
+        table = file.create_table(group, name, description, expectedrows=length)
+
+        for _ in range(length):
+            table.row.append()
+        table.flush()
+
+        return table
+
+    def _merge_sorted_rows(self, table, new_rows, insert_at):
+        """Merge new rows into a table and normalize the event ids.
+
+        :param table: table in which the rows are merged.
+        :param new_rows: table containing the new rows.
+        :param insert_at: for each new row, the row of the table before
+            which it is inserted.  The new rows are in sorted order.
+        :return: the merged table.
+
+        """
+        n_rows = len(table)
+        if not len(insert_at) or insert_at[0] == n_rows:
+            # All new rows come after the existing rows
+            self._append_rows(new_rows, 0, len(new_rows), table)
+            self._normalize_event_ids(table, n_rows)
+            return table
+
+        merged = self._create_temporary_table(table._v_file, table._v_parent, '_t_merged', table.description)
+        positions, first = np.unique(insert_at, return_index=True)
+        previous = 0
+        for position, start, stop in zip(positions, first, [*first[1:], len(insert_at)]):
+            self._append_rows(table, previous, position, merged)
+            self._append_rows(new_rows, start, stop, merged)
+            previous = position
+        self._append_rows(table, previous, n_rows, merged)
+        table._v_attrs._f_copy(merged)
+
+        table._v_file.rename_node(merged, table.name, overwrite=True)
+        self._normalize_event_ids(merged, int(positions[0]))
+        return merged
+
+    def _append_rows(self, table, start, stop, destination):
+        """Append a range of rows of a table to another table, in blocks.
+
+        :param table: original table.
+        :param start,stop: range of rows to append.
+        :param destination: table to which the rows are appended.
+
+        """
+        for block_start, block_stop in self._row_ranges(stop - start):
+            destination.append(table.read(start + block_start, start + block_stop))
+        destination.flush()
 
     def _create_results_table(self):
         """Create results table containing the events."""
@@ -268,174 +701,467 @@ class ProcessEvents:
     def _copy_events_into_table(self):
         table = self._tmp_events
         source = self.source
+        ranges = list(self._row_ranges(self._n_events()))
 
         for col in pbar(source.colnames, show=self.progress):
-            table.modify_column(stop=self.limit, colname=col, column=getattr(source.cols, col)[: self.limit])
+            column = getattr(source.cols, col)
+            for start, stop in ranges:
+                table.modify_column(start, stop, colname=col, column=column[start:stop])
         table.flush()
 
     def _store_results_from_traces(self):
-        table = self._tmp_events
+        with self._worker_pool():
+            for start, stop in self._row_ranges(self._n_events()):
+                timings = self.process_traces(start, stop)
+
+                # Assign values to the rows of the block, column-wise.  The
+                # table is retrieved again, the file may have been reopened.
+                table = self._tmp_events
+                for idx, col in enumerate(self.timing_columns):
+                    table.modify_column(start, stop, column=timings[:, idx], colname=col)
+        self._tmp_events.flush()
+
+    def process_traces(self, start=0, stop=None):
+        """Process traces to yield pulse timing information.
 
-        timings = self.process_traces()
+        If :attr:`n_workers` is larger than 1, the events are divided in
+        ranges of rows which are processed by separate worker processes.
+        The workers are started using the 'spawn' method, so scripts using
+        this need an ``if __name__ == '__main__':`` guard.  HDF5 does not
+        allow other processes to open files which are opened for writing,
+        so those files are reopened read-only while the workers run, see
+        :meth:`_read_only_files`.  Nodes of those files which were
+        retrieved before need to be retrieved again afterwards.
 
-        # Assign values to full table, column-wise.
-        for idx in range(4):
-            col = 't%d' % (idx + 1)
-            table.modify_column(column=timings[:, idx], colname=col)
-        table.flush()
+        :param start,stop: range of events to process, by default all
+            events up to the limit.
 
-    def process_traces(self):
-        """Process traces to yield pulse timing information."""
+        """
+        if stop is None:
+            stop = self._n_events()
 
-        if self.limit is not None:
-            events = self.source.iterrows(stop=self.limit)
-        else:
-            events = self.source
+        if self.n_workers > 1:
+            return self._process_traces_in_parallel(start, stop)
 
-        timings = self._process_traces_from_event_list(events, length=self.limit)
-        return timings
+        return self._process_traces_in_range(start, stop)
 
-    def _process_traces_from_event_list(self, events, length=None):
-        """Process traces from a list of events.
+    def _process_traces_in_range(self, start, stop):
+        """Process the traces of a range of events in the source.
 
-        This is the method looping over all events.
+        The traces of each block of events are processed at once, see
+        :meth:`_reconstruct_times_from_traces`.
 
-        :param events: an iterable of the events
-        :param length: an indication of the number of events, for use as a
-            progress bar.  Optional.
+        :param start,stop: range of events to process.
 
         """
-        result = []
-        for event in pbar(events, length=length, show=self.progress):
-            timings = self._reconstruct_time_from_traces(event)
-            result.append(timings)
-        timings = np.array(result)
+        timings = []
+        for block_start in pbar(range(start, stop, TRACES_CHUNKSIZE), show=self.progress):
+            events = self.source.read(block_start, min(block_start + TRACES_CHUNKSIZE, stop))
+            timings.append(
+                self._reconstruct_times_from_traces(events['baseline'], events['pulseheights'], events['traces']),
+            )
+        if not timings:
+            return np.array([])
+        return np.concatenate(timings)
+
+    def _process_traces_in_parallel(self, start, stop):
+        """Process traces using multiple worker processes.
+
+        :param start,stop: range of events to process.
+        :return: the same timings as the serial processing.
+
+        """
+        n_events = stop - start
+        if n_events <= 0:
+            return np.array([])
+        chunksize = ceil(n_events / (4 * self.n_workers))
+        starts = range(start, stop, chunksize)
+        stops = [min(chunk_start + chunksize, stop) for chunk_start in starts]
+
+        with self._worker_pool(), self._read_only_files():
+            state = {}
+            nodes = {}
+            for name, value in self.__dict__.items():
+                if isinstance(value, tables.File):
+                    nodes[name] = (value.filename, None)
+                elif isinstance(value, tables.Node):
+                    nodes[name] = (value._v_file.filename, value._v_pathname)
+                elif name not in ('_executor', '_trace_store'):
+                    state[name] = value
+            state['progress'] = False
+            state['n_workers'] = 1
+
+            worker = partial(_process_traces_in_worker, self.__class__, state, nodes)
+            chunks = self._executor.map(worker, starts, stops)
+            timings = np.concatenate(list(pbar(chunks, length=len(stops), show=self.progress)))
 
         return timings
 
+    @contextmanager
+    def _worker_pool(self):
+        """Start worker processes, if needed, and reuse them within this context"""
+
+        if self.n_workers <= 1 or getattr(self, '_executor', None) is not None:
+            yield
+            return
+
+        with ProcessPoolExecutor(self.n_workers, mp_context=get_context('spawn')) as executor:
+            self._executor = executor
+            try:
+                yield
+            finally:
+                self._executor = None
+
+    @contextmanager
+    def _read_only_files(self):
+        """Reopen the files which are opened for writing read-only
+
+        HDF5 keeps an exclusive lock on files which are opened for writing,
+        such that other processes can not open them.  Within this context
+        those files are flushed and reopened read-only, so that the worker
+        processes can open them for reading.  Afterwards they are reopened
+        in their original mode.  The files are reopened in place, and the
+        nodes stored as attributes of this object are retrieved again.
+        Files which are not stored on disk by the default driver are left
+        alone.
+
+        """
+        nodes = {name: value for name, value in self.__dict__.items() if isinstance(value, tables.Node)}
+        files = {value for value in self.__dict__.values() if isinstance(value, tables.File)}
+        files.update(node._v_file for node in nodes.values())
+        modes = {
+            file: 'a' if file.mode == 'w' else file.mode
+            for file in files
+            if file.mode != 'r' and file.params.get('DRIVER') in (None, 'H5FD_SEC2')
+        }
+        if not modes:
+            yield
+            return
+
+        paths = {name: (node._v_file, node._v_pathname) for name, node in nodes.items()}
+
+        def reopen(mode=None):
+            for file, original_mode in modes.items():
+                _reopen_file(file, mode or original_mode)
+            for name, (file, pathname) in paths.items():
+                setattr(self, name, file.get_node(pathname))
+            self.__dict__.pop('_trace_store', None)
+
+        for file in modes:
+            file.flush()
+        reopen('r')
+        try:
+            yield
+        finally:
+            reopen()
+
     def _reconstruct_time_from_traces(self, event):
         """Reconstruct arrival times for a single event.
 
-        This method loops over the traces.
+        The traces are processed by :meth:`_reconstruct_times_from_traces`.
 
         :param event: row from the events table.
         :return: arrival times in the detectors relative to trace start
                  in ns.
 
         """
-        timings = []
-        for baseline, pulseheight, trace_idx in zip(event['baseline'], event['pulseheights'], event['traces']):
-            if pulseheight < 0:
-                # retain -1, -999 status flags in timing
-                timings.append(pulseheight)
-            elif pulseheight < ADC_THRESHOLD:
-                timings.append(-999)
-            else:
-                trace = self._get_trace(trace_idx)
-                timings.append(self._reconstruct_time_from_trace(trace, baseline))
-        timings = [time * ADC_TIME_PER_SAMPLE if time not in ERR else time for time in timings]
-        return timings
+        timings = self._reconstruct_times_from_traces([event['baseline']], [event['pulseheights']], [event['traces']])
+        return timings[0].tolist()
+
+    def _reconstruct_times_from_traces(self, baselines, pulseheights, trace_idx):
+        """Reconstruct arrival times for many events.
+
+        The traces of all detectors with a significant pulse are decoded
+        and processed at once by :meth:`_reconstruct_times_from_trace_block`.
+
+        :param baselines,pulseheights,trace_idx: arrays with the baseline,
+            pulseheight and trace index of each detector of each event.
+        :return: array with the arrival times in the detectors of each
+                 event relative to trace start in ns.
+
+        """
+        baselines = np.asarray(baselines, dtype=np.int64)
+        pulseheights = np.asarray(pulseheights, dtype=np.int64)
+        trace_idx = np.asarray(trace_idx)
+
+        # retain -1, -999 status flags in timing
+        timings = np.where(pulseheights < 0, pulseheights, -999).astype(np.float64)
+        event_idx, detector_idx = np.nonzero(pulseheights >= ADC_THRESHOLD)
+        if len(event_idx):
+            traces = pad_traces(self._read_traces(trace_idx[event_idx, detector_idx]))
+            timings[event_idx, detector_idx] = self._reconstruct_times_from_trace_block(
+                traces,
+                baselines[event_idx, detector_idx],
+            )
+        return np.where(np.isin(timings, ERR), timings, timings * ADC_TIME_PER_SAMPLE)
 
     def _get_trace(self, idx):
         """Returns a trace given an index into the blobs array.
 
-        Decompress a trace from the blobs array.
+        Read the trace from the trace store if available, otherwise
+        decompress it from the blobs array.  Recently used traces are
+        taken from :attr:`trace_cache`.
 
         :param idx: index into the blobs array
-        :return: iterator over the pulseheight values
+        :return: array with the pulseheight values, read-only when cached
+
+        """
+        group = self._get_trace_group()
+        key = (_file_identity(group._v_file), group._v_pathname, int(idx))
+        trace = self.trace_cache.get(key)
+        if trace is None:
+            trace = self._read_trace(idx)
+            self.trace_cache.put(key, trace)
+        return trace
+
+    def _read_trace(self, idx):
+        """Read and decode a trace given an index into the blobs array."""
+
+        trace_store = self._get_trace_store()
+        if trace_store is not None:
+            return trace_store[idx]
+        blobs = self._get_blobs()
+        return decode_trace(blobs[idx])
+
+    def _get_traces(self, indices):
+        """Returns many traces given indexes into the blobs array.
+
+        Traces which are not in :attr:`trace_cache` are read at once.
+
+        :param indices: indexes into the blobs array.
+        :return: 2D array with a row for each trace, padded with
+                 :data:`TRACE_PAD`.
+
+        """
+        group = self._get_trace_group()
+        file_identity = _file_identity(group._v_file)
+        keys = [(file_identity, group._v_pathname, int(idx)) for idx in indices]
+        traces = [self.trace_cache.get(key) for key in keys]
+        missing = [i for i, trace in enumerate(traces) if trace is None]
+        if missing:
+            for i, trace in zip(missing, self._read_traces([indices[i] for i in missing])):
+                self.trace_cache.put(keys[i], trace)
+                traces[i] = trace
+        return pad_traces(traces)
+
+    def _read_traces(self, indices):
+        """Read and decode many traces given indexes into the blobs array.
+
+        The traces are not cached, this is used to process all traces.
 
         """
+
+        trace_store = self._get_trace_store()
+        if trace_store is not None:
+            return trace_store.read_traces(indices)
         blobs = self._get_blobs()
+        return [decode_trace(blobs[idx]) for idx in indices]
 
-        try:
-            trace = zlib.decompress(blobs[idx]).decode('utf-8').split(',')
-        except zlib.error:
-            trace = zlib.decompress(blobs[idx][1:-1]).decode('utf-8').split(',')
-        if trace[-1] == '':
-            del trace[-1]
-        trace = (int(x) for x in trace)
-        return trace
+    def _get_trace_store(self):
+        """Return the binary trace store, or None if it is not available
+
+        See :mod:`~sapphire.analysis.trace_store`.
+
+        """
+        if not hasattr(self, '_trace_store'):
+            self._trace_store = TraceStore.from_group(self._get_trace_group())
+        return self._trace_store
+
+    def _get_trace_group(self):
+        """Return the group containing the traces"""
+
+        return self.group
 
     def _get_blobs(self):
-        return self.group.blobs
+        return self._get_trace_group().blobs
 
     def _reconstruct_time_from_trace(self, trace, baseline):
         """Reconstruct time of measurement from a trace.
 
-        This method is doing the hard work.
+        The trace is processed as a block of one trace by
+        :meth:`_reconstruct_times_from_trace_block`, which subclasses
+        override to change the timing method.
 
         :param trace: array containing pulseheight values.
         :param baseline: baseline of the trace.
         :return: index in trace for arrival time of first particle.
 
         """
-        threshold = baseline + ADC_THRESHOLD
-        value = self.first_above_threshold(trace, threshold)
+        value = self._reconstruct_times_from_trace_block(_as_trace_array(trace)[np.newaxis], [baseline])[0]
 
         return value
 
+    def _reconstruct_times_from_trace_block(self, traces, baselines):
+        """Reconstruct time of measurement from many traces at once.
+
+        :param traces: 2D array with a trace in each row, padded with
+                       :data:`TRACE_PAD`.
+        :param baselines: array with the baseline of each trace.
+        :return: array with the index in each trace for the arrival time
+                 of the first particle, -999 if not found.
+
+        """
+        thresholds = np.asarray(baselines, dtype=np.int64) + ADC_THRESHOLD
+        return self._first_above_thresholds_in_block(traces, thresholds)
+
+    @staticmethod
+    def _first_above_thresholds_in_block(traces, thresholds):
+        """Find the first element in each trace equal or above its threshold
+
+        :param traces: 2D array with a trace in each row.
+        :param thresholds: array with the threshold for each trace.
+        :return: array with the index in each trace where a value is
+                 greater or equal to the threshold, -999 if there is none.
+
+        """
+        above = traces >= np.asarray(thresholds)[:, np.newaxis]
+        if not above.shape[1]:
+            return np.full(len(above), -999, dtype=np.int64)
+        idx = above.argmax(axis=1)
+        return np.where(above[np.arange(len(above)), idx], idx, -999)
+
     @staticmethod
     def first_above_threshold(trace, threshold):
         """Find the first element in the list equal or above threshold
 
         If no element matches the condition -999 will be returned.
 
-        :param trace: iterable trace.
+        :param trace: array or iterable trace.
         :param threshold: value the trace has to be greater or equal to.
         :return: index in trace where a value is greater or equal to
                  threshold.
 
         """
-        return next((i for i, x in enumerate(trace) if x >= threshold), -999)
+        above = _as_trace_array(trace) >= threshold
+        if not above.size:
+            return -999
+        idx = int(above.argmax())
+        if not above[idx]:
+            return -999
+        return idx
 
-    def _store_number_of_particles(self):
+    def _store_number_of_particles(self, mpvs=None):
         """Store number of particles in the detectors.
 
         Process all pulseintegrals from the events and estimate the number
         of particles in each detector.
 
+        :param mpvs: time windows and MPVs, as returned by
+            :meth:`_determine_mpvs`.  Determined from all events if not
+            given.
+
         """
         table = self._tmp_events
 
-        n_particles = self._process_pulseintegrals()
-        for idx in range(4):
-            col = 'n%d' % (idx + 1)
-            table.modify_column(column=n_particles[:, idx], colname=col)
+        if mpvs is None:
+            mpvs = self._determine_mpvs()
+        for start, stop in self._row_ranges(self._n_events()):
+            n_particles = self._process_pulseintegrals(start, stop, mpvs)
+            table.modify_columns(start, stop, columns=list(n_particles.T), names=['n1', 'n2', 'n3', 'n4'])
         table.flush()
 
-    def _process_pulseintegrals(self):
+    def _get_mpv_windows(self, timestamps):
+        """Get the time window of each event for determining MPVs
+
+        :param timestamps: array of event timestamps.
+        :return: array with the window number of each event, all 0 if
+                 :attr:`mpv_window` is None.
+
+        """
+        if self.mpv_window is None:
+            return np.zeros(len(timestamps), dtype=np.int64)
+        return timestamps.astype(np.int64) // self.mpv_window
+
+    def _determine_mpvs(self, sources=None):
+        """Find the MPV of the pulseintegrals of each detector
+
+        The histograms of the pulseintegrals are built from all events in
+        the source, in blocks of rows.  If :attr:`mpv_window` is set, a
+        histogram is made for each time window.
+
+        :param sources: tables containing the events, by default only the
+            source.
+        :return: sorted array of time windows and an array with for each
+                 time window the MPV of each detector, nan if it could not
+                 be determined.
+
+        """
+        bins = np.linspace(0, 50_000, 201)
+        n_bins = len(bins) - 1
+        histograms = {}
+        n_valid = {}
+
+        if sources is None:
+            sources = [self.source]
+        for source in sources:
+            for start, stop in self._row_ranges(len(source)):
+                windows = self._get_mpv_windows(source.read(start, stop, field='timestamp'))
+                integrals = source.read(start, stop, field='integrals')
+                block_windows, window_idx = np.unique(windows, return_inverse=True)
+
+                # Histogram all detectors in all windows at once
+                idx = window_idx.reshape(-1, 1) * 4 + np.arange(4)
+                bin_idx = np.minimum(np.searchsorted(bins, integrals, side='right') - 1, n_bins - 1)
+                in_range = (integrals >= bins[0]) & (integrals <= bins[-1])
+                size = len(block_windows) * 4
+                block_histograms = np.bincount(idx[in_range] * n_bins + bin_idx[in_range], minlength=size * n_bins)
+                block_n_valid = np.bincount(idx[integrals >= 0], minlength=size)
+
+                for window, window_histograms, window_n_valid in zip(
+                    block_windows,
+                    block_histograms.reshape(-1, 4, n_bins),
+                    block_n_valid.reshape(-1, 4),
+                ):
+                    histograms[window] = histograms.get(window, 0) + window_histograms
+                    n_valid[window] = n_valid.get(window, 0) + window_n_valid
+
+        windows = np.array(sorted(histograms), dtype=np.int64)
+        all_mpv = [
+            [self._find_mpv(n, bins) if valid else np.nan for n, valid in zip(histograms[window], n_valid[window])]
+            for window in windows
+        ]
+        return windows, np.array(all_mpv).reshape(-1, 4)
+
+    @staticmethod
+    def _find_mpv(n, bins):
+        """Fit the MPV of a pulseintegral histogram
+
+        :return: the MPV, or nan if the fit failed.
+
+        """
+        find_mpv = FindMostProbableValueInSpectrum(n, bins)
+        mpv, is_fitted = find_mpv.find_mpv()
+        if is_fitted:
+            return mpv
+        else:
+            return np.nan
+
+    def _process_pulseintegrals(self, start=0, stop=None, mpvs=None):
         """Find MPVs using pulseintegrals to estimate number of particles
 
+        :param start,stop: range of events, by default all events up to
+            the limit.
+        :param mpvs: time windows and MPVs, as returned by
+            :meth:`_determine_mpvs`.  Determined from all events if not
+            given.
         :return: array with estimated number of particles per detector per
                  event.
 
         """
-        n_particles = []
+        if stop is None:
+            stop = self.limit
+        if mpvs is None:
+            mpvs = self._determine_mpvs()
+        windows, all_mpv = mpvs
 
-        integrals = self.source.col('integrals')
-        all_mpv = []
-        for detector_integrals in integrals.T:
-            if (detector_integrals < 0).all():
-                all_mpv.append(np.nan)
-            else:
-                n, bins = np.histogram(detector_integrals, bins=np.linspace(0, 50_000, 201))
-                find_mpv = FindMostProbableValueInSpectrum(n, bins)
-                mpv, is_fitted = find_mpv.find_mpv()
-                if is_fitted:
-                    all_mpv.append(mpv)
-                else:
-                    all_mpv.append(np.nan)
-        all_mpv = np.array(all_mpv)
-
-        for event in self.source[: self.limit]:
-            pulseintegrals = event['integrals']
-            # retain -1, -999 status flags
-            pulseintegrals = np.where(pulseintegrals >= 0, pulseintegrals / all_mpv, pulseintegrals)
-            # if mpv fit failed, value is nan.  Make it -999
-            pulseintegrals = np.where(np.isnan(pulseintegrals), -999, pulseintegrals)
-            n_particles.append(pulseintegrals)
-
-        return np.array(n_particles)
+        integrals = self.source.read(start, stop, field='integrals')
+        event_windows = self._get_mpv_windows(self.source.read(start, stop, field='timestamp'))
+        event_mpv = all_mpv[np.searchsorted(windows, event_windows)]
+
+        # retain -1, -999 status flags
+        n_particles = np.where(integrals >= 0, integrals / event_mpv, integrals)
+        # if mpv fit failed, value is nan.  Make it -999
+        return np.where(np.isnan(n_particles), -999, n_particles)
 
     def _move_results_table_into_destination(self):
         if self.source.name == 'events':
@@ -501,14 +1227,18 @@ class ProcessIndexedEvents(ProcessEvents):
     def process_traces(self):
         """Process traces to yield pulse timing information.
 
-        This method makes use of the indexes to build a list of events.
+        This method makes use of the indexes to read blocks of events.
 
         """
-        events = self.source.itersequence(self.indexes)
-        length = len(self.indexes)
-        timings = self._process_traces_from_event_list(events, length=length)
-
-        return timings
+        timings = []
+        for start in pbar(range(0, len(self.indexes), TRACES_CHUNKSIZE), show=self.progress):
+            events = self.source.read_coordinates(self.indexes[start : start + TRACES_CHUNKSIZE])
+            timings.append(
+                self._reconstruct_times_from_traces(events['baseline'], events['pulseheights'], events['traces']),
+            )
+        if not timings:
+            return np.array([])
+        return np.concatenate(timings)
 
     def get_traces_for_indexed_event_index(self, idx):
         idx = self.indexes[idx]
@@ -523,30 +1253,31 @@ class ProcessEventsWithLINT(ProcessEvents):
 
     """
 
-    def _reconstruct_time_from_trace(self, trace, baseline):
-        """Reconstruct time of measurement from a trace (LINT timings).
+    def _reconstruct_times_from_trace_block(self, traces, baselines):
+        """Reconstruct time of measurement from many traces (LINT timings).
 
-        This method is doing the hard work.
+        The arrival time is interpolated linearly between the samples
+        before and after crossing the threshold.
 
-        :param trace: array containing pulseheight values.
-        :param baseline: baseline of the trace
-        :return: arrival time
+        :param traces: 2D array with a trace in each row, padded with
+                       :data:`TRACE_PAD`.
+        :param baselines: array with the baseline of each trace.
+        :return: array with the arrival times in samples, -999 if the
+                 threshold was not crossed.
 
         """
-        threshold = baseline + ADC_THRESHOLD
-        trace = list(trace)
-        i = self.first_above_threshold(trace, threshold)
+        thresholds = np.asarray(baselines, dtype=np.int64) + ADC_THRESHOLD
+        idx = self._first_above_thresholds_in_block(traces, thresholds)
 
-        if i == 0:
-            value = i
-        elif i != -999:
-            x0, x1 = i - 1, i
-            y0, y1 = trace[x0], trace[x1]
-            value = 1.0 * (threshold - y0) / (y1 - y0) + x0
-        else:
-            value = -999
+        values = np.where(idx == 0, 0.0, -999.0)
+        rows = np.flatnonzero(idx > 0)
+        x1 = idx[rows]
+        x0 = x1 - 1
+        y0 = traces[rows, x0].astype(np.int64)
+        y1 = traces[rows, x1].astype(np.int64)
+        values[rows] = 1.0 * (thresholds[rows] - y0) / (y1 - y0) + x0
 
-        return value
+        return values
 
 
 class ProcessIndexedEventsWithLINT(ProcessIndexedEvents, ProcessEventsWithLINT):
@@ -623,30 +1354,137 @@ class ProcessEventsWithTriggerOffset(ProcessEvents):
                 raise ValueError('No trigger settings available')
         else:
             self.station = Station(station)
+        self._event_triggers = None
+        self._event_triggers_start = 0
 
-    def _store_results_from_traces(self):
-        table = self._tmp_events
+    timing_columns = ('t1', 't2', 't3', 't4', 't_trigger')
 
-        timings = self.process_traces()
+    def process_traces(self, start=0, stop=None):
+        """Process traces to yield pulse timing information.
 
-        # Assign values to full table, column-wise.
-        for idx in range(4):
-            col = 't%d' % (idx + 1)
-            table.modify_column(column=timings[:, idx], colname=col)
-        table.modify_column(column=timings[:, 4], colname='t_trigger')
-        table.flush()
+        If a station is given, the trigger settings for all events are
+        looked up at once, instead of for each event.
+
+        :param start,stop: range of events to process, by default all
+            events up to the limit.
+
+        """
+        if stop is None:
+            stop = self._n_events()
+        if self.station is not None:
+            self._event_triggers = self._get_event_triggers(start, stop)
+            self._event_triggers_start = start
+        try:
+            timings = super().process_traces(start, stop)
+        finally:
+            self._event_triggers = None
+        return timings
+
+    def _process_traces_in_range(self, start, stop):
+        """Process the traces of a range of events in blocks of events
+
+        The traces of each block of events are processed at once, see
+        :meth:`_reconstruct_times_from_traces`.
+
+        :param start,stop: range of events to process.
+
+        """
+        timings = []
+        for block_start in pbar(range(start, stop, TRACES_CHUNKSIZE), show=self.progress):
+            events = self.source.read(block_start, min(block_start + TRACES_CHUNKSIZE, stop))
+            thresholds, triggers = self._get_trigger_settings(events, block_start)
+            timings.append(
+                self._reconstruct_times_from_traces(
+                    events['baseline'],
+                    events['pulseheights'],
+                    events['traces'],
+                    thresholds,
+                    triggers,
+                ),
+            )
+        if not timings:
+            return np.array([])
+        return np.concatenate(timings)
+
+    def _get_trigger_settings(self, events, start):
+        """Get the thresholds and trigger settings for a block of events
+
+        :param events: array of events from the source.
+        :param start: row number of the first event in the source.
+        :return: array with the low and high threshold of each detector,
+                 shape (events, 4, 2), and array with the trigger settings
+                 (n_low, n_high, and_or, external) of each event.
+
+        """
+        n_events = len(events)
+        if self._event_triggers is not None:
+            offset = start - self._event_triggers_start
+            settings = self._event_triggers[offset : offset + n_events]
+            thresholds = np.stack(
+                [
+                    [settings[f'{threshold}{detector_id}'] for threshold in ('low', 'high')]
+                    for detector_id in range(1, 5)
+                ],
+            ).transpose(2, 0, 1)
+            triggers = np.column_stack(
+                [settings[trigger_option] for trigger_option in ('n_low', 'n_high', 'and_or', 'external')],
+            )
+        elif self.station is not None:
+            thresholds = []
+            triggers = []
+            for timestamp in events['timestamp']:
+                try:
+                    event_thresholds, event_trigger = self.station.trigger(timestamp)
+                except Exception:
+                    warnings.warn('Unknown trigger settings, not reconstructing trigger offset.')
+                    # Do not reconstruct t_trigger by pretending external trigger.
+                    event_thresholds, event_trigger = [(ADC_LIMIT, ADC_LIMIT)] * 4, [0, 0, 0, 1]
+                thresholds.append(event_thresholds)
+                triggers.append(event_trigger)
+        else:
+            thresholds = [self.thresholds] * n_events
+            triggers = [self.trigger] * n_events
+        return (
+            np.array(thresholds, dtype=np.int64).reshape(n_events, 4, 2),
+            np.array(triggers, dtype=np.int64).reshape(n_events, 4),
+        )
+
+    def _get_event_triggers(self, start=0, stop=None):
+        """Get the trigger settings valid for each event in the source
+
+        :param start,stop: range of events, by default all events up to
+            the limit.
+        :return: array with the trigger settings for each row in the range
+                 of the source table, or None if the settings are not
+                 available.
+
+        """
+        if stop is None:
+            stop = self.limit
+        timestamps = self.source.read(start, stop, field='timestamp')
+        try:
+            return self.station.trigger_array(timestamps)
+        except Exception:
+            # Fall back to looking up the settings for each event
+            return None
 
     def _reconstruct_time_from_traces(self, event):
         """Reconstruct arrival times for a single event.
 
-        This method loops over the traces.
+        The traces are processed by :meth:`_reconstruct_times_from_traces`.
 
         :param event: row from the events table.
         :return: arrival times in the detectors and trigger time
                  relative to start of trace in ns
 
         """
-        if self.station is not None:
+        if self._event_triggers is not None:
+            settings = self._event_triggers[event.nrow - self._event_triggers_start]
+            self.thresholds = [
+                [settings[f'{threshold}{detector_id}'] for threshold in ('low', 'high')] for detector_id in range(1, 5)
+            ]
+            self.trigger = [settings[trigger_option] for trigger_option in ('n_low', 'n_high', 'and_or', 'external')]
+        elif self.station is not None:
             timestamp = event['timestamp']
             try:
                 self.thresholds, self.trigger = self.station.trigger(timestamp)
@@ -655,106 +1493,111 @@ class ProcessEventsWithTriggerOffset(ProcessEvents):
                 # Do not reconstruct t_trigger by pretending external trigger.
                 self.trigger = [0, 0, 0, 1]
 
-        n_low, n_high, and_or, external = self.trigger
-
-        if external:
-            # Do not reconstruct thresholds if external trigger is involved
-            self.thresholds = [(ADC_LIMIT, ADC_LIMIT)] * 4
-
-        timings = []
-        low_idx = []
-        high_idx = []
-        for baseline, pulseheight, trace_idx, trig_thresholds in zip(
-            event['baseline'],
-            event['pulseheights'],
-            event['traces'],
-            self.thresholds,
-        ):
-            if pulseheight < 0:
-                # Retain -1 and -999 status flags in timing
-                timings.append(pulseheight)
-                low_idx.append(-999)
-                high_idx.append(-999)
-                continue
-            if pulseheight < ADC_THRESHOLD or baseline > trig_thresholds[0]:
-                # No significant pulse or bad baseline
-                timings.append(-999)
-                low_idx.append(-999)
-                high_idx.append(-999)
-                continue
-
-            max_signal = baseline + pulseheight
-            adc_threshold = baseline + ADC_THRESHOLD
-
-            thresholds = [adc_threshold]
-            # Only include if needed for trigger and large enough signal
-            if n_low and max_signal >= trig_thresholds[0]:
-                thresholds.append(trig_thresholds[0])
-            else:
-                thresholds.append(ADC_LIMIT)
-            if n_high and max_signal >= trig_thresholds[1]:
-                thresholds.append(trig_thresholds[1])
-            else:
-                thresholds.append(ADC_LIMIT)
+        timings = self._reconstruct_times_from_traces(
+            [event['baseline']],
+            [event['pulseheights']],
+            [event['traces']],
+            [self.thresholds],
+            [self.trigger],
+        )
+        return timings[0].tolist()
 
-            trace = self._get_trace(trace_idx)
+    def _reconstruct_times_from_traces(self, baselines, pulseheights, trace_idx, thresholds, triggers):
+        """Reconstruct arrival times and trigger times for many events.
 
-            time, low, high = self._first_above_thresholds(trace, thresholds, max_signal)
-            timings.append(time)
-            low_idx.append(low)
-            high_idx.append(high)
+        The traces of all events are processed at once using array
+        operations.
 
-        t_trigger = self._reconstruct_trigger(low_idx, high_idx)
-        timings.append(t_trigger)
+        :param baselines,pulseheights,trace_idx: arrays with the baseline,
+            pulseheight and trace index of each detector of each event.
+        :param thresholds: array with the low and high trigger threshold
+            of each detector of each event.
+        :param triggers: array with the trigger settings (n_low, n_high,
+            and_or, external) of each event.
+        :return: array with for each event the arrival times in the
+                 detectors and trigger time relative to start of trace in ns
 
-        timings = [time * ADC_TIME_PER_SAMPLE if time not in ERR else time for time in timings]
-        return timings
+        """
+        baselines = np.asarray(baselines, dtype=np.int64)
+        pulseheights = np.asarray(pulseheights, dtype=np.int64)
+        trace_idx = np.asarray(trace_idx)
+        triggers = np.asarray(triggers, dtype=np.int64)
+        n_low, n_high, external = triggers[:, 0:1], triggers[:, 1:2], triggers[:, 3:4].astype(bool)
+
+        # Do not reconstruct thresholds if external trigger is involved
+        thresholds = np.where(external[:, :, None], ADC_LIMIT, np.asarray(thresholds, dtype=np.int64))
+        low, high = thresholds[..., 0], thresholds[..., 1]
+
+        # No significant pulse or bad baseline
+        has_pulse = (pulseheights >= ADC_THRESHOLD) & (baselines <= low)
+        max_signal = baselines + pulseheights
+
+        # Only look for trigger thresholds if needed for trigger and large
+        # enough signal
+        search = np.stack(
+            [
+                baselines + ADC_THRESHOLD,
+                np.where((n_low > 0) & (max_signal >= low), low, ADC_LIMIT),
+                np.where((n_high > 0) & (max_signal >= high), high, ADC_LIMIT),
+            ],
+            axis=-1,
+        )
+        search_idx = np.full(search.shape, -999, dtype=np.int64)
+        event_idx, detector_idx = np.nonzero(has_pulse)
+        if len(event_idx):
+            traces = pad_traces(self._read_traces(trace_idx[event_idx, detector_idx]))
+            if traces.size:
+                above = traces[:, None, :] >= search[event_idx, detector_idx][:, :, None]
+                first = above.argmax(axis=-1)
+                found = above.any(axis=-1) & (
+                    max_signal[event_idx, detector_idx][:, None] >= search[event_idx, detector_idx]
+                )
+                search_idx[event_idx, detector_idx] = np.where(found, first, -999)
+
+        # Retain -1 and -999 status flags in timing
+        timings = np.where(pulseheights < 0, pulseheights, search_idx[..., 0])
+        t_trigger = self._reconstruct_triggers(search_idx[..., 1], search_idx[..., 2], triggers)
+        timings = np.column_stack([timings, t_trigger])
+
+        return np.where(np.isin(timings, ERR), timings, timings * ADC_TIME_PER_SAMPLE)
 
     @classmethod
     def _first_above_thresholds(cls, trace, thresholds, max_signal):
         """Check for multiple thresholds when the traces crosses it
 
-        First the thresholds are sorted to make sure they are looked for
-        in the correct order, because the trace is a generator you can
-        not go back. The results will match the original order.
+        Thresholds above the expected maximum value are not looked for.
 
-        :param trace: generator over the trace.
-        :param thresholds: list of three thresholds.
+        :param trace: array or iterable trace.
+        :param thresholds: list of up to three thresholds.
         :param max_signal: expected max value in trace, based on
                            baseline and pulseheight.
         :return: list with three indexes into the trace for the three
                  thresholds.
 
         """
+        trace = _as_trace_array(trace)
         results = [-999, -999, -999]
-        ordered_thresholds = sorted((x, i) for i, x in enumerate(thresholds))
-        last_value = None
-        t = 0
-
-        for threshold, i in ordered_thresholds:
-            if max_signal < threshold:
-                break
-            elif last_value is not None and last_value >= threshold:
-                results[i] = t
-            else:
-                if last_value is not None:
-                    t += 1
-                t, last_value = cls._first_value_above_threshold(trace, threshold, t)
-                results[i] = t
+        for i, threshold in enumerate(thresholds):
+            if max_signal >= threshold:
+                results[i] = cls.first_above_threshold(trace, threshold)
         return results
 
-    @staticmethod
-    def _first_value_above_threshold(trace, threshold, t=0):
+    @classmethod
+    def _first_value_above_threshold(cls, trace, threshold, t=0):
         """Find the first element in the list equal or above threshold
 
-        :param trace: iterable trace.
+        :param trace: array or iterable trace.
         :param threshold: value the trace has to be greater or equal to.
         :param t: index of first value in trace.
         :return: index in trace where a value is greater or equal to
                  threshold, and the value.
 
         """
-        return next(((i, x) for i, x in enumerate(trace, t) if x >= threshold), (-999, 0))
+        trace = _as_trace_array(trace)
+        idx = cls.first_above_threshold(trace, threshold)
+        if idx == -999:
+            return -999, 0
+        return idx + t, trace[idx]
 
     def _reconstruct_trigger(self, low_idx, high_idx):
         """Reconstruct the moment of trigger from the threshold info
@@ -764,37 +1607,62 @@ class ProcessEventsWithTriggerOffset(ProcessEvents):
         :return: index in trace where the trigger happened.
 
         """
-        n_low, n_high, and_or, external = self.trigger
+        t_trigger = self._reconstruct_triggers([low_idx], [high_idx], [self.trigger])
+        return int(t_trigger[0])
 
-        # External trigger not supported
-        if external:
-            return -999
+    @staticmethod
+    def _reconstruct_triggers(low_idx, high_idx, triggers):
+        """Reconstruct the moment of trigger for many events
 
-        low_idx = sorted(idx for idx in low_idx if idx != -999)
-        high_idx = sorted(idx for idx in high_idx if idx != -999)
+        :param low_idx,high_idx: arrays with for each event the trace
+                                 indexes when the detectors crossed a
+                                 given threshold, -999 if they did not.
+        :param triggers: array with the trigger settings (n_low, n_high,
+            and_or, external) of each event.
+        :return: array with the index in trace where the trigger happened
+                 for each event.
 
-        if and_or:
+        """
+        low_idx = np.asarray(low_idx, dtype=np.int64)
+        high_idx = np.asarray(high_idx, dtype=np.int64)
+        n_low, n_high, and_or, external = np.asarray(triggers, dtype=np.int64).T
+        and_or = and_or.astype(bool)
+
+        def nth_crossing(idx, n):
+            """Get the n-th crossing of each event, and if there is one"""
+
+            is_crossing = idx != -999
+            idx = np.sort(np.where(is_crossing, idx, np.iinfo(np.int64).max), axis=1)
+            nth = np.take_along_axis(idx, np.clip(n - 1, 0, idx.shape[1] - 1)[:, None], axis=1)[:, 0]
+            return nth, (n > 0) & (is_crossing.sum(axis=1) >= n)
+
+        low, has_low = nth_crossing(low_idx, n_low)
+        high, has_high = nth_crossing(high_idx, n_high)
+        low_and_high, has_low_and_high = nth_crossing(low_idx, n_low + n_high)
+
+        conditions = [
+            # External trigger not supported
+            external.astype(bool),
             # low or high, which ever is first
-            if n_low and n_high and len(low_idx) >= n_low and len(high_idx) >= n_high:
-                return min(low_idx[n_low - 1], high_idx[n_high - 1])
-            elif n_high and len(high_idx) >= n_high:
-                return high_idx[n_high - 1]
-            elif n_low and len(low_idx) >= n_low:
-                return low_idx[n_low - 1]
-        elif n_low and n_high:
+            and_or & has_low & has_high,
+            and_or & has_high,
+            and_or & has_low,
             # low and high
-            if len(low_idx) >= n_low + n_high and len(high_idx) >= n_high:
-                return max(low_idx[n_low + n_high - 1], high_idx[n_high - 1])
-        elif n_high:
-            # 0 low and high
-            if len(high_idx) >= n_high:
-                return high_idx[n_high - 1]
-        elif n_low:
-            # low and 0 high
-            if len(low_idx) >= n_low:
-                return low_idx[n_low - 1]
-
-        return -999
+            (n_low > 0) & (n_high > 0),
+            # 0 low and high, or low and 0 high
+            ~and_or & has_high,
+            ~and_or & has_low,
+        ]
+        choices = [
+            -999,
+            np.minimum(low, high),
+            high,
+            low,
+            np.where(has_low_and_high & has_high, np.maximum(low_and_high, high), -999),
+            high,
+            low,
+        ]
+        return np.select(conditions, choices, default=-999)
 
     def __repr__(self):
         if not self.data.isopen:
@@ -849,6 +1717,9 @@ class ProcessEventsFromSource(ProcessEvents):
 
         self.progress = progress
         self.limit = None
+        self.n_workers = 1
+        self.chunksize = None
+        self.mpv_window = None
 
     def _get_or_create_group(self, file, group):
         """Get or create a group in the datafile"""
@@ -884,9 +1755,7 @@ class ProcessEventsFromSource(ProcessEvents):
 
         """
         new_events = self.dest_file.create_table(self.dest_group, '_events', description=table.description)
-        selected_rows = table.read_coordinates(row_ids)
-        new_events.append(selected_rows)
-        new_events.flush()
+        self._append_selected_rows(table, row_ids, new_events)
         return new_events
 
     def _create_empty_results_table(self):
@@ -914,10 +1783,34 @@ class ProcessEventsFromSource(ProcessEvents):
         """Override, destination is temporary table"""
         self.destination = self._tmp_events
 
-    def _get_blobs(self):
-        """Return blobs node"""
+    def _get_processed_results(self):
+        """Return the table with the results of a previous run
+
+        :return: table object, or None if there are no results which can
+                 be extended incrementally.
 
-        return self.source_group.blobs
+        """
+        if 'events' not in self.dest_group or '_events' not in self.dest_group:
+            return None
+        results = self.dest_group.events
+        if 'n_source_events' not in results._v_attrs:
+            return None
+        return results
+
+    def _get_processed_events(self):
+        """Return the sorted and deduplicated copy of the source events"""
+
+        return self.dest_group._events
+
+    def _count_source_events(self):
+        """Number of rows in the source which have been processed"""
+
+        return len(self._get_source())
+
+    def _get_trace_group(self):
+        """Return the group containing the traces"""
+
+        return self.source_group
 
     def __repr__(self):
         if not self.source_file.isopen or not self.dest_file.isopen:
@@ -964,6 +1857,9 @@ class ProcessEventsFromSourceWithTriggerOffset(ProcessEventsFromSource, ProcessE
 
         self.progress = progress
         self.limit = None
+        self.n_workers = 1
+        self.chunksize = None
+        self.mpv_window = None
 
         if station is None:
             self.station = None
@@ -977,6 +1873,8 @@ class ProcessEventsFromSourceWithTriggerOffset(ProcessEventsFromSource, ProcessE
                 raise ValueError('No trigger settings available')
         else:
             self.station = Station(station)
+        self._event_triggers = None
+        self._event_triggers_start = 0
 
     def __repr__(self):
         if not self.source_file.isopen or not self.dest_file.isopen:
@@ -1068,10 +1966,7 @@ class ProcessDataTable(ProcessEvents):
         """
         data = self.source
 
-        enumerated_timestamps = list(enumerate(data.col('timestamp')))
-        enumerated_timestamps.sort(key=operator.itemgetter(1))
-
-        unique_sorted_ids = self._find_unique_row_ids(enumerated_timestamps)
+        unique_sorted_ids = self._find_unique_sorted_row_ids(data.col('timestamp'))
 
         new_data = self._replace_table_with_selected_rows(data, unique_sorted_ids)
         self.source = new_data
@@ -1086,9 +1981,7 @@ class ProcessDataTable(ProcessEvents):
 
         """
         tmptable = self.data.create_table(self.group, f'_t_{self.table_name}', description=table.description)
-        selected_rows = table.read_coordinates(row_ids)
-        tmptable.append(selected_rows)
-        tmptable.flush()
+        self._append_selected_rows(table, row_ids, tmptable)
         self.data.rename_node(tmptable, self.destination, overwrite=True)
         return tmptable
 
@@ -1122,6 +2015,7 @@ class ProcessDataTableFromSource(ProcessDataTable):
         self.source = self._get_source()
 
         self.progress = progress
+        self.chunksize = None
 
     def _get_source(self):
         """Return the table containing the events.
@@ -1144,9 +2038,7 @@ class ProcessDataTableFromSource(ProcessDataTable):
 
         """
         new_table = self.dest_file.create_table(self.dest_group, self.table_name, description=table.description)
-        selected_rows = table.read_coordinates(row_ids)
-        new_table.append(selected_rows)
-        new_table.flush()
+        self._append_selected_rows(table, row_ids, new_table)
         return new_table
 
     def __repr__(self):
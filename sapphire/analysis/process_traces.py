@@ -6,11 +6,33 @@ algorithms as are implemented in the HiSPARC DAQ.
 The :class:`MeanFilter` is meant to mimic the filter in the HiSPARC DAQ.
 It is reproduced here to make it easy to read the algorithm.
 
+The :class:`BatchTraceObservables` determine the trace observables for
+many events at once, for example to reprocess the traces of a lot of
+events with a different threshold.  Similarly, the ``*_block`` methods of
+the :class:`MeanFilter` and :class:`DataReduction` process many traces at
+once, with the same results as the methods for a single trace.
+
 """
 
 from functools import cached_property
 
-from numpy import around, convolve, ones, where
+from numpy import (
+    around,
+    asarray,
+    concatenate,
+    convolve,
+    empty,
+    full,
+    maximum,
+    minimum,
+    moveaxis,
+    newaxis,
+    ones,
+    result_type,
+    stack,
+    where,
+    zeros,
+)
 
 ADC_TIME_PER_SAMPLE = 2.5  # in ns
 
@@ -73,6 +95,7 @@ class TraceObservables:
         self.missing = [-1] * (4 - self.n)
         if self.n not in [2, 4]:
             raise ValueError('Unsupported number of detectors')
+        self._observables = BatchTraceObservables(traces[newaxis], threshold, padding)
 
     @cached_property
     def baselines(self):
@@ -88,8 +111,7 @@ class TraceObservables:
         :return: the baseline in ADC count.
 
         """
-        baselines = around(self.traces[: self.padding].mean(axis=0))
-        return baselines.astype('int').tolist() + self.missing
+        return self._observables.baselines[0, : self.n].tolist() + self.missing
 
     @cached_property
     def std_dev(self):
@@ -98,8 +120,7 @@ class TraceObservables:
         :return: the standard deviation in milli ADC count.
 
         """
-        std_dev = around(self.traces[: self.padding].std(axis=0) * 1000)
-        return std_dev.astype('int').tolist() + self.missing
+        return self._observables.std_dev[0, : self.n].tolist() + self.missing
 
     @cached_property
     def pulseheights(self):
@@ -108,8 +129,7 @@ class TraceObservables:
         :return: the pulseheights in ADC count.
 
         """
-        pulseheights = self.traces.max(axis=0) - self.baselines[: self.n]
-        return pulseheights.tolist() + self.missing
+        return self._observables.pulseheights[0, : self.n].tolist() + self.missing
 
     @cached_property
     def integrals(self):
@@ -120,13 +140,7 @@ class TraceObservables:
         :return: the pulse integral in ADC count * sample.
 
         """
-        threshold = self.threshold
-        integrals = where(
-            self.traces - self.baselines[: self.n] > threshold,
-            self.traces - self.baselines[: self.n],
-            0,
-        ).sum(axis=0)
-        return integrals.tolist() + self.missing
+        return self._observables.integrals[0, : self.n].tolist() + self.missing
 
     @cached_property
     def n_peaks(self):
@@ -136,38 +150,155 @@ class TraceObservables:
 
         :return: the pulse integral in ADC count * sample.
 
+        """
+        return self._observables.n_peaks[0, : self.n].tolist() + self.missing
+
+
+class BatchTraceObservables:
+    """Reconstruct trace observables for many events at once
+
+    The same observables as determined by :class:`TraceObservables`, but
+    for a block of events using array operations.  The same caveats apply.
+
+    Each returned array has a row for each event with at least 4 elements,
+    if there are less than 4 traces the rows are padded with the code for
+    missing detectors: -1.
+
+    Example::
+
+        >>> events = proc.source.read(0, 1000)
+        >>> traces = proc.get_traces_for_events(events)
+        >>> integrals = BatchTraceObservables(traces, threshold=30).integrals
+
+    """
+
+    def __init__(self, traces, threshold=ADC_BASELINE_THRESHOLD, padding=DATA_REDUCTION_PADDING):
+        """Initialize the class
+
+        :param traces: a NumPy array of traces with shape (events, samples,
+                       detectors).  Shorter traces may be padded at the end
+                       with a value below the baseline, like the traces from
+                       :meth:`~sapphire.analysis.process_events.ProcessEvents.get_traces_for_events`.
+        :param threshold: value of the threshold to use, in ADC counts.
+        :param padding: number of samples which should be useable to determine
+                        the baseline.
+
+        """
+        self.traces = traces
+        self.threshold = threshold
+        self.padding = padding
+        self.n = self.traces.shape[2]
+        if self.n not in [2, 4]:
+            raise ValueError('Unsupported number of detectors')
+
+    def _add_missing(self, values):
+        """Pad the values of each event with the code for missing detectors"""
+
+        return concatenate([values, full((len(values), 4 - self.n), -1)], axis=1)
+
+    @cached_property
+    def _baselines(self):
+        return around(self.traces[:, : self.padding].mean(axis=1)).astype('int')
+
+    @cached_property
+    def _signals(self):
+        return self.traces - self._baselines[:, newaxis]
+
+    @cached_property
+    def baselines(self):
+        """Mean value of the first part of the traces
+
+        See :attr:`TraceObservables.baselines`.
+
+        :return: the baselines in ADC count.
+
+        """
+        return self._add_missing(self._baselines)
+
+    @cached_property
+    def std_dev(self):
+        """Standard deviation of the first part of the traces
+
+        :return: the standard deviations in milli ADC count.
+
+        """
+        std_dev = around(self.traces[:, : self.padding].std(axis=1) * 1000)
+        return self._add_missing(std_dev.astype('int'))
+
+    @cached_property
+    def pulseheights(self):
+        """Maximum peak to baseline value in the traces
+
+        :return: the pulseheights in ADC count.
+
+        """
+        return self._add_missing(self.traces.max(axis=1) - self._baselines)
+
+    @cached_property
+    def integrals(self):
+        """Integral of the traces for all values over threshold
+
+        :return: the pulse integrals in ADC count * sample.
+
+        """
+        signals = self._signals
+        return self._add_missing(where(signals > self.threshold, signals, 0).sum(axis=1))
+
+    @cached_property
+    def n_peaks(self):
+        """Number of peaks in the traces
+
+        The peak threshold is defined by ADC_LOW_THRESHOLD
+
+        :return: the number of peaks.
+
         """
         # Make rough guess at the baseline/threshold to expect
-        if all(b < 100 for b in self.baselines[: self.n]):
-            peak_threshold = ADC_LOW_THRESHOLD_III - 30
-        else:
-            peak_threshold = ADC_LOW_THRESHOLD - 200
-
-        traces = self.traces - self.baselines[: self.n]
-
-        n_peaks = []
-        for trace in traces.T:
-            n_peak = 0
-            in_peak = False
-            local_minimum = 0
-            for value in trace:
-                if not in_peak:
-                    if value < local_minimum:
-                        local_minimum = max(0, value)
-                    elif value - local_minimum > peak_threshold:
-                        # enough signal over local minimum to be in a peak
-                        in_peak = True
-                        local_maximum = value
-                        n_peak += 1
-                elif value > local_maximum:
-                    local_maximum = value
-                elif local_maximum - value > peak_threshold:
-                    # enough signal decrease to be out of peak
-                    in_peak = False
-                    local_minimum = max(0, value)
-            n_peaks.append(n_peak)
-
-        return n_peaks + self.missing
+        peak_thresholds = where(
+            (self._baselines < 100).all(axis=1),
+            ADC_LOW_THRESHOLD_III - 30,
+            ADC_LOW_THRESHOLD - 200,
+        )
+        n_events, n_samples, n_detectors = self._signals.shape
+        signals = moveaxis(self._signals, 1, 0).reshape(n_samples, n_events * n_detectors)
+        n_peaks = _count_peaks(signals, peak_thresholds.repeat(n_detectors))
+        return self._add_missing(n_peaks.reshape(n_events, n_detectors))
+
+
+def _count_peaks(signals, peak_thresholds):
+    """Count the peaks in many traces at once
+
+    A peak starts when the signal rises more than the threshold above the
+    local minimum and ends when it drops more than the threshold below
+    the local maximum.  All traces are processed in lockstep, one sample
+    at a time.
+
+    :param signals: array of traces relative to the baseline, with shape
+                    (samples, traces).
+    :param peak_thresholds: array with the peak threshold of each trace.
+    :return: array with the number of peaks in each trace.
+
+    """
+    n_traces = signals.shape[1]
+    n_peaks = zeros(n_traces, dtype='int')
+    in_peak = zeros(n_traces, dtype=bool)
+    local_minimum = zeros(n_traces, dtype=signals.dtype)
+    local_maximum = zeros(n_traces, dtype=signals.dtype)
+
+    for values in signals:
+        lower = ~in_peak & (values < local_minimum)
+        # enough signal over local minimum to be in a peak
+        peak_start = ~in_peak & ~lower & (values - local_minimum > peak_thresholds)
+        higher = in_peak & (values > local_maximum)
+        # enough signal decrease to be out of peak
+        peak_end = in_peak & ~higher & (local_maximum - values > peak_thresholds)
+
+        local_minimum = where(lower | peak_end, maximum(0, values), local_minimum)
+        local_maximum = where(peak_start | higher, values, local_maximum)
+        n_peaks += peak_start
+        in_peak = (in_peak & ~peak_end) | peak_start
+
+    return n_peaks
 
 
 class MeanFilter:
@@ -196,9 +327,11 @@ class MeanFilter:
         """
         if use_threshold:
             self.filter = self.mean_filter_with_threshold
+            self.filter_block = self.mean_filter_with_threshold_block
             self.threshold = threshold
         else:
             self.filter = self.mean_filter_without_threshold
+            self.filter_block = self.mean_filter_without_threshold_block
 
     def filter_traces(self, raw_traces):
         """Apply the mean filter to multiple traces
@@ -229,6 +362,25 @@ class MeanFilter:
         filtered_trace = self.filter(recombined_trace)
         return filtered_trace
 
+    def filter_trace_block(self, raw_traces):
+        """Apply the mean filter to many traces at once
+
+        Gives the same result as :meth:`filter_trace` for each trace.
+
+        :param raw_traces: 2D array with a raw trace of at least 8 samples
+                           in each row.
+        :return: 2D array with the filtered traces.
+
+        """
+        raw_traces = asarray(raw_traces)
+
+        filtered_even = self.filter_block(raw_traces[:, ::2])
+        filtered_odd = self.filter_block(raw_traces[:, 1::2])
+
+        length = min(filtered_even.shape[1], filtered_odd.shape[1])
+        recombined_traces = stack([filtered_even[:, :length], filtered_odd[:, :length]], axis=2)
+        return self.filter_block(recombined_traces.reshape(len(raw_traces), 2 * length))
+
     def mean_filter_with_threshold(self, trace):
         """The mean filter in case use_threshold is True"""
 
@@ -279,6 +431,70 @@ class MeanFilter:
 
         return filtered_trace
 
+    def mean_filter_with_threshold_block(self, traces):
+        """The mean filter in case use_threshold is True, for many traces
+
+        :param traces: 2D array with an integer trace of at least 4 samples
+                       in each row.
+        :return: 2D array with the filtered traces.
+
+        """
+        traces, moving_sum, rounded_average = self._moving_sum_block(traces)
+        current = traces[:, 4:]
+        previous = traces[:, 3:-1]
+        # Compare with four times the local mean, to stay with integers
+        local_sum = moving_sum[:, 1:]
+
+        filtered_traces = empty(traces.shape, dtype=traces.dtype)
+        is_flat = (abs(4 * traces[:, :4] - moving_sum[:, :1]) <= 4 * self.threshold).all(axis=1)
+        filtered_traces[:, :4] = where(is_flat[:, newaxis], rounded_average[:, :1], traces[:, :4])
+        keep = (
+            (abs(current - previous) > 2 * self.threshold)
+            # Both values on same side of the local_mean
+            | ((4 * current > local_sum) == (4 * previous > local_sum))
+            | (abs(4 * current - local_sum) > 4 * self.threshold)
+        )
+        filtered_traces[:, 4:] = where(keep, current, rounded_average[:, 1:])
+
+        return filtered_traces
+
+    def mean_filter_without_threshold_block(self, traces):
+        """The mean filter in case use_threshold is False, for many traces
+
+        :param traces: 2D array with an integer trace of at least 4 samples
+                       in each row.
+        :return: 2D array with the filtered traces.
+
+        """
+        traces, moving_sum, rounded_average = self._moving_sum_block(traces)
+        current = traces[:, 4:]
+        previous = traces[:, 3:-1]
+        local_sum = moving_sum[:, 1:]
+
+        filtered_traces = empty(traces.shape, dtype=traces.dtype)
+        filtered_traces[:, :4] = rounded_average[:, :1]
+        # Keep values if both are on the same side of the local_mean
+        keep = (4 * current > local_sum) == (4 * previous > local_sum)
+        filtered_traces[:, 4:] = where(keep, current, rounded_average[:, 1:])
+
+        return filtered_traces
+
+    @staticmethod
+    def _moving_sum_block(traces):
+        """Moving sum over 4 samples of many traces
+
+        :param traces: 2D array with an integer trace in each row.
+        :return: the traces, converted to an integer type large enough for
+                 the sums, the moving sum ending at each sample from the
+                 fourth sample on, and the rounded moving average.
+
+        """
+        traces = asarray(traces)
+        traces = traces.astype(result_type(traces.dtype, 'int32'))
+        moving_sum = traces[:, :-3] + traces[:, 1:-2] + traces[:, 2:-1] + traces[:, 3:]
+        rounded_average = around(moving_sum / 4).astype(traces.dtype)
+        return traces, moving_sum, rounded_average
+
     def __repr__(self):
         try:
             return '%s(use_threshold=%s, threshold=%r)' % (self.__class__.__name__, True, self.threshold)
@@ -371,3 +587,44 @@ class DataReduction:
         if length is not None:
             right = min(length, right)
         return left, right
+
+    def reduce_trace_block(self, traces, baselines=None):
+        """Apply data reduction to the traces of many events at once
+
+        Gives the same result as :meth:`reduce_traces` for each event.
+
+        :param traces: a NumPy array of traces with shape (events, samples,
+                       detectors).
+        :param baselines: array with the baselines of the traces of each
+            event, if None the baselines will be determined using
+            :class:`BatchTraceObservables`.
+        :return: list of data reduced traces of each event, and an array
+                 with the left cut of each event.
+
+        """
+        if baselines is None:
+            baselines = BatchTraceObservables(traces).baselines[:, : traces.shape[2]]
+        left, right = self.determine_cuts_block(traces, baselines)
+        left = maximum(0, left - self.padding)
+        right = minimum(traces.shape[1], right + self.padding)
+        return [event_traces[start:stop] for event_traces, start, stop in zip(traces, left, right)], left
+
+    def determine_cuts_block(self, traces, baselines):
+        """Determine the left and right cuts for many events
+
+        Note that this does not include the padding.
+
+        :param traces: a NumPy array of traces with shape (events, samples,
+                       detectors).
+        :param baselines: array with the baselines of the traces of each
+            event.
+        :return: arrays with for each event the indices into the traces
+                 where the first signals from left and right cross the
+                 threshold.
+
+        """
+        above = (traces - asarray(baselines)[:, newaxis]).max(axis=2) > self.threshold
+        has_signal = above.any(axis=1)
+        left = where(has_signal, above.argmax(axis=1), 0)
+        right = traces.shape[1] - where(has_signal, above[:, ::-1].argmax(axis=1), 0)
+        return left, right
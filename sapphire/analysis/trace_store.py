@@ -0,0 +1,349 @@
+"""Read and store HiSPARC traces
+
+The traces of HiSPARC events are stored in the ``blobs`` array of a
+station group as zlib compressed comma-separated ADC values.  The
+``traces`` column of the events table contains the index of the blob of
+the trace of each detector.  Decoding this text is slow, so the traces
+can also be converted into a binary trace store in the same group.
+
+The trace store consists of two arrays:
+
+``trace_samples``
+    the ADC values of all traces, one after the other, in a chunked and
+    compressed array of 16-bit integers.
+
+``trace_index``
+    the offset into ``trace_samples`` and the length of the trace for
+    each blob.  Blobs which do not contain a trace have length -1.
+
+Because the index follows the blobs array, the trace indexes in the
+events table can be used unchanged.  The event processing classes in
+:mod:`~sapphire.analysis.process_events` read the traces from the trace
+store if it is present.  Traces of blobs which were added after the
+conversion are decoded from the blobs array, so keep the blobs and run
+:func:`create_trace_store` again to add those to the store.
+
+Traces of events looked at using, for example,
+:meth:`~sapphire.analysis.process_events.ProcessEvents.get_traces_for_event`
+are kept in a cache, :data:`trace_cache`, so looking at the same events
+again does not require decoding the traces again.  Traces read to
+process all events are not cached.
+
+Example::
+
+    >>> import tables
+    >>> from sapphire.analysis.trace_store import create_trace_store
+    >>> with tables.open_file('data.h5', 'a') as data:
+    ...     create_trace_store(data, '/station_501')
+
+"""
+
+import threading
+import zlib
+
+from collections import OrderedDict
+
+import numpy as np
+import tables
+
+from ..utils import pbar
+
+#: Data type of decoded traces, large enough for the 12 bit ADC values
+TRACE_DTYPE = np.int16
+#: Value used to pad decoded traces shorter than the longest trace, and for
+#: missing traces
+TRACE_PAD = -1
+
+#: Name of the array containing the samples of all traces
+SAMPLES_NODE = 'trace_samples'
+#: Name of the array containing the offset and length of each trace
+INDEX_NODE = 'trace_index'
+#: Compression used for the trace store
+TRACE_STORE_FILTERS = tables.Filters(complevel=1, complib='blosc:zstd', shuffle=True)
+#: Number of blobs converted at a time
+BLOBS_CHUNKSIZE = 10_000
+#: Default maximum size in bytes of the decoded traces in the cache
+TRACE_CACHE_SIZE = 64 * 2**20
+
+
+def decode_trace(blob):
+    """Decode a trace from a blob
+
+    The blobs contain the zlib compressed comma-separated ADC values of
+    a trace.  Some older blobs are wrapped in an extra pair of bytes.
+
+    :param blob: compressed trace from the blobs array.
+    :return: array with the pulseheight values, of type :data:`TRACE_DTYPE`.
+    :raises ValueError: if a value does not fit in :data:`TRACE_DTYPE`.
+
+    """
+    try:
+        trace = zlib.decompress(blob)
+    except zlib.error:
+        trace = zlib.decompress(blob[1:-1])
+    values = trace.split(b',')
+    if values[-1] == b'':
+        del values[-1]
+    trace = np.array(values, dtype=np.int64)
+    limits = np.iinfo(TRACE_DTYPE)
+    if len(trace) and (trace.min() < limits.min or trace.max() > limits.max):
+        raise ValueError(f'Trace values out of the range of {np.dtype(TRACE_DTYPE)}.')
+    return trace.astype(TRACE_DTYPE)
+
+
+def decode_traces(blobs):
+    """Decode many traces from blobs into a single array
+
+    :param blobs: iterable of compressed traces from the blobs array.
+    :return: 2D array with a row for each trace, traces shorter than the
+             longest trace are padded with :data:`TRACE_PAD`.
+
+    """
+    return pad_traces([decode_trace(blob) for blob in blobs])
+
+
+def pad_traces(traces):
+    """Combine traces into a single array
+
+    :param traces: list of trace arrays.
+    :return: 2D array with a row for each trace, traces shorter than the
+             longest trace are padded with :data:`TRACE_PAD`.
+
+    """
+    length = max((len(trace) for trace in traces), default=0)
+    result = np.full((len(traces), length), TRACE_PAD, dtype=TRACE_DTYPE)
+    for row, trace in zip(result, traces):
+        row[: len(trace)] = trace
+    return result
+
+
+def create_trace_store(file, group, events='events', filters=TRACE_STORE_FILTERS, progress=True):
+    """Convert the traces in the blobs array into a binary trace store
+
+    If the group already contains a trace store, only the blobs which
+    were added since the previous conversion are converted.
+
+    :param file: the PyTables datafile.
+    :param group: the group (or its pathname) containing the blobs and
+        events.
+    :param events: name of the events table which refers to the traces.
+        Only the blobs referred to by these events are decoded.
+    :param filters: compression used for the new arrays.
+    :param progress: if True show a progressbar while converting.
+    :return: :class:`TraceStore` for the group.
+
+    """
+    group = file.get_node(group)
+    blobs = group.blobs
+
+    trace_idx = file.get_node(group, events).col('traces')
+    trace_idx = trace_idx[(trace_idx >= 0) & (trace_idx < len(blobs))]
+    is_trace = np.zeros(len(blobs), dtype=bool)
+    is_trace[trace_idx] = True
+
+    if INDEX_NODE in group:
+        samples = group._f_get_child(SAMPLES_NODE)
+        index = group._f_get_child(INDEX_NODE)
+    else:
+        samples = file.create_earray(
+            group,
+            SAMPLES_NODE,
+            tables.Int16Atom(),
+            (0,),
+            'HiSPARC trace samples',
+            filters=filters,
+        )
+        index = file.create_earray(
+            group,
+            INDEX_NODE,
+            tables.Int64Atom(),
+            (0, 2),
+            'Offset and length of the HiSPARC traces',
+            filters=filters,
+            expectedrows=len(blobs),
+        )
+
+    offset = len(samples)
+    for start in pbar(range(len(index), len(blobs), BLOBS_CHUNKSIZE), show=progress):
+        stop = min(start + BLOBS_CHUNKSIZE, len(blobs))
+        traces = [
+            decode_trace(blob) if blob_is_trace else None
+            for blob, blob_is_trace in zip(blobs.read(start, stop), is_trace[start:stop])
+        ]
+        lengths = np.array([-1 if trace is None else len(trace) for trace in traces], dtype=np.int64)
+        sizes = np.maximum(lengths, 0)
+        offsets = offset + np.cumsum(sizes) - sizes
+
+        samples.append(np.concatenate([np.empty(0, dtype=TRACE_DTYPE)] + [t for t in traces if t is not None]))
+        index.append(np.column_stack([offsets, lengths]))
+        offset += sizes.sum()
+
+    samples.flush()
+    index.flush()
+    return TraceStore(group)
+
+
+class TraceStore:
+    """Read traces from a binary trace store
+
+    The traces are looked up using the same indexes as the traces in the
+    blobs array, see :func:`create_trace_store`.  Traces which are not in
+    the store, because the blobs were added or referred to by events after
+    the conversion, are decoded from the blobs array.
+
+    :param group: the PyTables group containing the trace store.
+
+    """
+
+    def __init__(self, group):
+        self.samples = group._f_get_child(SAMPLES_NODE)
+        index = group._f_get_child(INDEX_NODE).read()
+        self.offsets = index[:, 0]
+        self.lengths = index[:, 1]
+        self.blobs = group._f_get_child('blobs') if 'blobs' in group else None
+
+    @classmethod
+    def from_group(cls, group):
+        """Open the trace store in a group, if there is one
+
+        :param group: a PyTables group.
+        :return: :class:`TraceStore` or None.
+
+        """
+        if INDEX_NODE in group and SAMPLES_NODE in group:
+            return cls(group)
+        return None
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, idx):
+        """Return the trace with index idx
+
+        :param idx: index of the trace, as in the blobs array.
+        :return: array with the pulseheight values.
+
+        """
+        if idx >= len(self.lengths) or self.lengths[idx] < 0:
+            return self._decode_blob(idx)
+        offset = self.offsets[idx]
+        return self.samples[offset : offset + self.lengths[idx]]
+
+    def read_traces(self, indices):
+        """Return many traces
+
+        Traces which are close together in the store are read at once.
+
+        :param indices: indexes of the traces, as in the blobs array.
+        :return: list of arrays with the pulseheight values.
+
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        is_stored = indices < len(self.lengths)
+        is_stored[is_stored] = self.lengths[indices[is_stored]] >= 0
+        traces = [None] * len(indices)
+        for i in np.flatnonzero(~is_stored):
+            traces[i] = self._decode_blob(indices[i])
+        stored = np.flatnonzero(is_stored)
+        if not len(stored):
+            return traces
+
+        lengths = self.lengths[indices[stored]]
+        starts = self.offsets[indices[stored]]
+        stops = starts + lengths
+        first = starts.min()
+        last = stops.max()
+        if last - first > 2 * lengths.sum():
+            # Traces are spread out, read them one by one
+            for i, start, stop in zip(stored, starts, stops):
+                traces[i] = self.samples[start:stop]
+        else:
+            samples = self.samples[first:last]
+            for i, start, stop in zip(stored, starts, stops):
+                traces[i] = samples[start - first : stop - first]
+        return traces
+
+    def _decode_blob(self, idx):
+        """Decode a trace which is not in the store from the blobs array"""
+
+        if self.blobs is None or idx >= len(self.blobs):
+            raise ValueError(f'Trace {idx} is not in the trace store, update it using create_trace_store.')
+        return decode_trace(self.blobs[idx])
+
+
+class TraceCache:
+    """Least recently used cache of decoded traces
+
+    When the total size of the cached traces exceeds the maximum, the
+    least recently used traces are removed.  The cached traces are made
+    read-only, since they are shared by everyone using the cache.  The
+    cache can safely be used from multiple threads.
+
+    :param max_bytes: maximum total size in bytes of the cached traces.
+
+    """
+
+    def __init__(self, max_bytes=TRACE_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._traces)
+
+    def get(self, key):
+        """Return a cached trace
+
+        :param key: the key of the trace, for example (file identity, group, index).
+        :return: the trace, or None if it is not in the cache.
+
+        """
+        with self._lock:
+            try:
+                trace = self._traces[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._traces.move_to_end(key)
+            self.hits += 1
+            return trace
+
+    def put(self, key, trace):
+        """Add a trace to the cache
+
+        :param key: the key of the trace, for example (file identity, group, index).
+        :param trace: array with the pulseheight values.
+
+        """
+        if trace.nbytes > self.max_bytes:
+            return
+        if trace.base is not None:
+            # Do not keep the array of which the trace is a view alive
+            trace = trace.copy()
+        trace.flags.writeable = False
+        with self._lock:
+            if key in self._traces:
+                self.nbytes -= self._traces.pop(key).nbytes
+            self._traces[key] = trace
+            self.nbytes += trace.nbytes
+            while self.nbytes > self.max_bytes:
+                _, removed = self._traces.popitem(last=False)
+                self.nbytes -= removed.nbytes
+
+    def clear(self):
+        """Remove all traces from the cache and reset the counters"""
+
+        with self._lock:
+            self._traces.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+#: Cache of decoded traces shared by the event processing classes.  Set
+#: its :attr:`~TraceCache.max_bytes` to 0 to disable caching.
+trace_cache = TraceCache()
@@ -25,6 +25,7 @@ Example usage:
 import datetime
 import json
 import logging
+import threading
 import warnings
 
 from functools import cached_property
@@ -32,16 +33,21 @@ from io import BytesIO
 from pathlib import Path
 from urllib.error import HTTPError, URLError
 from urllib.parse import urljoin
-from urllib.request import urlopen
 
-from numpy import atleast_1d, count_nonzero, genfromtxt, logical_and, negative, ones, zeros
+from numpy import atleast_1d, count_nonzero, empty, genfromtxt, load, logical_and, negative, ones, zeros
 
+from .cache import METADATA_TTL, get_metadata_cache, get_response_cache
 from .transformations.clock import process_time
-from .utils import get_active_index, get_publicdb_base, memoize
+from .transport import urlopen
+from .utils import get_active_index, get_active_indices, get_publicdb_base, memoize
 
 logger = logging.getLogger(__name__)
 
 LOCAL_BASE = Path(__file__).parent / 'data'
+LOCAL_ARCHIVE = LOCAL_BASE / 'local_data.npz'
+
+_local_archive = {}
+_local_archive_lock = threading.Lock()
 
 
 def get_api_base():
@@ -52,6 +58,85 @@ def get_src_base():
     return urljoin(get_publicdb_base(), 'show/source/')
 
 
+def clear_local_archive():
+    """Forget data read from the archive with compiled local data
+
+    The archive is read again when needed, e.g. after it was recompiled.
+
+    """
+    with _local_archive_lock:
+        _local_archive.clear()
+
+
+def _get_compiled_local_data(name):
+    """Get a part of the archive with compiled local data
+
+    The archive is created by :func:`~sapphire.data.update_local_data.compile_local_data`.
+    Each part is read once, and afterwards kept in memory.
+
+    :param name: 'json' for the JSON data, otherwise a TSV data type.
+    :return: for 'json' a dictionary of JSON strings by urlpath, for TSV
+             data the values of all files and a dictionary with the rows
+             and column types of each file.  None if the archive does
+             not contain the data.
+
+    """
+    with _local_archive_lock:
+        if name not in _local_archive:
+            _local_archive[name] = _read_compiled_local_data(name)
+        return _local_archive[name]
+
+
+def _read_compiled_local_data(name):
+    if not LOCAL_ARCHIVE.exists():
+        return None
+    with load(LOCAL_ARCHIVE) as archive:
+        if name == 'json':
+            return json.loads(archive['json'][()]) if 'json' in archive else None
+        if f'tsv/{name}/index' not in archive:
+            return None
+        index = archive[f'tsv/{name}/index']
+        values = archive[f'tsv/{name}/values']
+    return values, {path: (start, stop, types) for path, start, stop, types in index.tolist()}
+
+
+def _load_local_json(urlpath):
+    """Load local JSON data, from the compiled archive if it contains the data
+
+    :param urlpath: api urlpath of the data.
+    :return: the data as dictionary or integer.
+
+    """
+    compiled = _get_compiled_local_data('json')
+    if compiled is not None and urlpath in compiled:
+        return json.loads(compiled[urlpath])
+    with (LOCAL_BASE / f'{urlpath}.json').open() as localdata:
+        return json.load(localdata)
+
+
+def _load_local_tsv(urlpath, names=None):
+    """Load local TSV data, from the compiled archive if it contains the data
+
+    :param urlpath: tsv urlpath of the data.
+    :param names: data column names.
+    :return: the data as array.
+
+    """
+    data_type, _, path = urlpath.partition('/')
+    compiled = _get_compiled_local_data(data_type) if names is not None else None
+    if compiled is not None and path in compiled[1]:
+        values, index = compiled
+        start, stop, types = index[path]
+        if len(types) == len(names):
+            data = empty(stop - start, dtype=[(name, int if t == 'i' else float) for name, t in zip(names, types)])
+            for i, name in enumerate(names):
+                data[name] = values[start:stop, i]
+            return data
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore')
+        return genfromtxt(LOCAL_BASE / f'{urlpath}.tsv', delimiter='\t', dtype=None, names=names)
+
+
 class API:
     """Base API class
 
@@ -110,10 +195,54 @@ class API:
         """
         self.force_fresh = force_fresh
         self.force_stale = force_stale
+        self._prefetched = {}
+
+    def _prefetch(self, json_paths=(), tsv_paths=()):
+        """Retrieve responses from the server in advance, without parsing them
+
+        Only the requests are made, so this can be called from other threads
+        to retrieve the data of many instances concurrently.  The responses
+        are parsed, and warnings are issued, by the subsequent calls of
+        :meth:`_get_json` and :meth:`_get_tsv` in the calling thread.
+        Errors are stored and raised by those calls.  Data which is already
+        in the metadata cache is not requested.
+
+        :param json_paths: api urlpaths to retrieve.
+        :param tsv_paths: (urlpath, names) tuples of Source TSVs to retrieve.
+
+        """
+        if self.force_stale:
+            return
+        # The same cache keys as used by _get_json and _get_tsv
+        requests = [('json', get_api_base(), urlpath.rstrip('/')) for urlpath in json_paths]
+        requests.extend(('tsv', get_src_base(), urlpath.rstrip('/'), names) for urlpath, names in tsv_paths)
+        for cache_key in requests:
+            base, urlpath = cache_key[1:3]
+            if not self.force_fresh and get_metadata_cache().get(cache_key) is not None:
+                continue
+            try:
+                self._prefetched[(base, urlpath)] = self._retrieve_url(urlpath, base=base)
+            except Exception as error:
+                self._prefetched[(base, urlpath)] = error
+
+    def _get_response(self, urlpath, base):
+        """Retrieve an url, or take the response retrieved by :meth:`_prefetch`"""
+
+        try:
+            response = self._prefetched.pop((base, urlpath))
+        except KeyError:
+            return self._retrieve_url(urlpath, base=base)
+        if isinstance(response, Exception):
+            raise response
+        return response
 
     def _get_json(self, urlpath):
         """Retrieve a JSON from the HiSPARC API
 
+        Data retrieved from the server is kept in the process-wide metadata
+        cache, see :func:`~sapphire.cache.get_metadata_cache`.  The cache is
+        not used if fresh data is required.
+
         :param urlpath: api urlpath to retrieve (i.e. after get_api_base).
         :return: the data returned by the api as dictionary or integer.
 
@@ -121,18 +250,22 @@ class API:
         urlpath = urlpath.rstrip('/')
         if self.force_fresh and self.force_stale:
             raise ValueError('Can not force fresh and stale simultaneously.')
+        cache_key = ('json', get_api_base(), urlpath)
+        if not (self.force_stale or self.force_fresh):
+            json_data = get_metadata_cache().get(cache_key)
+            if json_data is not None:
+                return json.loads(json_data)
         try:
             if self.force_stale:
                 raise ValueError('Should not get data from server')
-            json_data = self._retrieve_url(urlpath, base=get_api_base())
+            json_data = self._get_response(urlpath, get_api_base())
             data = json.loads(json_data)
+            get_metadata_cache().set(cache_key, json_data)
         except Exception as remote_error:
             if self.force_fresh:
                 raise RuntimeError("Couldn't get requested data from server.") from remote_error
-            localpath = LOCAL_BASE / f'{urlpath}.json'
             try:
-                with localpath.open() as localdata:
-                    data = json.load(localdata)
+                data = _load_local_json(urlpath)
             except Exception as local_error:
                 if self.force_stale:
                     raise RuntimeError("Couldn't find requested data locally.") from local_error
@@ -145,6 +278,10 @@ class API:
     def _get_tsv(self, urlpath, names=None):
         """Retrieve a Source TSV from the HiSPARC Public Database
 
+        Data retrieved from the server is kept in the process-wide metadata
+        cache, see :func:`~sapphire.cache.get_metadata_cache`.  The cache is
+        not used if fresh data is required.
+
         :param urlpath: tsv urlpath to retrieve (i.e. path after get_src_base).
         :param names: data column names.
         :return: the data returned as array.
@@ -153,18 +290,20 @@ class API:
         urlpath = urlpath.rstrip('/')
         if self.force_fresh and self.force_stale:
             raise ValueError('Can not force fresh and stale simultaneously.')
+        cache_key = ('tsv', get_src_base(), urlpath, names)
+        if not (self.force_stale or self.force_fresh):
+            data = get_metadata_cache().get(cache_key)
+            if data is not None:
+                return data.copy()
         try:
             if self.force_stale:
                 raise ValueError('Should not get data from server')
-            tsv_data = self._retrieve_url(urlpath, base=get_src_base())
+            tsv_data = self._get_response(urlpath, get_src_base())
         except Exception as remote_error:
             if self.force_fresh:
                 raise RuntimeError("Couldn't get requested data from server.") from remote_error
-            localpath = LOCAL_BASE / f'{urlpath}.tsv'
             try:
-                with warnings.catch_warnings():
-                    warnings.filterwarnings('ignore')
-                    data = genfromtxt(localpath, delimiter='\t', dtype=None, names=names)
+                data = _load_local_tsv(urlpath, names)
             except Exception as local_error:
                 if self.force_stale:
                     raise RuntimeError("Couldn't find requested data locally.") from local_error
@@ -175,6 +314,7 @@ class API:
             with warnings.catch_warnings():
                 warnings.filterwarnings('ignore')
                 data = genfromtxt(BytesIO(tsv_data.encode('utf-8')), delimiter='\t', dtype=None, names=names)
+            get_metadata_cache().set(cache_key, atleast_1d(data).copy())
 
         return atleast_1d(data)
 
@@ -182,6 +322,9 @@ class API:
     def _retrieve_url(urlpath, base=None):
         """Open a HiSPARC API URL and read the data
 
+        If the response cache is enabled, see :mod:`~sapphire.cache`,
+        responses are taken from and stored in the cache.
+
         :param urlpath: the api urlpath (after the base) to retrieve
         :param base: base url for the API
         :return: the data returned by the api as a string
@@ -191,14 +334,24 @@ class API:
             base = get_api_base()
 
         url = urljoin(base, urlpath + '/' if urlpath else '')
+        cache = get_response_cache()
+        if cache is not None:
+            response = cache.get(url)
+            if response is not None:
+                return response.decode('utf-8')
+
         logging.debug(f'Getting: {url}')
         try:
-            result = urlopen(url).read().decode('utf-8')
+            response = urlopen(url).read()
+            result = response.decode('utf-8')
         except HTTPError as error:
             raise RuntimeError(f'A HTTP {error.code} error occurred for the url: {url}')
         except URLError:
             raise RuntimeError('An URL error occurred.')
 
+        if cache is not None:
+            cache.set(url, response, METADATA_TTL)
+
         return result
 
     @staticmethod
@@ -209,7 +362,7 @@ class API:
 
         """
         try:
-            urlopen(get_api_base()).read()
+            urlopen(get_api_base(), retries=0).read()
         except URLError:
             return False
         return True
@@ -492,6 +645,30 @@ class Network(API):
 class Station(API):
     """Access data about a single station"""
 
+    #: Column names of the GPS location data.
+    gps_columns = ('timestamp', 'latitude', 'longitude', 'altitude')
+
+    #: Column names of the station layout data.
+    layout_columns = (
+        'timestamp',
+        'radius1',
+        'alpha1',
+        'height1',
+        'beta1',
+        'radius2',
+        'alpha2',
+        'height2',
+        'beta2',
+        'radius3',
+        'alpha3',
+        'height3',
+        'beta3',
+        'radius4',
+        'alpha4',
+        'height4',
+        'beta4',
+    )
+
     def __init__(self, station, force_fresh=False, force_stale=False):
         """Initialize station
 
@@ -507,6 +684,7 @@ class Station(API):
             warnings.warn('Possibly invalid station, or without config.')
         self.force_fresh = force_fresh
         self.force_stale = force_stale
+        self._prefetched = {}
         self.station = station
 
     @cached_property
@@ -728,6 +906,17 @@ class Station(API):
         electronic = [electronics[idx][field] for field in ('primary', 'secondary', 'primary_fpga', 'secondary_fpga')]
         return electronic
 
+    def electronic_array(self, timestamps):
+        """Get electronics version data for many timestamps
+
+        :param timestamps: array of timestamps for which the values are
+            valid (e.g. the timestamps of events).
+        :return: array with the row of :attr:`electronics` valid for
+                 each timestamp.
+
+        """
+        return self._active_rows(self.electronics, timestamps)
+
     @cached_property
     def voltages(self):
         """Get the PMT voltage data
@@ -754,6 +943,17 @@ class Station(API):
         voltage = [voltages[idx][f'voltage{detector_id}'] for detector_id in range(1, 5)]
         return voltage
 
+    def voltage_array(self, timestamps):
+        """Get PMT voltage data for many timestamps
+
+        :param timestamps: array of timestamps for which the values are
+            valid (e.g. the timestamps of events).
+        :return: array with the row of :attr:`voltages` valid for each
+                 timestamp.
+
+        """
+        return self._active_rows(self.voltages, timestamps)
+
     @cached_property
     def currents(self):
         """Get the PMT current data
@@ -780,6 +980,17 @@ class Station(API):
         current = [currents[idx][f'current{detector_id}'] for detector_id in range(1, 5)]
         return current
 
+    def current_array(self, timestamps):
+        """Get PMT current data for many timestamps
+
+        :param timestamps: array of timestamps for which the values are
+            valid (e.g. the timestamps of events).
+        :return: array with the row of :attr:`currents` valid for each
+                 timestamp.
+
+        """
+        return self._active_rows(self.currents, timestamps)
+
     @cached_property
     def gps_locations(self):
         """Get the GPS location data
@@ -787,9 +998,8 @@ class Station(API):
         :return: array of timestamps and values.
 
         """
-        columns = ('timestamp', 'latitude', 'longitude', 'altitude')
         path = self.src_urls['gps'].format(station_number=self.station)
-        return self._get_tsv(path, names=columns)
+        return self._get_tsv(path, names=self.gps_columns)
 
     def gps_location(self, timestamp=None):
         """Get GPS location for specific timestamp
@@ -812,6 +1022,17 @@ class Station(API):
         }
         return location
 
+    def gps_location_array(self, timestamps):
+        """Get GPS locations for many timestamps
+
+        :param timestamps: array of timestamps for which the values are
+            valid (e.g. the timestamps of events).
+        :return: array with the row of :attr:`gps_locations` valid for
+                 each timestamp.
+
+        """
+        return self._active_rows(self.gps_locations, timestamps)
+
     @cached_property
     def triggers(self):
         """Get the trigger config data
@@ -855,6 +1076,17 @@ class Station(API):
         trigger = [triggers[idx][trigger_option] for trigger_option in ('n_low', 'n_high', 'and_or', 'external')]
         return thresholds, trigger
 
+    def trigger_array(self, timestamps):
+        """Get trigger config for many timestamps
+
+        :param timestamps: array of timestamps for which the values are
+            valid (e.g. the timestamps of events).
+        :return: array with the row of :attr:`triggers` valid for each
+                 timestamp.
+
+        """
+        return self._active_rows(self.triggers, timestamps)
+
     @cached_property
     def station_layouts(self):
         """Get the station layout data
@@ -862,28 +1094,9 @@ class Station(API):
         :return: array of timestamps and values.
 
         """
-        columns = (
-            'timestamp',
-            'radius1',
-            'alpha1',
-            'height1',
-            'beta1',
-            'radius2',
-            'alpha2',
-            'height2',
-            'beta2',
-            'radius3',
-            'alpha3',
-            'height3',
-            'beta3',
-            'radius4',
-            'alpha4',
-            'height4',
-            'beta4',
-        )
         base = self.src_urls['layout']
         path = base.format(station_number=self.station)
-        return self._get_tsv(path, names=columns)
+        return self._get_tsv(path, names=self.layout_columns)
 
     def station_layout(self, timestamp=None):
         """Get station layout data for specific timestamp
@@ -903,6 +1116,17 @@ class Station(API):
         ]
         return station_layout
 
+    def station_layout_array(self, timestamps):
+        """Get station layout data for many timestamps
+
+        :param timestamps: array of timestamps for which the values are
+            valid (e.g. the timestamps of events).
+        :return: array with the row of :attr:`station_layouts` valid for
+                 each timestamp.
+
+        """
+        return self._active_rows(self.station_layouts, timestamps)
+
     @cached_property
     def detector_timing_offsets(self):
         """Get the detector timing offsets data
@@ -931,6 +1155,17 @@ class Station(API):
 
         return detector_timing_offset
 
+    def detector_timing_offset_array(self, timestamps):
+        """Get detector timing offset data for many timestamps
+
+        :param timestamps: array of timestamps for which the values are
+            valid (e.g. the timestamps of events).
+        :return: array with the row of :attr:`detector_timing_offsets`
+                 valid for each timestamp.
+
+        """
+        return self._active_rows(self.detector_timing_offsets, timestamps)
+
     @memoize
     def station_timing_offsets(self, reference_station):
         """Get the station timing offset relative to reference_station
@@ -976,6 +1211,36 @@ class Station(API):
 
         return station_timing_offset
 
+    def station_timing_offset_array(self, reference_station, timestamps):
+        """Get station timing offset data for many timestamps
+
+        :param reference_station: reference station
+        :param timestamps: array of timestamps for which the values are
+            valid (e.g. the timestamps of events).
+        :return: array with the timestamp, offset, and error valid for each
+                 timestamp.  If the reference station is this station the
+                 offsets and errors are zero.
+
+        """
+        if self.station == reference_station:
+            return zeros(len(timestamps), dtype=[('timestamp', 'i8'), ('offset', 'f8'), ('error', 'f8')])
+
+        return self._active_rows(self.station_timing_offsets(reference_station), timestamps)
+
+    @staticmethod
+    def _active_rows(data, timestamps):
+        """Get the rows of the data which are valid for the timestamps
+
+        All timestamps are looked up in a single pass, instead of a
+        bisection for each timestamp.
+
+        :param data: array with a (sorted) timestamp column.
+        :param timestamps: array of timestamps.
+        :return: array with a row from data for each timestamp.
+
+        """
+        return data[get_active_indices(data['timestamp'], timestamps)]
+
     def __repr__(self):
         return '%s(%d, force_fresh=%s, force_stale=%s)' % (
             self.__class__.__name__,
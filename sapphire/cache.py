@@ -0,0 +1,322 @@
+"""Cache responses from the HiSPARC Public Database on disk
+
+Downloads from the Public Database can be cached on disk, so that reruns of
+an analysis over the same period do not need to download the same data
+again.  The cache is opt-in, it is enabled by setting the
+``SAPPHIRE_CACHE_DIR`` environment variable to the directory in which the
+cache should be stored.  The maximum size of the cache can be set (in
+bytes) using ``SAPPHIRE_CACHE_SIZE``, when the cache grows larger the least
+recently used responses are removed.  Responses larger than
+:data:`MAX_RESPONSE_SIZE` are not cached, and failures to write to the
+cache are logged and otherwise ignored.
+
+Responses are stored compressed, keyed by their full URL, along with the
+time at which they were stored.  Each response has a time to live, after
+which it is no longer used.  Event summary data of days in the past does
+not change, so those responses never expire.  Data for the current day and
+metadata from the API do change and expire quickly.
+
+Example::
+
+    $ SAPPHIRE_CACHE_DIR=~/.cache/sapphire python
+
+Independent of the response cache, metadata retrieved by :mod:`sapphire.api`
+is kept in memory by a process-wide :class:`MemoryCache`, such that new
+:class:`~sapphire.api.Station` and :class:`~sapphire.api.Network`
+instances do not request and parse the same data again.  This cache is
+shared by all instances and can be cleared explicitly::
+
+    >>> from sapphire.cache import get_metadata_cache
+    >>> get_metadata_cache().invalidate()
+
+"""
+
+import datetime
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+from contextlib import contextmanager
+from os import environ, makedirs, path
+
+#: Default maximum size of the cache in bytes.
+DEFAULT_MAX_SIZE = 2 * 1024**3
+
+#: Default maximum size in bytes of a single (uncompressed) response which
+#: is stored in the cache, well below the SQLite limit of 1 GB for a blob.
+MAX_RESPONSE_SIZE = 256 * 1024**2
+
+#: Time to live in seconds for responses which may still change, i.e.
+#: event summary data which includes the current day.
+TODAY_TTL = 10 * 60
+
+#: Time to live in seconds for API and source (metadata) responses.
+METADATA_TTL = 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Get the response cache configured by the environment
+
+    :return: the :class:`ResponseCache` stored in the directory given by the
+             ``SAPPHIRE_CACHE_DIR`` environment variable, or None if it is
+             not set.
+
+    """
+    cache_dir = environ.get('SAPPHIRE_CACHE_DIR')
+    if not cache_dir:
+        return None
+    max_size = int(environ.get('SAPPHIRE_CACHE_SIZE', DEFAULT_MAX_SIZE))
+    with _caches_lock:
+        if (cache_dir, max_size) not in _caches:
+            _caches[(cache_dir, max_size)] = ResponseCache(cache_dir, max_size)
+        return _caches[(cache_dir, max_size)]
+
+
+def get_metadata_cache():
+    """Get the process-wide in-memory cache for API metadata
+
+    :return: the :class:`MemoryCache` shared by all API instances.
+
+    """
+    return _metadata_cache
+
+
+def interval_ttl(end):
+    """Get the time to live for data of an interval
+
+    :param end: datetime instance defining the end of the interval.
+    :return: None (never expire) if the interval ends before the start of
+             the current day, otherwise :data:`TODAY_TTL`.
+
+    """
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time(0, 0))
+    if end <= today:
+        return None
+    else:
+        return TODAY_TTL
+
+
+class ResponseCache:
+    """Persistent cache of responses keyed by URL
+
+    The responses are stored zlib compressed in a SQLite database in the
+    given directory.  The cache can safely be used from multiple threads.
+
+    :param directory: directory in which to store the cache, which need not
+                      exist.
+    :param max_size: maximum total size of the stored (compressed)
+                     responses in bytes.
+    :param max_response_size: maximum size of a single (uncompressed)
+                              response in bytes, larger responses are not
+                              stored.
+
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, max_response_size=MAX_RESPONSE_SIZE):
+        makedirs(directory, exist_ok=True)
+        self.path = path.join(directory, 'responses.sqlite')
+        self.max_size = max_size
+        self.max_response_size = max_response_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'url TEXT PRIMARY KEY, body BLOB, size INTEGER, checksum INTEGER, '
+                'stored REAL, expires REAL, accessed REAL)',
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection to the database and commit on success"""
+
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, url):
+        """Get a response from the cache
+
+        Expired responses and responses which fail validation are removed.
+
+        :param url: the full URL of the request.
+        :return: the response body as bytes, or None if it is not available.
+
+        """
+        with self._lock, self._connect() as connection:
+            result = connection.execute(
+                'SELECT body, checksum, expires FROM responses WHERE url = ?',
+                (url,),
+            ).fetchone()
+            if result is None:
+                self.misses += 1
+                return None
+            body, checksum, expires = result
+            try:
+                if expires is not None and expires < time.time():
+                    raise ValueError('Response expired')
+                body = zlib.decompress(body)
+                if zlib.crc32(body) != checksum:
+                    raise ValueError('Response checksum mismatch')
+            except (ValueError, zlib.error):
+                connection.execute('DELETE FROM responses WHERE url = ?', (url,))
+                self.misses += 1
+                return None
+            connection.execute('UPDATE responses SET accessed = ? WHERE url = ?', (time.time(), url))
+        self.hits += 1
+        return body
+
+    def set(self, url, body, ttl=None):
+        """Store a response in the cache
+
+        Afterwards, the least recently used responses are removed until the
+        cache fits within the maximum size.  Responses larger than the
+        maximum response size are not stored.  The cache is only an
+        optimisation, so errors while storing the response are logged and
+        otherwise ignored.
+
+        :param url: the full URL of the request.
+        :param body: the complete response body as bytes.
+        :param ttl: time to live of the response in seconds, None to never
+                    expire.
+        :return: True if the response was stored, False otherwise.
+
+        """
+        if len(body) > self.max_response_size:
+            return False
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        try:
+            compressed = zlib.compress(body)
+            with self._lock, self._connect() as connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (url, compressed, len(compressed), zlib.crc32(body), now, expires, now),
+                )
+                self._evict(connection)
+        except (sqlite3.Error, OSError, MemoryError) as exc:
+            logger.warning('Unable to store response for %s in the cache: %s', url, exc)
+            return False
+        return True
+
+    def _evict(self, connection):
+        """Remove least recently used responses to fit the maximum size"""
+
+        total_size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        for url, size in connection.execute('SELECT url, size FROM responses ORDER BY accessed').fetchall():
+            connection.execute('DELETE FROM responses WHERE url = ?', (url,))
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+
+    def invalidate(self, url=None):
+        """Remove a response, or all responses, from the cache
+
+        :param url: the full URL of the response to remove, if None the
+                    entire cache is cleared.
+
+        """
+        with self._lock, self._connect() as connection:
+            if url is None:
+                connection.execute('DELETE FROM responses')
+            else:
+                connection.execute('DELETE FROM responses WHERE url = ?', (url,))
+
+    @property
+    def size(self):
+        """Total size of the stored (compressed) responses in bytes"""
+
+        with self._lock, self._connect() as connection:
+            return connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({path.dirname(self.path)!r}, max_size={self.max_size})'
+
+
+class MemoryCache:
+    """Cache of values in memory with a time to live
+
+    The cache can safely be used from multiple threads.  The stored values
+    are returned as is, so they should not be modified.
+
+    :param ttl: default time to live of values in seconds, None to never
+                expire.
+
+    """
+
+    def __init__(self, ttl=METADATA_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get a value from the cache
+
+        :param key: hashable key of the value.
+        :return: the value, or None if it is not available or expired.
+
+        """
+        with self._lock:
+            try:
+                value, expires = self._values[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires is not None and expires < time.time():
+                del self._values[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value in the cache
+
+        :param key: hashable key of the value.
+        :param value: the value to store.
+        :param ttl: time to live in seconds, if None the default of the
+                    cache is used.
+
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._values[key] = (value, expires)
+
+    def invalidate(self, key=None):
+        """Remove a value, or all values, from the cache
+
+        :param key: the key of the value to remove, if None the entire
+                    cache is cleared.
+
+        """
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(ttl={self.ttl!r})'
+
+
+_metadata_cache = MemoryCache()
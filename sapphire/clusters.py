@@ -19,6 +19,7 @@ These cluster objects are mainly used by simulations and reconstructions.
 
 import warnings
 
+from concurrent.futures import ThreadPoolExecutor
 from math import atan2, cos, pi, sin, sqrt
 
 import numpy as np
@@ -792,6 +793,11 @@ class HiSPARCStations(CompassStations):
         location data, otherwise an exception will be raised. Stations
         with missing location data will be excluded. Does not apply
         to missing detector positions.
+    :param n_workers: maximum number of stations for which the metadata
+        is requested concurrently.  Building a cluster of many stations is
+        dominated by waiting for the Public Database, so the requests are
+        made by a pool of threads.  The responses are parsed, and any
+        warnings are issued, in the calling thread afterwards.
 
     Example::
 
@@ -799,17 +805,35 @@ class HiSPARCStations(CompassStations):
 
     """
 
-    def __init__(self, stations, skip_missing=False, force_fresh=False, force_stale=False):
+    def __init__(self, stations, skip_missing=False, force_fresh=False, force_stale=False, n_workers=8):
         super().__init__()
 
         missing_gps = []
         missing_detectors = []
         reference_required = True
 
+        # Request the metadata of all stations concurrently before building
+        # the cluster, the responses are parsed in this thread
+        stations = list(stations)
+        station_infos = []
         for station in stations:
             try:
-                station_info = api.Station(station, force_fresh=force_fresh, force_stale=force_stale)
-                locations = station_info.gps_locations
+                station_infos.append(api.Station(station, force_fresh=force_fresh, force_stale=force_stale))
+            except Exception as error:
+                station_infos.append(error)
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            list(
+                executor.map(
+                    _prefetch_station_metadata,
+                    [station_info for station_info in station_infos if not isinstance(station_info, Exception)],
+                ),
+            )
+        metadata = [_get_station_metadata(station_info) for station_info in station_infos]
+
+        for station, (locations, n_detectors, detectors) in zip(stations, metadata):
+            try:
+                if isinstance(locations, Exception):
+                    raise locations
                 llas = locations[['latitude', 'longitude', 'altitude']]
                 station_ts = locations['timestamp']
             except Exception:
@@ -819,7 +843,8 @@ class HiSPARCStations(CompassStations):
                 else:
                     raise KeyError('Could not get GPS info for station %d.' % station)
             else:
-                n_detectors = station_info.n_detectors()
+                if isinstance(n_detectors, Exception):
+                    raise n_detectors
 
             if reference_required:
                 # Get latest GPS location of first station with locations
@@ -833,7 +858,8 @@ class HiSPARCStations(CompassStations):
             enu = [list(coordinate) for coordinate in zip(*enu)]
 
             try:
-                detectors = station_info.station_layouts
+                if isinstance(detectors, Exception):
+                    raise detectors
                 fields = ('radius', 'alpha', 'height', 'beta')
                 razbs = [[detectors['%s%d' % (field, i)] for field in fields] for i in range(1, n_detectors + 1)]
                 detector_ts = detectors['timestamp']
@@ -866,6 +892,59 @@ class HiSPARCStations(CompassStations):
         return f'{self.__class__.__name__}({[s.number for s in self.stations]!r})'
 
 
+def _prefetch_station_metadata(station_info):
+    """Request the metadata of a station needed for a cluster
+
+    Only the requests are made, without parsing the responses, so this can
+    safely be called from other threads.
+
+    :param station_info: :class:`~sapphire.api.Station` instance.
+
+    """
+    station = station_info.station
+    station_info._prefetch(
+        json_paths=[station_info.urls['station_info'].format(station_number=station)],
+        tsv_paths=[
+            (station_info.src_urls['gps'].format(station_number=station), station_info.gps_columns),
+            (station_info.src_urls['layout'].format(station_number=station), station_info.layout_columns),
+        ],
+    )
+
+
+def _get_station_metadata(station_info):
+    """Get the metadata of a station needed for a cluster
+
+    Exceptions are returned instead of raised, so the metadata of many
+    stations can be handled afterwards.
+
+    :param station_info: :class:`~sapphire.api.Station` instance, or the
+                         exception raised while creating it.
+    :return: the GPS locations, number of detectors, and station layouts,
+             or the exception raised while retrieving each of those.
+             The number of detectors and layouts are None if the GPS
+             locations could not be retrieved.
+
+    """
+    try:
+        if isinstance(station_info, Exception):
+            raise station_info
+        locations = station_info.gps_locations
+    except Exception as error:
+        return error, None, None
+
+    try:
+        n_detectors = station_info.n_detectors()
+    except Exception as error:
+        n_detectors = error
+
+    try:
+        detectors = station_info.station_layouts
+    except Exception as error:
+        detectors = error
+
+    return locations, n_detectors, detectors
+
+
 class ScienceParkCluster(HiSPARCStations):
     """A cluster containing stations from the Science Park subcluster
 
@@ -16,16 +16,23 @@ To make the script show information about what it will do add the help flag::
 
     $ update_local_data --help
 
+Afterwards the local data is compiled into a single archive, from which the
+:mod:`~sapphire.api` reads local data much faster than from the separate
+files.  After changing local files the archive can be recompiled using
+:func:`compile_local_data`.
+
 """
 
 import argparse
 import warnings
 
 from itertools import combinations
-from json import dump, loads
+from json import dump, dumps, loads
 from os import extsep, makedirs, mkdir, path
 
-from ..api import API, LOCAL_BASE, Network, get_src_base
+import numpy as np
+
+from ..api import API, LOCAL_ARCHIVE, LOCAL_BASE, Network, clear_local_archive, get_src_base
 from ..clusters import HiSPARCNetwork
 from ..utils import pbar
 
@@ -70,6 +77,94 @@ def update_local_tsv(progress=True):
         update_subsublevel_tsv(data_type, station_numbers, network, progress=progress)
 
 
+def compile_local_data(progress=True):
+    """Compile the local JSON and TSV data into a single archive
+
+    The JSON data and the station metadata TSV data (the data types
+    downloaded by :func:`update_local_tsv`) are stored in one compressed
+    NumPy archive.  The parsed values of all TSV files of a data type are
+    stored in one array, along with an index of the rows and column types
+    of each file.  Files with values which can not be stored exactly are
+    left out, those are still read from the file.
+
+    """
+    data_types = [
+        'gps',
+        'trigger',
+        'layout',
+        'voltage',
+        'current',
+        'electronics',
+        'detector_timing_offsets',
+        'station_timing_offsets',
+    ]
+    if progress:
+        print('Compiling local data')
+
+    json_data = {
+        json_path.relative_to(LOCAL_BASE).with_suffix('').as_posix(): json_path.read_text()
+        for json_path in sorted(LOCAL_BASE.rglob('*.json'))
+    }
+    arrays = {'json': np.array(dumps(json_data))}
+
+    for data_type in pbar(data_types, show=progress):
+        subdir = LOCAL_BASE / API.src_urls[data_type].split('/')[0]
+        blocks = []
+        index = []
+        n_rows = 0
+        for tsv_path in sorted(subdir.rglob('*.tsv')):
+            values, types = _parse_local_tsv(tsv_path)
+            if values is None:
+                continue
+            blocks.append(values)
+            index.append((tsv_path.relative_to(subdir).with_suffix('').as_posix(), n_rows, n_rows + len(values), types))
+            n_rows += len(values)
+        if not blocks:
+            continue
+        n_columns = max(block.shape[1] for block in blocks)
+        arrays[f'tsv/{subdir.name}/values'] = np.vstack(
+            [np.pad(block, ((0, 0), (0, n_columns - block.shape[1])), constant_values=np.nan) for block in blocks],
+        )
+        arrays[f'tsv/{subdir.name}/index'] = np.array(
+            index,
+            dtype=[('path', 'U32'), ('start', 'i8'), ('stop', 'i8'), ('types', 'U32')],
+        )
+
+    np.savez_compressed(LOCAL_ARCHIVE, **arrays)
+    clear_local_archive()
+
+
+def _parse_local_tsv(tsv_path):
+    """Parse a local TSV file for the compiled archive
+
+    The file is parsed like :class:`~sapphire.api.API` parses it.
+
+    :return: the values as 2D float array and the type of each column
+             ('i' for integer, 'f' for float), or None, None if the
+             values can not be stored exactly as floats.
+
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore')
+        data = np.atleast_1d(np.genfromtxt(tsv_path, delimiter='\t', dtype=None))
+    if data.dtype.names is None:
+        with open(tsv_path) as tsvfile:
+            n_columns = len(tsvfile.readline().split('\t'))
+        columns = list(data.reshape(-1, n_columns).T)
+    else:
+        columns = [data[name] for name in data.dtype.names]
+
+    types = ''
+    for column in columns:
+        if column.dtype == np.dtype(int) and np.all(np.abs(column) < 2**53):
+            types += 'i'
+        elif column.dtype == np.dtype(float):
+            types += 'f'
+        else:
+            return None, None
+    return np.column_stack(columns).astype(float), types
+
+
 def update_toplevel_json(data_type):
     url = API.urls[data_type]
     try:
@@ -169,3 +264,4 @@ def main():
     parser.parse_args()
     update_local_json()
     update_local_tsv()
+    compile_local_data()
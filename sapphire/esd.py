@@ -9,7 +9,8 @@ function like this::
     >>> from sapphire import quick_download
     >>> data = quick_download(501)
 
-For regular use, look up :func:`download_data`.
+For regular use, look up :func:`download_data`.  To get the data as a
+NumPy array without creating a file, use :func:`download_array`.
 
 """
 
@@ -20,19 +21,34 @@ import datetime
 import itertools
 import os.path
 import re
+import tempfile
 import time
 
 from codecs import iterdecode
-from http.client import BadStatusLine
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from io import BytesIO
 from urllib.parse import urlencode, urljoin
-from urllib.request import urlopen
 
+import numpy as np
 import tables
 
 from progressbar import ETA, Bar, Percentage, ProgressBar
 
 from . import api, storage
-from .utils import get_publicdb_base
+from .cache import get_response_cache, interval_ttl
+from .transformations.clock import datetime_to_gps, gps_to_datetime
+from .transport import urlopen
+from .utils import get_publicdb_base, pbar
+
+#: Approximate number of bytes read from a TSV source before parsing a block.
+TSV_BLOCK_SIZE = 4 * 1024 * 1024
+
+#: Number of rows read at once when scanning a column of a table.
+READ_CHUNK_SIZE = 1_000_000
+
+#: Number of coincidences buffered before they are stored.
+COINCIDENCE_BATCH_SIZE = 10_000
 
 
 def get_base_url():
@@ -121,29 +137,13 @@ def load_data(file, group, tsv_file, type='events'):
         >>> sapphire.esd.load_data(data, '/s501', 'events-s501-20130910.tsv')
 
     """
-    if type == 'events':
-        table = _get_or_create_events_table(file, group)
-        read_and_store_class = ReadLineAndStoreEventClass
-    elif type == 'weather':
-        table = _get_or_create_weather_table(file, group)
-        read_and_store_class = ReadLineAndStoreWeatherClass
-    elif type == 'singles':
-        table = _get_or_create_singles_table(file, group)
-        read_and_store_class = ReadLineAndStoreSinglesClass
-    elif type == 'lightning':
-        table = _get_or_create_lightning_table(file, group)
-        read_and_store_class = ReadLineAndStoreLightningClass
-    else:
-        raise ValueError('Data type not recognized.')
+    table, read_and_store_class = _get_or_create_table_and_writer(file, group, type)
 
-    with open(tsv_file, 'rb') as data:
-        reader = csv.reader(iterdecode(data, 'utf-8'), delimiter='\t')
-        with read_and_store_class(table) as writer:
-            for line in reader:
-                writer.store_line(line)
+    with open(tsv_file, 'rb') as data, read_and_store_class(table) as writer:
+        _store_tsv_blocks(data, writer)
 
 
-def download_data(file, group, station_number, start=None, end=None, type='events', progress=True):
+def download_data(file, group, station_number, start=None, end=None, type='events', progress=True, incremental=False):
     """Download event summary data
 
     :param file: the PyTables datafile handler.
@@ -153,6 +153,8 @@ def download_data(file, group, station_number, start=None, end=None, type='event
     :param end: a datetime instance defining the end of the search interval.
     :param type: the datatype to download, either 'events', 'weather', or 'singles'.
     :param progress: if True show a progressbar while downloading.
+    :param incremental: if True only download data after the data already
+                        stored in the table, see below.
 
     If group is None, use '/s<station_number>' as a default.
 
@@ -161,6 +163,17 @@ def download_data(file, group, station_number, start=None, end=None, type='event
     worth of data is downloaded, starting at the datetime specified with
     start.
 
+    In incremental mode the interval is downloaded per day.  The parts of
+    the interval of which all data is stored are recorded in the
+    'covered_intervals' attribute of the table, as [start, end) GPS
+    timestamps, also when a download is interrupted.  A day resumes after
+    the part covered from the start of that day, otherwise the whole day
+    is downloaded again.  Lines with an (ext_)timestamp which is already
+    stored are not stored again.  This continues an interrupted download or
+    tops up an existing file.  Days which are completely covered are
+    recorded in the 'completed_days' attribute, as the timestamp of the
+    start of the day, and are skipped.
+
     Example::
 
         >>> import tables
@@ -176,41 +189,19 @@ def download_data(file, group, station_number, start=None, end=None, type='event
         group = '/s%d' % station_number
 
     # sensible defaults for start and end
-    if start is None:
-        if end is not None:
-            raise RuntimeError("Start is None, but end is not. I can't go on like this.")
-        else:
-            yesterday = datetime.date.today() - datetime.timedelta(days=1)
-            start = datetime.datetime.combine(yesterday, datetime.time(0, 0))
-    if end is None:
-        end = start + datetime.timedelta(days=1)
+    start, end = _get_start_end(start, end)
 
     # build and open url, create tables and set read function
-    query = urlencode({'start': start, 'end': end})
-    if type == 'events':
-        url = get_events_url().format(station_number=station_number, query=query)
-        table = _get_or_create_events_table(file, group)
-        read_and_store = ReadLineAndStoreEventClass
-    elif type == 'weather':
-        url = get_weather_url().format(station_number=station_number, query=query)
-        table = _get_or_create_weather_table(file, group)
-        read_and_store = ReadLineAndStoreWeatherClass
-    elif type == 'singles':
-        url = get_singles_url().format(station_number=station_number, query=query)
-        table = _get_or_create_singles_table(file, group)
-        read_and_store = ReadLineAndStoreSinglesClass
-    elif type == 'lightning':
-        url = get_lightning_url().format(lightning_type=station_number, query=query)
-        table = _get_or_create_lightning_table(file, group)
-        read_and_store = ReadLineAndStoreLightningClass
-    else:
-        raise ValueError('Data type not recognized.')
+    url = _get_data_url(type)
+    table, read_and_store = _get_or_create_table_and_writer(file, group, type)
 
-    try:
-        data = urlopen(url)
-    except BadStatusLine:
-        # Unexplained transient error, retry once
-        data = urlopen(url)
+    if incremental:
+        downloads = _get_incremental_downloads(table, start, end)
+        if not downloads:
+            # All data in the interval is already stored
+            return
+    else:
+        downloads = [(start, end, None)]
 
     # keep track of event timestamp within [start, end] interval for
     # progressbar
@@ -220,29 +211,83 @@ def download_data(file, group, station_number, start=None, end=None, type='event
     if progress:
         pbar = ProgressBar(max_value=1.0, widgets=[Percentage(), Bar(), ETA()]).start()
 
-    # loop over lines in tsv as they come streaming in
-    prev_update = time.time()
-    reader = csv.reader(iterdecode(data, 'utf-8'), delimiter='\t')
+    # parse and store blocks of lines as they come streaming in
+    def update_progressbar(timestamp):
+        pbar.update((1.0 * timestamp - t_start) / t_delta)
+
+    for query_start, query_end, exclude in downloads:
+        query = urlencode({'start': query_start, 'end': query_end})
+        data = _open_tsv(
+            url.format(station_number=station_number, lightning_type=station_number, query=query),
+            ttl=interval_ttl(query_end),
+        )
+        with read_and_store(table, exclude=exclude) as writer:
+            try:
+                line = _store_tsv_blocks(data, writer, update_progressbar if progress else None)
+            finally:
+                if incremental and writer.last_timestamp is not None:
+                    # All data before the second of the last received line is stored
+                    _mark_covered(table, query_start, gps_to_datetime(writer.last_timestamp))
+        _check_download_complete(line)
+        if incremental:
+            _mark_covered(table, query_start, query_end)
+
+    if progress:
+        pbar.finish()
+
+
+def download_array(station_number, start=None, end=None, type='events', progress=True):
+    """Download event summary data into a NumPy array
+
+    Unlike :func:`download_data` no PyTables file is needed, the data is
+    parsed straight into memory.  This is useful for short-lived analyses
+    which do not need to keep the data.
+
+    :param station_number: The HiSPARC station number for which to get
+                           data, or the lightning type for lightning data.
+    :param start: a datetime instance defining the start of the search interval.
+    :param end: a datetime instance defining the end of the search interval.
+    :param type: the datatype to download, either 'events', 'weather',
+                 'singles', or 'lightning'.
+    :param progress: if True show a progressbar while downloading.
+    :return: structured array with the same columns as the table created
+             by :func:`download_data`.
+
+    The start and end parameters are handled as in :func:`download_data`.
+
+    Example::
+
+        >>> import datetime
+        >>> import sapphire.esd
+        >>> events = sapphire.esd.download_array(501, datetime.datetime(2013, 9, 1))
+        >>> events['pulseheights'].mean(axis=0)
+
+    """
+    start, end = _get_start_end(start, end)
+    url = _get_data_url(type)
+    description, read_and_store = _get_description_and_writer(type)
+    table = _ArrayTable(description)
+
+    query = urlencode({'start': start, 'end': end})
+    url = url.format(station_number=station_number, lightning_type=station_number, query=query)
+    data = _open_tsv(url, ttl=interval_ttl(end))
+
+    t_start = calendar.timegm(start.utctimetuple())
+    t_delta = calendar.timegm(end.utctimetuple()) - t_start
+    if progress:
+        pbar = ProgressBar(max_value=1.0, widgets=[Percentage(), Bar(), ETA()]).start()
+
+    def update_progressbar(timestamp):
+        pbar.update((1.0 * timestamp - t_start) / t_delta)
+
     with read_and_store(table) as writer:
-        for line in reader:
-            timestamp = writer.store_line(line)
-            # update progressbar every 0.5 seconds
-            if progress and time.time() - prev_update > 0.5 and timestamp != 0.0:
-                pbar.update((1.0 * timestamp - t_start) / t_delta)
-                prev_update = time.time()
+        line = _store_tsv_blocks(data, writer, update_progressbar if progress else None)
     if progress:
         pbar.finish()
 
-    if line[0][0] == '#':
-        if len(line[0]) == 1:
-            # No events received, and no success line
-            raise ValueError('Failed to download data, no data received.')
-        else:
-            # Successful download because last line is a non-empty comment
-            return
-    else:
-        # Last line is data, report failed download and date/time of last line
-        raise ValueError('Failed to complete download, last received data from: %s %s.' % tuple(line[:2]))
+    _check_download_complete(line)
+
+    return table.read()
 
 
 def download_lightning(file, group, lightning_type=4, start=None, end=None, progress=True):
@@ -275,7 +320,7 @@ def download_lightning(file, group, lightning_type=4, start=None, end=None, prog
     download_data(file, group, lightning_type, start=start, end=end, type='lightning', progress=progress)
 
 
-def load_coincidences(file, tsv_file, group=''):
+def load_coincidences(file, tsv_file, group='', batch_size=COINCIDENCE_BATCH_SIZE):
     """Load downloaded event summary data into PyTables file.
 
     If you've previously downloaded coincidence data from the HiSPARC Public
@@ -287,6 +332,7 @@ def load_coincidences(file, tsv_file, group=''):
     :param tsv_file: path to the tsv file downloaded from the HiSPARC
                      Public Database containing coincidences.
     :param group: the PyTables destination group, which need not exist.
+    :param batch_size: number of coincidences to store at once.
 
     Example::
 
@@ -305,21 +351,21 @@ def load_coincidences(file, tsv_file, group=''):
         reader = csv.reader(iterdecode(data, 'utf-8'), delimiter='\t')
         current_coincidence = 0
         coincidence = []
-        for line in reader:
-            if line[0][0] == '#':
-                continue
-            elif int(line[0]) == current_coincidence:
-                coincidence.append(line)
-            else:
-                # Full coincidence has been received, store it.
-                _read_lines_and_store_coincidence(file, c_group, coincidence, station_groups)
-                coincidence = [line]
-                current_coincidence = int(line[0])
-                file.flush()
-
-        if len(coincidence):
-            # Store last coincidence
-            _read_lines_and_store_coincidence(file, c_group, coincidence, station_groups)
+        with ReadLinesAndStoreCoincidenceClass(file, c_group, station_groups, batch_size) as writer:
+            for line in reader:
+                if line[0][0] == '#':
+                    continue
+                elif int(line[0]) == current_coincidence:
+                    coincidence.append(line)
+                else:
+                    # Full coincidence has been received, store it.
+                    writer.store_coincidence(coincidence)
+                    coincidence = [line]
+                    current_coincidence = int(line[0])
+
+            if len(coincidence):
+                # Store last coincidence
+                writer.store_coincidence(coincidence)
 
         if line[0][0] == '#':
             if len(line[0]) == 1:
@@ -335,7 +381,17 @@ def load_coincidences(file, tsv_file, group=''):
         file.flush()
 
 
-def download_coincidences(file, group='', cluster=None, stations=None, start=None, end=None, n=2, progress=True):
+def download_coincidences(
+    file,
+    group='',
+    cluster=None,
+    stations=None,
+    start=None,
+    end=None,
+    n=2,
+    progress=True,
+    batch_size=COINCIDENCE_BATCH_SIZE,
+):
     """Download event summary data coincidences
 
     :param file: PyTables datafile handler.
@@ -345,6 +401,8 @@ def download_coincidences(file, group='', cluster=None, stations=None, start=Non
     :param start: a datetime instance defining the start of the search interval.
     :param end: a datetime instance defining the end of the search interval.
     :param n: the minimum number of events in the coincidence.
+    :param progress: if True show a progressbar while downloading.
+    :param batch_size: number of coincidences to store at once.
 
     The start and end parameters may both be None.  In that case,
     yesterday's data is downloaded.  If only end is None, a single day's
@@ -366,14 +424,7 @@ def download_coincidences(file, group='', cluster=None, stations=None, start=Non
 
     """
     # sensible defaults for start and end
-    if start is None:
-        if end is not None:
-            raise RuntimeError("Start is None, but end is not. I can't go on like this.")
-        else:
-            yesterday = datetime.date.today() - datetime.timedelta(days=1)
-            start = datetime.datetime.combine(yesterday, datetime.time(0, 0))
-    if end is None:
-        end = start + datetime.timedelta(days=1)
+    start, end = _get_start_end(start, end)
 
     if stations is not None and len(stations) < n:
         raise ValueError('To few stations in query, give at least n.')
@@ -384,11 +435,7 @@ def download_coincidences(file, group='', cluster=None, stations=None, start=Non
     station_groups = _read_or_get_station_groups(file, group)
     c_group = _get_or_create_coincidences_tables(file, group, station_groups)
 
-    try:
-        data = urlopen(url, timeout=1800)
-    except BadStatusLine:
-        # Unexplained transient error, retry once
-        data = urlopen(url, timeout=1800)
+    data = _open_tsv(url, timeout=1800, ttl=interval_ttl(end))
 
     # keep track of event timestamp within [start, end] interval for
     # progressbar
@@ -404,25 +451,25 @@ def download_coincidences(file, group='', cluster=None, stations=None, start=Non
     reader = csv.reader(iterdecode(data, 'utf-8'), delimiter='\t')
     current_coincidence = 0
     coincidence = []
-    for line in reader:
-        if line[0][0] == '#':
-            continue
-        elif int(line[0]) == current_coincidence:
-            coincidence.append(line)
-        else:
-            # Full coincidence has been received, store it.
-            timestamp = _read_lines_and_store_coincidence(file, c_group, coincidence, station_groups)
-            # update progressbar every 0.5 seconds
-            if progress and time.time() - prev_update > 0.5 and timestamp != 0.0:
-                pbar.update((1.0 * timestamp - t_start) / t_delta)
-                prev_update = time.time()
-            coincidence = [line]
-            current_coincidence = int(line[0])
-            file.flush()
-
-    if len(coincidence):
-        # Store last coincidence
-        _read_lines_and_store_coincidence(file, c_group, coincidence, station_groups)
+    with ReadLinesAndStoreCoincidenceClass(file, c_group, station_groups, batch_size) as writer:
+        for line in reader:
+            if line[0][0] == '#':
+                continue
+            elif int(line[0]) == current_coincidence:
+                coincidence.append(line)
+            else:
+                # Full coincidence has been received, store it.
+                timestamp = writer.store_coincidence(coincidence)
+                # update progressbar every 0.5 seconds
+                if progress and time.time() - prev_update > 0.5 and timestamp != 0.0:
+                    pbar.update((1.0 * timestamp - t_start) / t_delta)
+                    prev_update = time.time()
+                coincidence = [line]
+                current_coincidence = int(line[0])
+
+        if len(coincidence):
+            # Store last coincidence
+            writer.store_coincidence(coincidence)
     if progress:
         pbar.finish()
 
@@ -440,6 +487,420 @@ def download_coincidences(file, group='', cluster=None, stations=None, start=Non
     file.flush()
 
 
+def download_many(
+    file,
+    stations,
+    start=None,
+    end=None,
+    type='events',
+    group='',
+    n_workers=4,
+    retries=2,
+    retry_delay=1,
+    progress=True,
+    incremental=False,
+):
+    """Download event summary data for multiple stations concurrently
+
+    The interval is split into separate requests per station per day.
+    These are downloaded concurrently by a pool of worker threads, while
+    the data is stored in order of station and time.  A day is only stored
+    if its download was complete, failed days are retried and otherwise
+    reported in the returned list.
+
+    :param file: the PyTables datafile handler.
+    :param stations: list of HiSPARC station numbers for which to get data,
+                     or lightning types for lightning data.
+    :param start: a datetime instance defining the start of the search interval.
+    :param end: a datetime instance defining the end of the search interval.
+    :param type: the datatype to download, either 'events', 'weather',
+                 'singles', or 'lightning'.
+    :param group: path of the parent group for the station groups, the data
+                  is stored in '<group>/s<station_number>'.
+    :param n_workers: maximum number of concurrent downloads.
+    :param retries: number of times a failed download is retried.
+    :param retry_delay: delay in seconds before the first retry, the delay
+                        doubles for each following retry.
+    :param progress: if True show a progressbar while downloading.
+    :param incremental: if True skip days which are marked as completed
+                        and only download the parts of the other days which
+                        are not yet covered.
+    :return: list of (station_number, start) tuples for each day for which
+             the download failed.
+
+    The start, end, and incremental parameters behave the same as for
+    :func:`download_data`.
+
+    Example::
+
+        >>> import tables
+        >>> import datetime
+        >>> import sapphire.esd
+        >>> from sapphire import Network
+        >>> stations = Network().station_numbers(cluster=500)
+        >>> data = tables.open_file('data.h5', 'w')
+        >>> failed = sapphire.esd.download_many(data, stations,
+        ...     datetime.datetime(2013, 9, 1), datetime.datetime(2013, 10, 1))
+
+    """
+    start, end = _get_start_end(start, end)
+    url = _get_data_url(type)
+
+    tasks = []
+    for station_number in stations:
+        table = None
+        if incremental:
+            try:
+                table = file.get_node('%s/s%d' % (group, station_number), type)
+            except tables.NoSuchNodeError:
+                pass
+        if table is None:
+            days = [(day_start, day_end, None) for day_start, day_end in _split_in_days(start, end)]
+        else:
+            days = _get_incremental_downloads(table, start, end)
+        for query_start, day_end, exclude in days:
+            tasks.append((station_number, exclude, query_start, day_end))
+    downloads = [
+        (
+            url.format(
+                station_number=station_number,
+                lightning_type=station_number,
+                query=urlencode({'start': query_start, 'end': day_end}),
+            ),
+            interval_ttl(day_end),
+        )
+        for station_number, _, query_start, day_end in tasks
+    ]
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        results = _ordered_results(executor, _download_tsv, downloads, 2 * n_workers, retries, retry_delay)
+        for task, result in pbar(zip(tasks, results), length=len(tasks), show=progress):
+            station_number, exclude, query_start, day_end = task
+            try:
+                tsv = result.result()
+            except (OSError, HTTPException, ValueError):
+                failed.append((station_number, query_start))
+                continue
+            table, read_and_store = _get_or_create_table_and_writer(file, '%s/s%d' % (group, station_number), type)
+            with read_and_store(table, exclude=exclude) as writer:
+                _store_tsv_blocks(BytesIO(tsv), writer)
+            if incremental:
+                _mark_covered(table, query_start, day_end)
+
+    return failed
+
+
+def _get_start_end(start, end):
+    """Get sensible defaults for the start and end of an interval
+
+    If both start and end are None, the interval covers yesterday.  If only
+    end is None, the interval is one day starting at start.
+
+    :param start: a datetime instance or None.
+    :param end: a datetime instance or None.
+    :return: start and end datetime instances.
+
+    """
+    if start is None:
+        if end is not None:
+            raise RuntimeError("Start is None, but end is not. I can't go on like this.")
+        else:
+            yesterday = datetime.date.today() - datetime.timedelta(days=1)
+            start = datetime.datetime.combine(yesterday, datetime.time(0, 0))
+    if end is None:
+        end = start + datetime.timedelta(days=1)
+    return start, end
+
+
+def _get_covered_intervals(table):
+    """Get the intervals of which all data is stored in a table
+
+    :param table: PyTables table containing ESD data.
+    :return: array with the sorted, non-overlapping [start, end) GPS
+             timestamps of the covered intervals as rows.
+
+    """
+    if 'covered_intervals' in table._v_attrs:
+        return np.array(table._v_attrs.covered_intervals, dtype=np.int64).reshape(-1, 2)
+    else:
+        return np.zeros((0, 2), dtype=np.int64)
+
+
+def _mark_covered(table, start, end):
+    """Record that all data in an interval is stored in a table
+
+    The interval is merged into the 'covered_intervals' attribute of the
+    table.  The days which are then completely covered are recorded in
+    the sorted 'completed_days' attribute of the table, as the timestamps
+    of the start of the days.
+
+    :param table: PyTables table containing ESD data.
+    :param start: a datetime instance defining the start of the covered interval.
+    :param end: a datetime instance defining the end of the covered interval.
+
+    """
+    start = datetime_to_gps(start)
+    end = datetime_to_gps(end)
+    if end <= start:
+        return
+
+    merged = []
+    for interval_start, interval_end in sorted([*_get_covered_intervals(table).tolist(), [start, end]]):
+        if merged and interval_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], interval_end)
+        else:
+            merged.append([interval_start, interval_end])
+    table._v_attrs.covered_intervals = np.array(merged, dtype=np.int64)
+
+    days = [
+        day
+        for interval_start, interval_end in merged
+        for day in range(-(-interval_start // 86400) * 86400, interval_end - 86400 + 1, 86400)
+    ]
+    if days:
+        days.extend(_get_completed_days(table))
+        table._v_attrs.completed_days = np.unique(np.array(days, dtype=np.int64))
+
+
+def _get_stored_timestamps(table, intervals):
+    """Get the stored timestamps of a table in a number of intervals
+
+    The ext_timestamp column is used if it is available, otherwise the
+    timestamp column.  The column is read in chunks to limit memory use.
+
+    :param table: PyTables table containing ESD data.
+    :param intervals: list of sorted, non-overlapping (start, end)
+                      datetime tuples.
+    :return: list with for each interval a sorted array of the values of
+             the timestamp column of the rows in [start, end).
+
+    """
+    column = 'ext_timestamp' if 'ext_timestamp' in table.colnames else 'timestamp'
+    scale = 1_000_000_000 if column == 'ext_timestamp' else 1
+    bounds = np.array([[datetime_to_gps(start), datetime_to_gps(end)] for start, end in intervals], dtype=np.int64)
+    stored = [[] for _ in intervals]
+    if not intervals:
+        return stored
+
+    for chunk_start in range(0, table.nrows, READ_CHUNK_SIZE):
+        timestamps = table.read(chunk_start, chunk_start + READ_CHUNK_SIZE, field=column)
+        seconds = (timestamps // scale).astype(np.int64)
+        idx = np.searchsorted(bounds[:, 0], seconds, side='right') - 1
+        inside = np.flatnonzero((idx >= 0) & (seconds < bounds[np.maximum(idx, 0), 1]))
+        order = inside[np.argsort(idx[inside], kind='stable')]
+        interval_idx, first = np.unique(idx[order], return_index=True)
+        for i, values in zip(interval_idx.tolist(), np.split(timestamps[order], first[1:])):
+            stored[i].append(values)
+
+    return [np.sort(np.concatenate(values)) if values else np.zeros(0, dtype=np.int64) for values in stored]
+
+
+def _get_incremental_downloads(table, start, end):
+    """Get the parts of an interval which still need to be downloaded
+
+    The interval is split into days.  Days marked as completed are skipped,
+    other days resume after the part which is covered from the start of
+    the day.  The stored rows in the remaining parts are not known to be
+    complete, so their timestamps are returned to skip them when storing
+    the data again.
+
+    :param table: PyTables table containing ESD data.
+    :param start: a datetime instance defining the start of the interval.
+    :param end: a datetime instance defining the end of the interval.
+    :return: list of (query_start, day_end, exclude) tuples, with the
+             datetime to start the download from, the end of the (part of
+             the) day, and a sorted array of the timestamp column values
+             already stored in that interval.
+
+    """
+    covered = _get_covered_intervals(table)
+    completed_days = _get_completed_days(table)
+
+    downloads = []
+    for day_start, day_end in _split_in_days(start, end):
+        day = datetime_to_gps(day_start) // 86400 * 86400
+        if day in completed_days:
+            continue
+        query_start = datetime_to_gps(day_start)
+        # The covered intervals are merged, so at most one contains the start
+        for covered_start, covered_end in covered.tolist():
+            if covered_start <= query_start < covered_end:
+                query_start = covered_end
+        query_start = gps_to_datetime(query_start)
+        if query_start < day_end:
+            downloads.append((query_start, day_end))
+
+    stored = _get_stored_timestamps(table, downloads)
+    return [(query_start, day_end, exclude) for (query_start, day_end), exclude in zip(downloads, stored)]
+
+
+def _get_completed_days(table):
+    """Get the days marked as completed for a table
+
+    :param table: PyTables table containing ESD data.
+    :return: set of timestamps of the start of the completed days.
+
+    """
+    if 'completed_days' in table._v_attrs:
+        return {int(day) for day in table._v_attrs.completed_days}
+    else:
+        return set()
+
+
+def _split_in_days(start, end):
+    """Split an interval at midnight into intervals of at most a day
+
+    :param start: a datetime instance defining the start of the interval.
+    :param end: a datetime instance defining the end of the interval.
+    :return: generator yielding (start, end) tuples.
+
+    """
+    day_start = start
+    while day_start < end:
+        next_day = datetime.datetime.combine(day_start.date() + datetime.timedelta(days=1), datetime.time(0, 0))
+        day_end = min(next_day, end)
+        yield day_start, day_end
+        day_start = day_end
+
+
+def _ordered_results(executor, function, arguments, window, *args):
+    """Submit tasks to an executor and yield the futures in order
+
+    At most window tasks are pending at once, to limit the number of
+    results kept in memory while waiting for earlier tasks.
+
+    :param executor: a concurrent.futures Executor.
+    :param function: function to call for each tuple of arguments.
+    :param arguments: tuples of the first arguments for each call of the
+                      function.
+    :param window: maximum number of pending tasks.
+    :param args: additional arguments passed to each call.
+    :return: generator yielding the futures in the order of the arguments.
+
+    """
+    pending = collections.deque()
+    for argument in arguments:
+        pending.append(executor.submit(function, *argument, *args))
+        if len(pending) >= window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def _download_tsv(url, ttl=None, retries=0, retry_delay=1):
+    """Download a complete TSV response
+
+    The download is retried if it fails or if the response is incomplete.
+    If the response cache is enabled it is used for the download.
+
+    :param url: the url to download.
+    :param ttl: time to live of the response in the cache in seconds.
+    :param retries: number of times a failed download is retried.
+    :param retry_delay: delay in seconds before the first retry, the delay
+                        doubles for each following retry.
+    :return: the response body.
+
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        tsv = cache.get(url)
+        if tsv is not None:
+            return tsv
+
+    for attempt in range(retries + 1):
+        try:
+            tsv = urlopen(url).read()
+            _check_download_complete(_get_last_line(tsv))
+        except (OSError, HTTPException, ValueError):
+            if attempt == retries:
+                raise
+            time.sleep(retry_delay * 2**attempt)
+        else:
+            if cache is not None:
+                cache.set(url, tsv, ttl)
+            return tsv
+
+
+def _open_tsv(url, timeout=1800, ttl=None):
+    """Open a TSV download, using the response cache if it is enabled
+
+    Without cache the response is streamed.  With cache the response is
+    streamed to a temporary file, and only stored in the cache if it is
+    complete and not larger than the maximum response size of the cache.
+
+    :param url: the url to download.
+    :param timeout: timeout in seconds for the connection.
+    :param ttl: time to live of the response in the cache in seconds.
+    :return: binary file-like object with the response.
+
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        tsv = cache.get(url)
+        if tsv is not None:
+            return BytesIO(tsv)
+
+    data = urlopen(url, timeout=timeout)
+
+    if cache is None:
+        return data
+
+    tsv_file = tempfile.TemporaryFile()
+    tail = b''
+    for chunk in iter(lambda: data.read(TSV_BLOCK_SIZE), b''):
+        tsv_file.write(chunk)
+        # Keep enough of the end of the response to find the last line
+        tail = (tail + chunk)[-TSV_BLOCK_SIZE:]
+    size = tsv_file.tell()
+    tsv_file.seek(0)
+
+    try:
+        _check_download_complete(_get_last_line(tail))
+    except ValueError:
+        pass
+    else:
+        if size <= cache.max_response_size:
+            cache.set(url, tsv_file.read(), ttl)
+            tsv_file.seek(0)
+    return tsv_file
+
+
+def _get_last_line(tsv):
+    """Get the last non-empty line of a TSV response
+
+    :param tsv: the response body as bytes.
+    :return: the last line split into columns, or None if it is empty.
+
+    """
+    last_line = tsv.rstrip().rpartition(b'\n')[2]
+    if last_line:
+        return last_line.decode('utf-8').split('\t')
+    else:
+        return None
+
+
+def _check_download_complete(line):
+    """Check the last line of a download for successful completion
+
+    A successful download ends with a non-empty comment line.
+
+    :param line: the last line of the downloaded TSV split into columns,
+                 or None if no data was received.
+
+    """
+    if line is None or line[0][0] == '#':
+        if line is None or len(line[0]) == 1:
+            # No events received, and no success line
+            raise ValueError('Failed to download data, no data received.')
+        else:
+            # Successful download because last line is a non-empty comment
+            return
+    else:
+        # Last line is data, report failed download and date/time of last line
+        raise ValueError('Failed to complete download, last received data from: %s %s.' % tuple(line[:2]))
+
+
 def _read_or_get_station_groups(file, group):
     """Get station numbers from existing cluster attribute or a new set
 
@@ -527,6 +988,65 @@ def _create_coincidences_tables(file, group, station_groups):
     return coincidences._v_parent
 
 
+def _get_or_create_table_and_writer(file, group, type):
+    """Get or create the table for a datatype and the class to store lines
+
+    :param file: PyTables file.
+    :param group: the group to contain the table, which need not exist.
+    :param type: the datatype, either 'events', 'weather', 'singles', or 'lightning'.
+    :return: the table and the ReadLineAndStore class for the datatype.
+
+    """
+    description, read_and_store_class = _get_description_and_writer(type)
+    try:
+        table = file.get_node(group, type)
+    except tables.NoSuchNodeError:
+        table = file.create_table(group, type, description, createparents=True)
+    return table, read_and_store_class
+
+
+def _get_description_and_writer(type):
+    """Get the table description for a datatype and the class to store lines
+
+    :param type: the datatype, either 'events', 'weather', 'singles', or 'lightning'.
+    :return: the table description and the ReadLineAndStore class for the
+             datatype.
+
+    """
+    _, description, read_and_store_class = _get_data_type(type)
+    return description, read_and_store_class
+
+
+def _get_data_url(type):
+    """Get the url template for downloading a datatype
+
+    :param type: the datatype, either 'events', 'weather', 'singles', or 'lightning'.
+
+    """
+    url, _, _ = _get_data_type(type)
+    return url
+
+
+def _get_data_type(type):
+    """Get the url template, table description and class to store lines for a datatype
+
+    :param type: the datatype, either 'events', 'weather', 'singles', or 'lightning'.
+    :return: the url template, the table description and the
+             ReadLineAndStore class for the datatype.
+
+    """
+    if type == 'events':
+        return get_events_url(), _events_description(), ReadLineAndStoreEventClass
+    elif type == 'weather':
+        return get_weather_url(), _weather_description(), ReadLineAndStoreWeatherClass
+    elif type == 'singles':
+        return get_singles_url(), _singles_description(), ReadLineAndStoreSinglesClass
+    elif type == 'lightning':
+        return get_lightning_url(), _lightning_description(), ReadLineAndStoreLightningClass
+    else:
+        raise ValueError('Data type not recognized.')
+
+
 def _get_or_create_events_table(file, group):
     """Get or create event table in PyTables file"""
 
@@ -547,7 +1067,13 @@ def _create_events_table(file, group):
                   exist.
 
     """
-    description = {
+    return file.create_table(group, 'events', _events_description(), createparents=True)
+
+
+def _events_description():
+    """Description of the events table with the ESD columns available in the TSV download"""
+
+    return {
         'event_id': tables.UInt32Col(pos=0),
         'timestamp': tables.Time32Col(pos=1),
         'nanoseconds': tables.UInt32Col(pos=2),
@@ -565,8 +1091,6 @@ def _create_events_table(file, group):
         't_trigger': tables.Float32Col(pos=14),
     }
 
-    return file.create_table(group, 'events', description, createparents=True)
-
 
 def _get_or_create_weather_table(file, group):
     """Get or create event table in PyTables file"""
@@ -588,7 +1112,13 @@ def _create_weather_table(file, group):
                   exist.
 
     """
-    description = {
+    return file.create_table(group, 'weather', _weather_description(), createparents=True)
+
+
+def _weather_description():
+    """Description of the weather table with the ESD columns available in the TSV download"""
+
+    return {
         'event_id': tables.UInt32Col(pos=0),
         'timestamp': tables.Time32Col(pos=1),
         'temp_inside': tables.Float32Col(pos=2),
@@ -607,8 +1137,6 @@ def _create_weather_table(file, group):
         'wind_chill': tables.Float32Col(pos=15),
     }
 
-    return file.create_table(group, 'weather', description, createparents=True)
-
 
 def _get_or_create_singles_table(file, group):
     """Get or create singles table in PyTables file"""
@@ -630,7 +1158,13 @@ def _create_singles_table(file, group):
                   exist.
 
     """
-    description = {
+    return file.create_table(group, 'singles', _singles_description(), createparents=True)
+
+
+def _singles_description():
+    """Description of the singles table with the ESD columns available in the TSV download"""
+
+    return {
         'event_id': tables.UInt32Col(pos=0),
         'timestamp': tables.Time32Col(pos=1),
         'mas_ch1_low': tables.Int32Col(pos=2),
@@ -643,8 +1177,6 @@ def _create_singles_table(file, group):
         'slv_ch2_high': tables.Int32Col(pos=9),
     }
 
-    return file.create_table(group, 'singles', description, createparents=True)
-
 
 def _get_or_create_lightning_table(file, group):
     """Get or create lightning table in PyTables file"""
@@ -666,7 +1198,13 @@ def _create_lightning_table(file, group):
                   exist.
 
     """
-    description = {
+    return file.create_table(group, 'lightning', _lightning_description(), createparents=True)
+
+
+def _lightning_description():
+    """Description of the lightning table with the ESD columns available in the TSV download"""
+
+    return {
         'event_id': tables.UInt32Col(pos=0),
         'timestamp': tables.Time32Col(pos=1),
         'nanoseconds': tables.UInt32Col(pos=2),
@@ -676,8 +1214,6 @@ def _create_lightning_table(file, group):
         'current': tables.Float32Col(pos=6),
     }
 
-    return file.create_table(group, 'lightning', description, createparents=True)
-
 
 def _read_lines_and_store_coincidence(file, c_group, coincidence, station_groups):
     """Read TSV lines and store coincidence
@@ -725,6 +1261,248 @@ def _read_lines_and_store_coincidence(file, c_group, coincidence, station_groups
     return int(coincidence[0][4])
 
 
+class ReadLinesAndStoreCoincidenceClass:
+    """Store coincidences from the ESD in batches
+
+    Use this contextmanager to store coincidences from a TSV file.  The
+    coincidences, their events, and the c_index entries are collected and
+    stored per batch, which avoids writing and flushing the file for each
+    coincidence.  The result is the same as storing each coincidence with
+    :func:`_read_lines_and_store_coincidence`.
+
+    :param file: PyTables file for storage.
+    :param c_group: the coincidences group.
+    :param station_groups: dictionary to find the path to a station_group.
+    :param batch_size: number of coincidences to collect before storing them.
+
+    """
+
+    def __init__(self, file, c_group, station_groups, batch_size=COINCIDENCE_BATCH_SIZE):
+        self.file = file
+        self.coincidences = file.get_node(c_group, 'coincidences')
+        self.c_index = file.get_node(c_group, 'c_index')
+        self.station_groups = station_groups
+        self.batch_size = batch_size
+        self.event_tables = {}
+        self._clear_buffers()
+
+    def __enter__(self):
+        return self
+
+    def _clear_buffers(self):
+        self.buffered_coincidences = []
+        self.buffered_c_idx = []
+        self.buffered_events = collections.defaultdict(list)
+
+    def store_coincidence(self, coincidence):
+        """Store a single coincidence
+
+        The coincidence is added to the buffers, which are stored when the
+        number of coincidences reaches the batch size.
+
+        :param coincidence: text lines from the TSV file for one coincidence.
+        :return: coincidence timestamp.
+
+        """
+        c_idx = []
+        station_numbers = []
+        for event in coincidence:
+            station_number = int(event[1])
+            try:
+                if f's{station_number}' not in self.coincidences.colnames:
+                    raise KeyError(station_number)
+                group_path = self.station_groups[station_number]['group']
+            except KeyError:
+                # Can not add new column, so user should make a new data file.
+                raise KeyError(
+                    f'Unexpected station number: {station_number}, no column and/or station group path available.',
+                )
+            if group_path not in self.event_tables:
+                self.event_tables[group_path] = _get_or_create_events_table(self.file, group_path)
+            s_idx = self.station_groups[station_number]['s_index']
+            e_idx = len(self.event_tables[group_path]) + len(self.buffered_events[group_path])
+            c_idx.append((s_idx, e_idx))
+            self.buffered_events[group_path].append('\t'.join(event[2:]))
+            station_numbers.append(station_number)
+
+        timestamp = int(coincidence[0][4])
+        self.buffered_coincidences.append((timestamp, int(coincidence[0][5]), station_numbers))
+        self.buffered_c_idx.append(c_idx)
+        if len(self.buffered_coincidences) >= self.batch_size:
+            self.flush()
+
+        return timestamp
+
+    def flush(self):
+        """Store the buffered coincidences and events"""
+
+        if not self.buffered_coincidences:
+            return
+
+        for group_path, lines in self.buffered_events.items():
+            events = self.event_tables[group_path]
+            events.append(_parse_tsv_lines(lines, events.dtype, ReadLineAndStoreEventClass.columns, len(events)))
+
+        n_coincidences = len(self.buffered_coincidences)
+        timestamps = np.array([coincidence[0] for coincidence in self.buffered_coincidences], dtype=np.uint64)
+        nanoseconds = np.array([coincidence[1] for coincidence in self.buffered_coincidences], dtype=np.uint64)
+        first_id = len(self.coincidences)
+        coincidences = np.zeros(n_coincidences, dtype=self.coincidences.dtype)
+        coincidences['id'] = np.arange(first_id, first_id + n_coincidences)
+        coincidences['N'] = [len(coincidence[2]) for coincidence in self.buffered_coincidences]
+        coincidences['timestamp'] = timestamps
+        coincidences['nanoseconds'] = nanoseconds
+        coincidences['ext_timestamp'] = timestamps * np.uint64(1_000_000_000) + nanoseconds
+        rows_per_station = collections.defaultdict(list)
+        for idx, (_, _, station_numbers) in enumerate(self.buffered_coincidences):
+            for station_number in station_numbers:
+                rows_per_station[station_number].append(idx)
+        for station_number, rows in rows_per_station.items():
+            coincidences[f's{station_number}'][rows] = True
+        self.coincidences.append(coincidences)
+
+        # VLArray rows can only be appended one by one, convert all at once
+        c_index = np.array([idx for c_idx in self.buffered_c_idx for idx in c_idx], dtype=np.uint32)
+        lengths = np.array([len(c_idx) for c_idx in self.buffered_c_idx])
+        stops = np.cumsum(lengths)
+        for start, stop in zip(stops - lengths, stops):
+            self.c_index.append(c_index[start:stop])
+
+        self._clear_buffers()
+        self.file.flush()
+
+    def __exit__(self, type, value, traceback):
+        self.flush()
+
+
+def _read_tsv_blocks(data, block_size=TSV_BLOCK_SIZE):
+    """Read a TSV source in blocks of complete lines
+
+    :param data: binary file-like object, e.g. an opened file or url.
+    :param block_size: approximate number of bytes to read per block.
+    :return: generator yielding lists of lines (bytes) without newlines.
+
+    """
+    remainder = b''
+    while True:
+        chunk = data.read(block_size)
+        if not chunk:
+            break
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        yield lines
+    if remainder:
+        yield [remainder]
+
+
+def _store_tsv_blocks(data, writer, callback=None, block_size=TSV_BLOCK_SIZE):
+    """Parse a TSV source in blocks and store the lines using a writer
+
+    Comment lines are skipped, all other lines in a block are parsed and
+    stored at once using :meth:`ReadLineAndStoreEventClass.store_lines`.
+
+    :param data: binary file-like object, e.g. an opened file or url.
+    :param writer: instance of one of the ReadLineAndStore classes.
+    :param callback: optional function called with the timestamp of the
+                     last stored event after each stored block.
+    :param block_size: approximate number of bytes to read per block.
+    :return: the last line of the source split into columns, or None if
+             the source was empty.
+
+    """
+    last_line = None
+    for lines in _read_tsv_blocks(data, block_size):
+        lines = [line for line in lines if line]
+        if not lines:
+            continue
+        last_line = lines[-1]
+        data_lines = [line for line in lines if line[:1] != b'#']
+        if data_lines:
+            timestamp = writer.store_lines(b'\n'.join(data_lines).decode('utf-8').split('\n'))
+            if callback is not None:
+                callback(timestamp)
+
+    if last_line is None:
+        return None
+    return last_line.decode('utf-8').rstrip('\r').split('\t')
+
+
+def _parse_tsv_lines(lines, dtype, columns, first_id=0):
+    """Parse lines of ESD TSV data into a structured array
+
+    The date and time columns are skipped, the columns following those are
+    parsed in order.  The event_id column is numbered consecutively and the
+    ext_timestamp column, if present, is calculated from the timestamp and
+    nanoseconds.
+
+    :param lines: list of data lines (str), without comment lines.
+    :param dtype: dtype of the result, e.g. the dtype of the destination
+                  table.
+    :param columns: field names in the order of the TSV columns.
+    :param first_id: event_id of the first line.
+    :return: structured array with one row per line.
+
+    """
+    # parse at full precision, casting to the table types happens on assignment
+    tsv_dtype = np.dtype(
+        [(name, 'f8' if dtype[name].base.kind == 'f' else 'i8', dtype[name].shape) for name in columns],
+    )
+    n_columns = tsv_dtype.itemsize // 8
+    values = np.loadtxt(
+        lines,
+        dtype=tsv_dtype,
+        delimiter='\t',
+        usecols=range(2, 2 + n_columns),
+        comments=None,
+        ndmin=1,
+    )
+
+    block = np.zeros(len(values), dtype=dtype)
+    block['event_id'] = np.arange(first_id, first_id + len(values))
+    for name in columns:
+        block[name] = values[name]
+    if 'ext_timestamp' in block.dtype.names:
+        timestamps = values['timestamp'].astype(np.uint64)
+        nanoseconds = values['nanoseconds'].astype(np.uint64)
+        block['ext_timestamp'] = timestamps * np.uint64(1_000_000_000) + nanoseconds
+
+    return block
+
+
+class _ArrayTable:
+    """Minimal in-memory stand-in for a PyTables table
+
+    Collects the blocks appended by the ReadLineAndStore classes, so those
+    can be used to parse data into memory instead of into a file.
+
+    :param description: table description, as passed to
+                        :meth:`tables.File.create_table`.
+
+    """
+
+    def __init__(self, description):
+        self.dtype = tables.Description(description)._v_dtype
+        self.blocks = []
+        self.n_rows = 0
+
+    def __len__(self):
+        return self.n_rows
+
+    def append(self, block):
+        self.blocks.append(block)
+        self.n_rows += len(block)
+
+    def flush(self):
+        pass
+
+    def read(self):
+        """Get all appended rows as a single structured array"""
+
+        if not self.blocks:
+            return np.zeros(0, dtype=self.dtype)
+        return np.concatenate(self.blocks)
+
+
 class ReadLineAndStoreEventClass:
     """Store lines of event data from the ESD
 
@@ -732,12 +1510,35 @@ class ReadLineAndStoreEventClass:
     table.
 
     :param table: a PyTables Table object in which to store the data.
+    :param exclude: if given, a sorted array of ext_timestamp (or timestamp
+                    if the table has no such column) values which are
+                    already stored, :meth:`store_lines` skips lines with
+                    these values.
 
     """
 
-    def __init__(self, table):
+    #: Names of the stored columns in the order of the TSV columns.
+    columns = (
+        'timestamp',
+        'nanoseconds',
+        'pulseheights',
+        'integrals',
+        'n1',
+        'n2',
+        'n3',
+        'n4',
+        't1',
+        't2',
+        't3',
+        't4',
+        't_trigger',
+    )
+
+    def __init__(self, table, exclude=None):
         self.table = table
         self.event_counter = len(self.table)
+        self.exclude = exclude
+        self.last_timestamp = None
 
     def __enter__(self):
         return self
@@ -810,6 +1611,34 @@ class ReadLineAndStoreEventClass:
 
         return int(timestamp)
 
+    def store_lines(self, lines):
+        """Store a block of lines
+
+        Parse all lines at once and append the result to the table.  The
+        result is the same as calling :meth:`store_line` for each line.
+
+        :param lines: list of data lines (str) with tab-separated columns,
+                      comment lines should already be removed.
+        :return: timestamp of the last stored event, or 0 if no lines
+                 were given.
+
+        """
+        if not lines:
+            return 0.0
+
+        block = _parse_tsv_lines(lines, self.table.dtype, self.columns, self.event_counter)
+        timestamp = int(block['timestamp'][-1])
+        if self.exclude is not None and len(self.exclude):
+            column = 'ext_timestamp' if 'ext_timestamp' in block.dtype.names else 'timestamp'
+            block = block[~np.isin(block[column], self.exclude)]
+            block['event_id'] = np.arange(self.event_counter, self.event_counter + len(block))
+
+        self.table.append(block)
+        self.event_counter += len(block)
+        self.last_timestamp = timestamp
+
+        return timestamp
+
     def __exit__(self, type, value, traceback):
         self.table.flush()
 
@@ -817,6 +1646,24 @@ class ReadLineAndStoreEventClass:
 class ReadLineAndStoreWeatherClass(ReadLineAndStoreEventClass):
     """Store lines of weather data from the ESD"""
 
+    columns = (
+        'timestamp',
+        'temp_inside',
+        'temp_outside',
+        'humidity_inside',
+        'humidity_outside',
+        'barometer',
+        'wind_dir',
+        'wind_speed',
+        'solar_rad',
+        'uv',
+        'evapotranspiration',
+        'rain_rate',
+        'heat_index',
+        'dew_point',
+        'wind_chill',
+    )
+
     def store_line(self, line):
         # ignore comment lines
         if line[0][0] == '#':
@@ -877,6 +1724,18 @@ class ReadLineAndStoreWeatherClass(ReadLineAndStoreEventClass):
 class ReadLineAndStoreSinglesClass(ReadLineAndStoreEventClass):
     """Store lines of singles data from the ESD"""
 
+    columns = (
+        'timestamp',
+        'mas_ch1_low',
+        'mas_ch1_high',
+        'mas_ch2_low',
+        'mas_ch2_high',
+        'slv_ch1_low',
+        'slv_ch1_high',
+        'slv_ch2_low',
+        'slv_ch2_high',
+    )
+
     def store_line(self, line):
         # ignore comment lines
         if line[0][0] == '#':
@@ -925,6 +1784,8 @@ class ReadLineAndStoreSinglesClass(ReadLineAndStoreEventClass):
 class ReadLineAndStoreLightningClass(ReadLineAndStoreEventClass):
     """Store lines of lightning data from the ESD"""
 
+    columns = ('timestamp', 'nanoseconds', 'latitude', 'longitude', 'current')
+
     def store_line(self, line):
         # ignore comment lines
         if line[0][0] == '#':
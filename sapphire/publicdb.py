@@ -12,23 +12,29 @@ import logging
 import os
 import re
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
-from urllib.request import urlretrieve
 from xmlrpc.client import ServerProxy
 
 import tables
 
 from .transformations.clock import datetime_to_gps
+from .transport import urlretrieve
 from .utils import get_publicdb_base
 
 logger = logging.getLogger(__name__)
 
+#: Number of blobs read at a time when copying the blobs of a datastore
+#: file.
+BLOBS_CHUNKSIZE = 10_000
+
 
 def get_publicdb_xmlrpc_url():
     return urljoin(get_publicdb_base(), 'raw_data/rpc')
 
 
-def download_data(file, group, station_id, start, end, get_blobs=False):
+def download_data(file, group, station_id, start, end, get_blobs=False, n_workers=1):
     """Download raw data from the datastore
 
     This function downloads data from the datastore, using the XML-RPC API
@@ -43,6 +49,8 @@ def download_data(file, group, station_id, start, end, get_blobs=False):
         interval
     :param get_blobs: boolean, select whether binary data like traces
         should be fetched
+    :param n_workers: number of days to download concurrently.  The data
+        is always stored in chronological order.
 
     Example::
 
@@ -60,26 +68,79 @@ def download_data(file, group, station_id, start, end, get_blobs=False):
         INFO:sapphire.publicdb:Done.
 
     """
-    server = ServerProxy(get_publicdb_xmlrpc_url())
-
-    for t0, t1 in datetimerange(start, end):
-        logger.info(f'{t0} {t1}')
-        logger.info(f'Getting server data URL {t0}')
-        try:
-            url = server.hisparc.get_data_url(station_id, t0, get_blobs)
-        except Exception as error:
-            if re.search('No data', str(error)):
-                logger.warning(f'No data for {t0}')
-                continue
-            else:
-                raise
-        logger.info('Downloading data...')
-        tmp_datafile, headers = urlretrieve(url)
+    for t0, t1, tmp_datafile in _download_days(station_id, start, end, get_blobs, n_workers):
+        if tmp_datafile is None:
+            continue
         logger.info('Storing data...')
         _store_data(file, group, tmp_datafile, t0, t1)
         logger.info('Done.')
 
 
+def _download_days(station_id, start, end, get_blobs, n_workers):
+    """Download the datastore files for each day in the interval
+
+    With multiple workers the following days are downloaded while the
+    data of a day is being stored.  At most n_workers days are downloaded
+    ahead, to limit the number of temporary files.
+
+    :return: generator of the start and end of each day and the path to
+             the temporary file with the data, or None if there is no data.
+
+    """
+    days = datetimerange(start, end)
+
+    if n_workers <= 1:
+        server = ServerProxy(get_publicdb_xmlrpc_url())
+        for t0, t1 in days:
+            yield t0, t1, _download_day(server, station_id, t0, t1, get_blobs)
+        return
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        try:
+            for t0, t1 in days:
+                # Each thread needs its own ServerProxy
+                pending.append((t0, t1, executor.submit(_download_day, None, station_id, t0, t1, get_blobs)))
+                if len(pending) > n_workers:
+                    t0, t1, future = pending.popleft()
+                    yield t0, t1, future.result()
+            while pending:
+                t0, t1, future = pending.popleft()
+                yield t0, t1, future.result()
+        finally:
+            # Remove files of days which will no longer be stored
+            for _, _, future in pending:
+                if not future.cancel() and future.exception() is None and future.result() is not None:
+                    os.remove(future.result())
+
+
+def _download_day(server, station_id, t0, t1, get_blobs):
+    """Download the datastore file for a single day
+
+    :param server: ServerProxy for the public database, if None a new
+        one is created.
+    :return: path to the temporary file with the data, or None if there
+             is no data for the day.
+
+    """
+    if server is None:
+        server = ServerProxy(get_publicdb_xmlrpc_url())
+
+    logger.info(f'{t0} {t1}')
+    logger.info(f'Getting server data URL {t0}')
+    try:
+        url = server.hisparc.get_data_url(station_id, t0, get_blobs)
+    except Exception as error:
+        if re.search('No data', str(error)):
+            logger.warning(f'No data for {t0}')
+            return None
+        else:
+            raise
+    logger.info('Downloading data...')
+    tmp_datafile, headers = urlretrieve(url)
+    return tmp_datafile
+
+
 def _store_data(dst_file, dst_group, src_filename, t0, t1):
     """Copy data from a temporary file to the destination file
 
@@ -100,8 +161,7 @@ def _store_data(dst_file, dst_group, src_filename, t0, t1):
             dst_node = _get_or_create_node(dst_file, dst_group, node)
 
             if node.name == 'blobs':
-                for row in node:
-                    dst_node.append(row)
+                _copy_blobs(node, dst_node)
 
             elif node.name in [
                 'events',
@@ -144,6 +204,18 @@ def _store_data(dst_file, dst_group, src_filename, t0, t1):
     dst_file.flush()
 
 
+def _copy_blobs(src_node, dst_node, chunksize=BLOBS_CHUNKSIZE):
+    """Copy the rows of a VLArray to the end of another VLArray
+
+    The source rows are read in large chunks instead of one at a time.
+    PyTables can only append a single row to a VLArray at a time.
+
+    """
+    for start in range(0, src_node.nrows, chunksize):
+        for row in src_node.read(start, start + chunksize):
+            dst_node.append(row)
+
+
 def datetimerange(start, stop):
     """Generator for datetime ranges
 
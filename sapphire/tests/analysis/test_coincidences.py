@@ -7,7 +7,8 @@ from unittest.mock import Mock, patch, sentinel
 
 import tables
 
-from numpy import uint64
+from numpy import array, uint64
+from numpy.testing import assert_array_equal
 
 from sapphire.analysis import coincidences
 from sapphire.tests.validate_results import validate_results
@@ -138,6 +139,25 @@ class CoincidencesTests(unittest.TestCase):
         expected_coincidences = [[0, 1, 2, 3, 4, 5, 6, 7]]
         self.assertEqual(c, expected_coincidences)
 
+        self.assertEqual(self.c._do_search_coincidences(timestamps[:1], window=300), [])
+        self.assertEqual(self.c._do_search_coincidences([], window=300), [])
+
+    def test__search_coincidence_arrays(self):
+        timestamps = array([0, 0, 10, 15, 100, 200, 250, 251], dtype=uint64)
+
+        offsets, indices = self.c._search_coincidence_arrays(timestamps, window=150)
+        assert_array_equal(offsets, [0, 5, 7, 10])
+        assert_array_equal(indices, [0, 1, 2, 3, 4, 4, 5, 5, 6, 7])
+
+        # Time differences are integers, the window is effectively rounded up
+        offsets, indices = self.c._search_coincidence_arrays(timestamps, window=5.5)
+        assert_array_equal(offsets, [0, 2, 4, 6])
+        assert_array_equal(indices, [0, 1, 2, 3, 6, 7])
+
+        offsets, indices = self.c._search_coincidence_arrays(timestamps, window=0)
+        assert_array_equal(offsets, [0])
+        self.assertEqual(len(indices), 0)
+
 
 class CoincidencesESDTests(CoincidencesTests):
     @patch.object(coincidences.tables, 'open_file')
@@ -209,6 +229,16 @@ class CoincidencesESDDataTests(CoincidencesDataTests):
             c.search_and_store_coincidences(station_numbers=[501, 502])
         validate_results(self, self.get_testdata_path(), self.data_path)
 
+    def test__search_coincidences_return_types(self):
+        with tables.open_file(self.data_path, 'r') as data:
+            c = coincidences.CoincidencesESD(data, None, ['/station_501', '/station_502'], progress=False)
+            c_index, timestamps = c._search_coincidences()
+        self.assertIsInstance(c_index, list)
+        self.assertTrue(c_index)
+        self.assertTrue(all(isinstance(coincidence, list) for coincidence in c_index))
+        self.assertIsInstance(timestamps, list)
+        self.assertTrue(all(isinstance(timestamp, tuple) for timestamp in timestamps))
+
     def get_testdata_path(self):
         dir_path = os.path.dirname(__file__)
         return os.path.join(dir_path, TEST_DATA_ESD)
@@ -119,6 +119,28 @@ class EventDirectionReconstructionTest(unittest.TestCase):
         )
         self.assertEqual(mock_reconstruct_event.call_count, 2)
 
+    @patch.object(direction_reconstruction.EventDirectionReconstruction, 'reconstruct_event')
+    def test_reconstruct_events_station_offsets(self, mock_reconstruct_event):
+        """Offsets from a Station are looked up once for all events"""
+
+        mock_reconstruct_event.return_value = [sentinel.theta, sentinel.phi, sentinel.ids]
+        dirrec = direction_reconstruction.EventDirectionReconstruction(sentinel.station)
+        events = MagicMock()
+        events.__iter__.return_value = iter([sentinel.event1, sentinel.event2])
+        events.__len__.return_value = 2
+        events.col.return_value = [1, 2]
+        offsets = MagicMock(spec=direction_reconstruction.Station)
+        offsets.detector_timing_offset_array.return_value = array(
+            [(0, 1.0, 2.0, 3.0, 4.0), (2, 5.0, 6.0, 7.0, 8.0)],
+            dtype=[('timestamp', 'i8'), ('offset1', 'f8'), ('offset2', 'f8'), ('offset3', 'f8'), ('offset4', 'f8')],
+        )
+        dirrec.reconstruct_events(events, sentinel.detector_ids, offsets, progress=False)
+        events.col.assert_called_once_with('timestamp')
+        offsets.detector_timing_offset_array.assert_called_once_with([1, 2])
+        self.assertFalse(offsets.detector_timing_offset.called)
+        mock_reconstruct_event.assert_any_call(sentinel.event1, sentinel.detector_ids, [1.0, 2.0, 3.0, 4.0], None)
+        mock_reconstruct_event.assert_called_with(sentinel.event2, sentinel.detector_ids, [5.0, 6.0, 7.0, 8.0], None)
+
 
 class CoincidenceDirectionReconstructionTest(unittest.TestCase):
     def setUp(self):
@@ -4,12 +4,13 @@ import shutil
 import tempfile
 import unittest
 import warnings
+import zlib
 
 from unittest.mock import Mock
 
 import tables
 
-from numpy import array
+from numpy import array, histogram, int64, isin, isnan, linspace, zeros
 from numpy.testing import assert_array_equal
 
 from sapphire.analysis import process_events
@@ -30,7 +31,39 @@ class ProcessEventsTests(unittest.TestCase):
 
     def test_get_traces_for_event(self):
         event = self.proc.source[0]
-        self.assertEqual(self.proc.get_traces_for_event(event)[12][3], 1334)
+        traces = self.proc.get_traces_for_event(event)
+        self.assertEqual(traces[12][3], 1334)
+        self.assertEqual(traces.dtype, int64)
+
+    def test_get_traces_for_events(self):
+        events = self.proc.source.read(0, 5)
+        traces = self.proc.get_traces_for_events(events)
+        self.assertEqual(traces.shape[0], 5)
+        self.assertEqual(traces.shape[2], 4)
+        for event, event_traces in zip(events, traces):
+            for detector_id, idx in enumerate(event['traces']):
+                if idx < 0:
+                    self.assertTrue((event_traces[:, detector_id] == process_events.TRACE_PAD).all())
+                else:
+                    trace = self.proc._get_trace(idx)
+                    assert_array_equal(event_traces[: len(trace), detector_id], trace)
+        self.assertEqual(self.proc.get_traces_for_events(events[:0]).shape[0], 0)
+
+    def test_decode_trace(self):
+        blob = zlib.compress(b'200,201,1334,')
+        trace = process_events.decode_trace(blob)
+        self.assertEqual(trace.dtype, process_events.TRACE_DTYPE)
+        assert_array_equal(trace, [200, 201, 1334])
+        # Blobs wrapped in an extra pair of bytes
+        assert_array_equal(process_events.decode_trace(b'x' + blob + b'x'), [200, 201, 1334])
+
+        traces = process_events.decode_traces([blob, zlib.compress(b'1,2,3,4,5')])
+        assert_array_equal(traces, [[200, 201, 1334, -1, -1], [1, 2, 3, 4, 5]])
+        self.assertEqual(process_events.decode_traces([]).shape, (0, 0))
+
+        self.assertEqual(len(process_events.decode_trace(zlib.compress(b''))), 0)
+        with self.assertRaises(ValueError):
+            process_events.decode_trace(zlib.compress(b'200,40000'))
 
     def test__find_unique_row_ids(self):
         ext_timestamps = self.proc.source.col('ext_timestamp')
@@ -49,6 +82,14 @@ class ProcessEventsTests(unittest.TestCase):
         ids = self.proc._find_unique_row_ids(enumerated_timestamps)
         self.assertNotEqual(ids, [0, 3])
 
+    def test__find_unique_sorted_row_ids(self):
+        ids = self.proc._find_unique_sorted_row_ids(array([2, 1, 1, 3, 2, 0], dtype='u8'))
+        assert_array_equal(ids, [1, 0, 3])
+        ext_timestamps = self.proc.source.col('ext_timestamp')
+        ids = self.proc._find_unique_sorted_row_ids(ext_timestamps)
+        assert_array_equal(ids, sorted(range(len(ext_timestamps)), key=ext_timestamps.__getitem__))
+        self.assertEqual(len(self.proc._find_unique_sorted_row_ids(array([], dtype='u8'))), 0)
+
     def test__reconstruct_time_from_traces(self):
         event = self.proc.source[10]
         times = self.proc._reconstruct_time_from_traces(event)
@@ -71,6 +112,8 @@ class ProcessEventsTests(unittest.TestCase):
         self.assertEqual(self.proc.first_above_threshold(trace, 3), 2)
         self.assertEqual(self.proc.first_above_threshold(trace, 4), 2)
         self.assertEqual(self.proc.first_above_threshold(trace, 5), -999)
+        self.assertEqual(self.proc.first_above_threshold(array(trace), 3), 2)
+        self.assertEqual(self.proc.first_above_threshold(array([]), 3), -999)
 
     #     @patch.object(process_events.FindMostProbableValueInSpectrum, 'find_mpv')
     def test__process_pulseintegrals(self):
@@ -81,6 +124,28 @@ class ProcessEventsTests(unittest.TestCase):
         self.assertAlmostEqual(self.proc._process_pulseintegrals()[0][3], 3.98951741969)
         self.proc.limit = None
 
+    def test__process_pulseintegrals_mpv_window(self):
+        self.proc.mpv_window = 150
+        windows, all_mpv = self.proc._determine_mpvs()
+        self.assertEqual(len(windows), 2)
+
+        timestamps = self.proc.source.col('timestamp')
+        integrals = self.proc.source.col('integrals')
+        n_particles = self.proc._process_pulseintegrals()
+        bins = linspace(0, 50_000, 201)
+        for window, mpvs in zip(windows, all_mpv):
+            in_window = timestamps // 150 == window
+            for idx, mpv in enumerate(mpvs):
+                detector_integrals = integrals[in_window, idx]
+                n, _ = histogram(detector_integrals, bins=bins)
+                assert_array_equal(mpv, self.proc._find_mpv(n, bins))
+                if not isnan(mpv):
+                    is_valid = detector_integrals >= 0
+                    assert_array_equal(
+                        n_particles[in_window, idx][is_valid],
+                        detector_integrals[is_valid] / mpv,
+                    )
+
     def create_tempfile_from_testdata(self):
         tmp_path = self.create_tempfile_path()
         data_path = self.get_testdata_path()
@@ -138,6 +203,13 @@ class ProcessEventsWithLINTTests(ProcessEventsTests):
         self.assertEqual(self.proc._reconstruct_time_from_trace(trace, 200), 1)
         self.assertEqual(self.proc._reconstruct_time_from_trace(trace, 210), -999)
 
+    def test__reconstruct_times_from_trace_block(self):
+        traces = array([[200, 220, 240, -1], [180, 200, 220, 230], [240, 250, 260, 250]])
+        times = self.proc._reconstruct_times_from_trace_block(traces, array([190, 190, 200]))
+        assert_array_equal(times, [0.5, 1.5, 0])
+        times = self.proc._reconstruct_times_from_trace_block(traces, array([230, 220, 250]))
+        assert_array_equal(times, [-999, -999, -999])
+
 
 class ProcessEventsWithTriggerOffsetTests(ProcessEventsTests):
     def setUp(self):
@@ -164,6 +236,33 @@ class ProcessEventsWithTriggerOffsetTests(ProcessEventsTests):
         self.assertEqual(times[2], -999)
         self.assertEqual(times[4], -999)
 
+    def test__reconstruct_times_from_traces(self):
+        """Processing a block of events gives the same times as per event"""
+
+        events = self.proc.source.read(0, 50)
+        thresholds, triggers = self.proc._get_trigger_settings(events, 0)
+        times = self.proc._reconstruct_times_from_traces(
+            events['baseline'],
+            events['pulseheights'],
+            events['traces'],
+            thresholds,
+            triggers,
+        )
+        expected = [self.proc._reconstruct_time_from_traces(event) for event in self.proc.source.iterrows(0, 50)]
+        assert_array_equal(times, expected)
+
+    def test__reconstruct_triggers(self):
+        low_idx = [[-999, 0, 3, 2], [7, 4, 1, -999], [7, 4, 1, -999], [1, 3, 5, 7], [1, 3, 5, 7]]
+        high_idx = [
+            [-999, -999, 10, -999],
+            [-999, 5, 2, -999],
+            [-999, 5, 2, -999],
+            [2, 4, -999, -999],
+            [2, 4, -999, -999],
+        ]
+        triggers = [(2, 0, False, 0), (3, 2, True, 0), (3, 2, True, 1), (1, 2, False, 0), (0, 4, False, 0)]
+        assert_array_equal(self.proc._reconstruct_triggers(low_idx, high_idx, triggers), [2, 5, -999, 5, -999])
+
     def test__first_above_thresholds(self):
         # 2 detectors
         self.assertEqual(self.proc._first_above_thresholds((x for x in [200, 200, 900]), [300, 400], 900), [2, 2, -999])
@@ -340,6 +439,203 @@ class ProcessEventsFromSourceWithTriggerOffsetStationTests(
         self.assertEqual(times[2], -999)
         self.assertEqual(times[4], -999)
 
+    def test_process_traces_station_triggers(self):
+        """Trigger settings are looked up once for all events"""
+
+        expected = [self.proc._reconstruct_time_from_traces(event) for event in self.proc.source]
+        self.proc.station.trigger = Mock(side_effect=AssertionError('Lookup for a single event'))
+        timings = self.proc.process_traces()
+        assert_array_equal(timings, expected)
+        self.assertIsNone(self.proc._event_triggers)
+
+    def test_process_traces_parallel(self):
+        """Processing with worker processes gives the same timings"""
+
+        expected = self.proc.process_traces()
+        self.proc.n_workers = 2
+        environ = dict(os.environ)
+        with self.proc._worker_pool():
+            timings = self.proc.process_traces()
+        self.assertEqual(dict(os.environ), environ)
+        self.assertEqual(timings.tobytes(), expected.tobytes())
+        self.assertIsNone(self.proc._event_triggers)
+
+        # The destination file is writable again, with valid nodes
+        self.assertIs(self.proc.dest_file, self.dest_data)
+        self.assertEqual(self.dest_data.mode, 'a')
+        self.assertIs(self.proc.dest_group._v_file, self.dest_data)
+        self.dest_data.create_group('/', 'writable')
+
+    def test_process_and_store_results_parallel(self):
+        """Processing in place with worker processes gives the same results"""
+
+        data_path = self.create_tempfile_from_testdata()
+        self.addCleanup(os.remove, data_path)
+        with tables.open_file(data_path, 'a') as data:
+            proc = process_events.ProcessEvents(data, DATA_GROUP, progress=False)
+            proc.process_and_store_results()
+            expected = data.get_node(DATA_GROUP, 'events').read()
+            proc.process_and_store_results(destination='parallel', n_workers=2)
+            self.assertEqual(data.mode, 'a')
+            result = data.get_node(DATA_GROUP, 'parallel').read()
+        self.assertEqual(result.tobytes(), expected.tobytes())
+
+    def test_process_and_store_results_max_memory(self):
+        """Processing in blocks of rows gives the same results"""
+
+        self.proc.process_and_store_results()
+        expected = self.dest_data.get_node(DATA_GROUP, 'events').read()
+
+        dest_path = self.create_tempfile_path()
+        self.addCleanup(os.remove, dest_path)
+        with tables.open_file(dest_path, 'a') as dest_data:
+            proc = process_events.ProcessEventsFromSourceWithTriggerOffset(
+                self.source_data,
+                dest_data,
+                DATA_GROUP,
+                DATA_GROUP,
+                station=501,
+            )
+            proc.process_and_store_results(max_memory=50_000)
+            self.assertLess(proc.chunksize, len(expected) / 2)
+            result = dest_data.get_node(DATA_GROUP, 'events').read()
+        self.assertEqual(result.tobytes(), expected.tobytes())
+
+
+class ProcessEventsIncrementalTests(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings('ignore')
+        self.addCleanup(warnings.resetwarnings)
+        self.data_path = self.create_tempfile_from_testdata()
+        self.addCleanup(os.remove, self.data_path)
+        self.data = tables.open_file(self.data_path, 'a')
+        self.addCleanup(self.data.close)
+
+        # Reference results from processing all events at once
+        with tables.open_file(self.get_testdata_path(), 'r') as source_data:
+            self.raw_events = source_data.get_node(DATA_GROUP, 'events').read()
+            dest_path = self.create_tempfile_path()
+            self.addCleanup(os.remove, dest_path)
+            with tables.open_file(dest_path, 'a') as dest_data:
+                proc = process_events.ProcessEventsFromSource(source_data, dest_data, DATA_GROUP, DATA_GROUP)
+                proc.process_and_store_results()
+                self.expected_events = dest_data.get_node(DATA_GROUP, '_events').read()
+                self.expected = dest_data.get_node(DATA_GROUP, 'events').read()
+
+        # Start with half of the events, the others are added later
+        events = self.data.get_node(DATA_GROUP, 'events')
+        events.truncate(0)
+        events.append(self.raw_events[::2].copy())
+        events.flush()
+
+    def test_process_and_store_results(self):
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        proc.process_and_store_results(incremental=True)
+        self.assertEqual(self.data.get_node(DATA_GROUP, 'events')._v_attrs.n_source_events, 140)
+
+        # New events, including a duplicate of a processed event
+        source = self.data.get_node(DATA_GROUP, '_events')
+        source.append(self.raw_events[1::2].copy())
+        source.append(self.raw_events[:1])
+        source.flush()
+
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        proc.process_and_store_results(incremental=True)
+        self.assert_results_equal(
+            self.data.get_node(DATA_GROUP, '_events').read(),
+            self.data.get_node(DATA_GROUP, 'events').read(),
+        )
+        self.assertEqual(self.data.get_node(DATA_GROUP, 'events')._v_attrs.n_source_events, 280)
+
+    def test_process_and_store_results_appended_to_results(self):
+        """Events appended to the results table after processing in place are processed"""
+
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        proc.process_and_store_results(incremental=True)
+
+        # New events stored in the 'events' table, which now holds the results
+        results = self.data.get_node(DATA_GROUP, 'events')
+        new_events = self.raw_events[1::2]
+        rows = zeros(len(new_events), dtype=results.dtype)
+        for name in new_events.dtype.names:
+            rows[name] = new_events[name]
+        results.append(rows)
+        results.flush()
+
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        proc.process_and_store_results(incremental=True)
+        self.assert_results_equal(
+            self.data.get_node(DATA_GROUP, '_events').read(),
+            self.data.get_node(DATA_GROUP, 'events').read(),
+        )
+        self.assertEqual(self.data.get_node(DATA_GROUP, 'events')._v_attrs.n_source_events, 280)
+
+    def test_process_and_store_results_parallel(self):
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        proc.process_and_store_results(incremental=True)
+
+        source = self.data.get_node(DATA_GROUP, '_events')
+        source.append(self.raw_events[1::2].copy())
+        source.flush()
+
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        proc.process_and_store_results(incremental=True, n_workers=2)
+        self.assert_results_equal(
+            self.data.get_node(DATA_GROUP, '_events').read(),
+            self.data.get_node(DATA_GROUP, 'events').read(),
+        )
+        self.assertEqual(self.data.mode, 'a')
+
+    def test_process_and_store_results_from_source(self):
+        dest_path = self.create_tempfile_path()
+        self.addCleanup(os.remove, dest_path)
+        with tables.open_file(dest_path, 'a') as dest_data:
+            proc = process_events.ProcessEventsFromSource(self.data, dest_data, DATA_GROUP, DATA_GROUP)
+            proc.process_and_store_results(incremental=True)
+
+            source = self.data.get_node(DATA_GROUP, 'events')
+            source.append(self.raw_events[1::2].copy())
+            source.append(self.raw_events[:1])
+            source.flush()
+
+            proc = process_events.ProcessEventsFromSource(self.data, dest_data, DATA_GROUP, DATA_GROUP)
+            proc.process_and_store_results(incremental=True)
+            self.assert_results_equal(
+                dest_data.get_node(DATA_GROUP, '_events').read(),
+                dest_data.get_node(DATA_GROUP, 'events').read(),
+            )
+            self.assertEqual(dest_data.get_node(DATA_GROUP, 'events')._v_attrs.n_source_events, 281)
+
+    def test_limit(self):
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        with self.assertRaises(ValueError):
+            proc.process_and_store_results(limit=10, incremental=True)
+
+    def assert_results_equal(self, events, results):
+        self.assertEqual(events.tobytes(), self.expected_events.tobytes())
+        # The number of particles of previous results is not updated
+        is_new = isin(events['ext_timestamp'], self.raw_events['ext_timestamp'][1::2])
+        for col in self.expected.dtype.names:
+            if col in ('n1', 'n2', 'n3', 'n4'):
+                assert_array_equal(results[col][is_new], self.expected[col][is_new])
+            else:
+                assert_array_equal(results[col], self.expected[col])
+
+    def create_tempfile_from_testdata(self):
+        tmp_path = self.create_tempfile_path()
+        data_path = self.get_testdata_path()
+        shutil.copyfile(data_path, tmp_path)
+        return tmp_path
+
+    def create_tempfile_path(self):
+        fd, path = tempfile.mkstemp('.h5')
+        os.close(fd)
+        return path
+
+    def get_testdata_path(self):
+        dir_path = os.path.dirname(__file__)
+        return os.path.join(dir_path, TEST_DATA_FILE)
+
 
 class ProcessSinglesTests(unittest.TestCase):
     def setUp(self):
@@ -3,7 +3,8 @@ import unittest
 from itertools import cycle
 from unittest.mock import MagicMock, patch, sentinel
 
-from numpy import array
+from numpy import array, concatenate, full
+from numpy.testing import assert_array_equal
 
 from sapphire.analysis import process_traces
 
@@ -31,6 +32,38 @@ class TraceObservablesTests(unittest.TestCase):
         self.assertEqual(self.to.n_peaks, [2, 2, -1, -1])
 
 
+class BatchTraceObservablesTests(unittest.TestCase):
+    def setUp(self):
+        trace = [200] * 400 + [500] + [510] + [400] * 10 + [200] * 600 + [400] * 10 + [200]
+        trace2 = [203, 199] * 200 + [500] + [510] + [398, 402] * 5 + [203, 199] * 300 + [400] * 10 + [200]
+        trace3 = [30] * 100 + [130, 20, 130] + [30] * 920
+        self.traces = array([[trace, trace2], [trace2, trace3], [trace3, trace3]]).transpose(0, 2, 1)
+        self.to = process_traces.BatchTraceObservables(self.traces)
+
+    def test_unsupported_number_of_detectors(self):
+        self.assertRaises(ValueError, process_traces.BatchTraceObservables, self.traces[:, :, :1])
+
+    def test_observables(self):
+        """Same observables as determined for each event separately"""
+
+        for attr in ['baselines', 'std_dev', 'pulseheights', 'integrals', 'n_peaks']:
+            values = getattr(self.to, attr)
+            self.assertEqual(values.shape, (3, 4))
+            for event_traces, event_values in zip(self.traces, values):
+                self.assertEqual(event_values.tolist(), getattr(process_traces.TraceObservables(event_traces), attr))
+
+    def test_n_peaks(self):
+        assert_array_equal(self.to.n_peaks, [[2, 2, -1, -1], [2, 2, -1, -1], [2, 2, -1, -1]])
+
+    def test_padded_traces(self):
+        """Padding at the end of the traces does not change the observables"""
+
+        traces = concatenate([self.traces, full((3, 50, 2), -1)], axis=1)
+        to = process_traces.BatchTraceObservables(traces)
+        for attr in ['baselines', 'std_dev', 'pulseheights', 'integrals', 'n_peaks']:
+            assert_array_equal(getattr(to, attr), getattr(self.to, attr))
+
+
 class MeanFilterTests(unittest.TestCase):
     def setUp(self):
         self.trace = [[200] * 400 + [500] + [400] * 20 + [200] * 600]
@@ -143,6 +176,24 @@ class MeanFilterTests(unittest.TestCase):
         filtered_trace = self.mf.mean_filter_without_threshold(raw_trace)
         self.assertEqual(filtered_trace, exp_trace)
 
+    def test_mean_filter_block(self):
+        """Filtering many traces at once gives the same traces"""
+
+        raw_traces = [
+            [199, 201, 199, 201, 216, 220, 219, 205, 200, 201],
+            [199, 211, 189, 201, 236, 201, 199, 202, 205, 204],
+            [200, 201, 200, 201, 204, 203, 230, 233, 201, 200],
+        ]
+        for mf in [self.mf, process_traces.MeanFilter(use_threshold=False)]:
+            filtered_traces = mf.filter_block(array(raw_traces))
+            self.assertEqual(filtered_traces.tolist(), [mf.filter(raw_trace) for raw_trace in raw_traces])
+
+    def test_filter_trace_block(self):
+        raw_traces = array(self.traces)
+        raw_traces[1, 400:403] = [250, 180, 230]
+        filtered_traces = self.mf.filter_trace_block(raw_traces)
+        assert_array_equal(filtered_traces, [self.mf.filter_trace(raw_trace) for raw_trace in raw_traces])
+
 
 class DataReductionTests(unittest.TestCase):
     def setUp(self):
@@ -219,6 +270,27 @@ class DataReductionTests(unittest.TestCase):
         self.assertEqual(left, 0)
         self.assertEqual(right, length)
 
+    def test_reduce_trace_block(self):
+        baseline = 200
+        signal = [baseline + 50] + [baseline + 60] * 4 + [baseline] * 600 + [baseline + 90] * 5
+        trace = [baseline] * 400 + signal + [baseline] * 300
+        trace2 = [baseline] * 10 + signal + [baseline] * 690
+        traces = array([[trace, [baseline] * len(trace)], [trace2, trace2], [trace2, trace]]).transpose(0, 2, 1)
+
+        reduced_traces, left = self.dr.reduce_trace_block(traces)
+        for event_traces, event_reduced_traces, event_left in zip(traces, reduced_traces, left):
+            expected, expected_left = self.dr.reduce_traces(event_traces, return_offset=True)
+            assert_array_equal(event_reduced_traces, expected)
+            self.assertEqual(event_left, expected_left)
+
+    def test_determine_cuts_block(self):
+        baseline = 200
+        trace = [baseline] * 400 + [baseline + 50] + [baseline] * 600 + [baseline + 90] + [baseline] * 300
+        traces = array([[trace, [baseline] * len(trace)], [[baseline] * len(trace)] * 2]).transpose(0, 2, 1)
+        left, right = self.dr.determine_cuts_block(traces, array([[baseline] * 2] * 2))
+        assert_array_equal(left, [400, 0])
+        assert_array_equal(right, [len(trace) - 300, len(trace)])
+
     def test_add_padding(self):
         combinations = (
             ((0, 20), (0, 46)),  # left at limit
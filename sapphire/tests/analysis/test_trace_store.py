@@ -0,0 +1,209 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+import zlib
+
+from unittest.mock import patch
+
+import tables
+
+from numpy import arange
+from numpy.testing import assert_array_equal
+
+from sapphire.analysis import process_events, trace_store
+
+TEST_DATA_FILE = 'test_data/process_events.h5'
+DATA_GROUP = '/s501'
+
+
+class TraceStoreTests(unittest.TestCase):
+    def setUp(self):
+        warnings.filterwarnings('ignore')
+        self.addCleanup(warnings.resetwarnings)
+        self.data_path = self.create_tempfile_from_testdata()
+        self.addCleanup(os.remove, self.data_path)
+        self.data = tables.open_file(self.data_path, 'a')
+        self.addCleanup(self.data.close)
+        self.group = self.data.get_node(DATA_GROUP)
+        self.trace_idx = sorted(set(self.group.events.col('traces').ravel().tolist()) - {-1})
+
+    def test_create_trace_store(self):
+        store = trace_store.create_trace_store(self.data, DATA_GROUP, progress=False)
+        blobs = self.group.blobs
+        self.assertEqual(len(store), len(blobs))
+        for idx in self.trace_idx:
+            trace = store[idx]
+            self.assertEqual(trace.dtype, trace_store.TRACE_DTYPE)
+            assert_array_equal(trace, trace_store.decode_trace(blobs[idx]))
+
+        # Blobs which were not referred to by events are decoded from the blobs
+        not_traces = sorted(set(range(len(blobs))) - set(self.trace_idx))
+        assert_array_equal(store[not_traces[0]], trace_store.decode_trace(blobs[not_traces[0]]))
+        traces = store.read_traces([self.trace_idx[0], not_traces[0]])
+        assert_array_equal(traces[1], trace_store.decode_trace(blobs[not_traces[0]]))
+
+        self.assertRaises(ValueError, store.__getitem__, len(blobs))
+        blobs.remove()
+        store = trace_store.TraceStore(self.group)
+        self.assertRaises(ValueError, store.__getitem__, not_traces[0])
+        self.assertRaises(ValueError, store.read_traces, [self.trace_idx[0], not_traces[0]])
+
+    def test_create_trace_store_incremental(self):
+        expected = trace_store.create_trace_store(self.data, DATA_GROUP, progress=False)
+        expected_samples = expected.samples.read()
+
+        # Pretend only the first 500 blobs were converted
+        self.group.trace_index.truncate(500)
+        self.group.trace_samples.truncate(expected.offsets[500])
+        store = trace_store.create_trace_store(self.data, DATA_GROUP, progress=False)
+
+        assert_array_equal(store.offsets, expected.offsets)
+        assert_array_equal(store.lengths, expected.lengths)
+        assert_array_equal(store.samples.read(), expected_samples)
+
+    def test_read_traces(self):
+        store = trace_store.create_trace_store(self.data, DATA_GROUP, progress=False)
+        for indices in [self.trace_idx[:8], self.trace_idx[::-50], []]:
+            traces = store.read_traces(indices)
+            self.assertEqual(len(traces), len(indices))
+            for idx, trace in zip(indices, traces):
+                assert_array_equal(trace, store[idx])
+
+    def test_blobs_added_after_conversion(self):
+        """Traces of blobs added after the conversion are decoded from the blobs"""
+
+        trace_store.create_trace_store(self.data, DATA_GROUP, progress=False)
+        blobs = self.group.blobs
+        n_blobs = len(blobs)
+        events = self.group.events.read(0, 5)
+        for blob_idx in events['traces'].ravel():
+            blobs.append(blobs[blob_idx])
+        events['traces'] = n_blobs + arange(events['traces'].size).reshape(events['traces'].shape)
+        self.group.events.append(events)
+
+        store = trace_store.TraceStore(self.group)
+        new_idx = events['traces'].ravel()
+        self.assertEqual(len(store), n_blobs)
+        for idx, trace in zip(new_idx, store.read_traces(new_idx)):
+            assert_array_equal(trace, trace_store.decode_trace(blobs[idx]))
+            assert_array_equal(store[idx], trace)
+
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        timings = proc.process_traces()
+        assert_array_equal(timings[-5:], timings[:5])
+
+    def test_from_group(self):
+        self.assertIsNone(trace_store.TraceStore.from_group(self.group))
+        trace_store.create_trace_store(self.data, DATA_GROUP, progress=False)
+        self.assertIsInstance(trace_store.TraceStore.from_group(self.group), trace_store.TraceStore)
+
+    def test_process_events(self):
+        """Events are processed using the trace store, without the blobs"""
+
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        events = proc.source.read(0, 5)
+        expected_timings = proc.process_traces()
+        expected_traces = proc.get_traces_for_events(events)
+        expected_event_traces = proc.get_traces_for_event(events[0])
+        trace_store.create_trace_store(self.data, DATA_GROUP, progress=False)
+        self.group.blobs.remove()
+
+        proc = process_events.ProcessEvents(self.data, DATA_GROUP, progress=False)
+        assert_array_equal(proc.process_traces(), expected_timings)
+        assert_array_equal(proc.get_traces_for_events(events), expected_traces)
+        assert_array_equal(proc.get_traces_for_event(events[0]), expected_event_traces)
+
+    def create_tempfile_from_testdata(self):
+        tmp_path = self.create_tempfile_path()
+        data_path = self.get_testdata_path()
+        shutil.copyfile(data_path, tmp_path)
+        return tmp_path
+
+    def create_tempfile_path(self):
+        fd, path = tempfile.mkstemp('.h5')
+        os.close(fd)
+        return path
+
+    def get_testdata_path(self):
+        dir_path = os.path.dirname(__file__)
+        return os.path.join(dir_path, TEST_DATA_FILE)
+
+
+class TraceCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = trace_store.TraceCache(max_bytes=30)
+
+    def test_get_and_put(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', arange(5, dtype='i2'))
+        assert_array_equal(self.cache.get('a'), arange(5))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(self.cache.nbytes, 10)
+        self.assertFalse(self.cache.get('a').flags.writeable)
+
+        self.cache.put('a', arange(6, dtype='i2'))
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.nbytes, 12)
+
+    def test_least_recently_used_are_removed(self):
+        for key in 'abc':
+            self.cache.put(key, arange(5, dtype='i2'))
+        self.cache.get('a')
+        self.cache.put('d', arange(5, dtype='i2'))
+        self.assertIsNone(self.cache.get('b'))
+        for key in 'acd':
+            self.assertIsNotNone(self.cache.get(key))
+        self.assertEqual(self.cache.nbytes, 30)
+
+        # Traces larger than the cache are not stored
+        self.cache.put('e', arange(20, dtype='i2'))
+        self.assertIsNone(self.cache.get('e'))
+        self.assertEqual(len(self.cache), 3)
+
+    def test_clear(self):
+        self.cache.put('a', arange(5, dtype='i2'))
+        self.cache.get('a')
+        self.cache.clear()
+        self.assertEqual((len(self.cache), self.cache.nbytes, self.cache.hits, self.cache.misses), (0, 0, 0, 0))
+
+    def test_process_events(self):
+        with tables.open_file(os.path.join(os.path.dirname(__file__), TEST_DATA_FILE), 'r') as data:
+            proc = process_events.ProcessEvents(data, DATA_GROUP, progress=False)
+            proc.trace_cache = trace_store.TraceCache()
+            event = proc.source[0]
+            n_traces = (event['traces'] >= 0).sum()
+            traces = proc.get_traces_for_event(event)
+            self.assertEqual((proc.trace_cache.hits, proc.trace_cache.misses), (0, n_traces))
+            with patch.object(process_events, 'decode_trace') as mock_decode:
+                assert_array_equal(proc.get_traces_for_event_index(0), traces)
+                mock_decode.assert_not_called()
+            self.assertEqual((proc.trace_cache.hits, proc.trace_cache.misses), (n_traces, n_traces))
+            key = (process_events._file_identity(data), DATA_GROUP, int(event['traces'][0]))
+            self.assertIn(key, proc.trace_cache._traces)
+
+            # Processing all events does not use the cache
+            proc.trace_cache.clear()
+            proc.process_traces()
+            self.assertEqual((len(proc.trace_cache), proc.trace_cache.hits, proc.trace_cache.misses), (0, 0, 0))
+
+    def test_rewritten_file(self):
+        """Traces of a file which is rewritten at the same path are read again"""
+
+        path = os.path.join(tempfile.mkdtemp(), 'rewritten.h5')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        cache = trace_store.TraceCache()
+        for trace in [b'200,201,1334', b'300,301,302,303']:
+            with tables.open_file(path, 'w') as data:
+                group = data.create_group('/', 's501')
+                data.create_table(group, 'events', {'traces': tables.Int32Col(shape=4, dflt=-1)})
+                group.events.append([([0, -1, -1, -1],)])
+                blobs = data.create_vlarray(group, 'blobs', tables.VLStringAtom())
+                blobs.append(zlib.compress(trace))
+            with tables.open_file(path, 'r') as data:
+                proc = process_events.ProcessEvents(data, DATA_GROUP, progress=False)
+                proc.trace_cache = cache
+                traces = proc.get_traces_for_event(proc.source[0])
+                assert_array_equal(traces[:, 0], [int(value) for value in trace.split(b',')])
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
@@ -1,8 +1,15 @@
 import builtins
+import shutil
+import tempfile
 import unittest
 
+from pathlib import Path
 from unittest.mock import patch
 
+from numpy import genfromtxt
+from numpy.testing import assert_array_equal
+
+from sapphire import api
 from sapphire.data import update_local_data
 
 
@@ -36,3 +43,51 @@ class UpdateLocalDataTests(unittest.TestCase):
         self.assertFalse(mock_print.called)
         update_local_data.update_local_tsv(progress=True)
         self.assertTrue(mock_print.called)
+
+    def test_compile_local_data(self):
+        """Data from the archive equals data from the separate files"""
+
+        local_base = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, local_base)
+        for urlpath in ['station/501.json', 'gps/501.tsv', 'electronics/501.tsv', 'layout/501.tsv']:
+            (local_base / urlpath).parent.mkdir(exist_ok=True)
+            shutil.copy(api.LOCAL_BASE / urlpath, local_base / urlpath)
+        tsv_data = [
+            ('gps/501', ('timestamp', 'latitude', 'longitude', 'altitude')),
+            ('electronics/501', ('timestamp', 'primary', 'secondary', 'primary_fpga', 'secondary_fpga')),
+            ('layout/501', tuple(f'column{i}' for i in range(17))),
+        ]
+        expected = [
+            genfromtxt(local_base / f'{urlpath}.tsv', delimiter='\t', dtype=None, names=names)
+            for urlpath, names in tsv_data
+        ]
+
+        archive = local_base / 'local_data.npz'
+        self.addCleanup(api.clear_local_archive)
+        for module, name, value in [
+            (update_local_data, 'LOCAL_BASE', local_base),
+            (update_local_data, 'LOCAL_ARCHIVE', archive),
+            (api, 'LOCAL_BASE', local_base),
+            (api, 'LOCAL_ARCHIVE', archive),
+        ]:
+            patcher = patch.object(module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        api.clear_local_archive()
+        self.assertIsNone(api._get_compiled_local_data('gps'))
+        update_local_data.compile_local_data(progress=False)
+        self.assertIn('501', api._get_compiled_local_data('gps')[1])
+
+        # Remove the files, only the archive remains
+        for subdir in ['station', 'gps', 'electronics', 'layout']:
+            shutil.rmtree(local_base / subdir)
+        self.assertEqual(api._load_local_json('station/501')['number'], 501)
+        for (urlpath, names), expected_data in zip(tsv_data, expected):
+            data = api._load_local_tsv(urlpath, names)
+            self.assertEqual(data.dtype, expected_data.dtype)
+            assert_array_equal(data, expected_data)
+
+        # Data which is not in the archive is read from the files
+        with self.assertRaises(FileNotFoundError):
+            api._load_local_tsv('gps/502', ('timestamp', 'latitude', 'longitude', 'altitude'))
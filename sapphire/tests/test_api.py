@@ -10,7 +10,7 @@ from urllib.error import HTTPError, URLError
 
 from numpy.testing import assert_allclose, assert_equal
 
-from sapphire import api
+from sapphire import api, cache
 
 STATION = 501
 ALT_STATION = 502
@@ -36,6 +36,8 @@ class APIBaseTest(unittest.TestCase):
 class APITests(unittest.TestCase):
     def setUp(self):
         self.api = api.API()
+        cache.get_metadata_cache().invalidate()
+        self.addCleanup(cache.get_metadata_cache().invalidate)
 
     @patch.object(api, 'urlopen')
     def test_no_check_connection(self, mock_urlopen):
@@ -57,6 +59,7 @@ class APITests(unittest.TestCase):
         self.assertEqual(self.api._get_tsv('gps/2/').tolist(), [(1297956608, 52.3414237, 4.8807081, 43.32)])
 
         mock_urlopen.return_value.read.side_effect = URLError('no interwebs!')
+        cache.get_metadata_cache().invalidate()
         self.assertRaises(Exception, self.api._get_tsv, 'gps/2/')
         self.api.force_fresh = False
         self.assertRaises(Exception, self.api._get_tsv, 'gps/0/')
@@ -64,6 +67,38 @@ class APITests(unittest.TestCase):
             self.assertEqual(self.api._get_tsv('gps/2/').tolist()[0], (1297953008, 52.3414237, 4.8807081, 43.32))
         self.assertEqual(len(warned), 1)
 
+    @patch.object(api, 'urlopen')
+    def test_metadata_cache(self, mock_urlopen):
+        """Data from the server is shared between instances"""
+
+        mock_urlopen.return_value.read.return_value = b'1297956608\t52.3414237\t4.8807081\t43.32'
+        data = self.api._get_tsv('gps/2/')
+        data['f0'] = 0
+        other_data = api.API()._get_tsv('gps/2/')
+        self.assertEqual(other_data.tolist(), [(1297956608, 52.3414237, 4.8807081, 43.32)])
+        self.assertEqual(mock_urlopen.call_count, 1)
+
+        mock_urlopen.return_value.read.return_value = b'{"number": 2}'
+        self.assertEqual(self.api._get_json('station/2/'), {'number': 2})
+        self.assertEqual(api.API()._get_json('station/2/'), {'number': 2})
+        self.assertEqual(mock_urlopen.call_count, 2)
+
+        # Fresh data is retrieved from the server, and stored in the cache
+        mock_urlopen.return_value.read.return_value = b'{"number": 3}'
+        self.assertEqual(api.API(force_fresh=True)._get_json('station/2/'), {'number': 3})
+        self.assertEqual(api.API()._get_json('station/2/'), {'number': 3})
+        mock_urlopen.return_value.read.return_value = b'1297956608\t52.3414237\t4.8807081\t43.32'
+        api.API(force_fresh=True)._get_tsv('gps/2/')
+        self.assertEqual(mock_urlopen.call_count, 4)
+
+        # Stale data is not taken from the cache
+        with warnings.catch_warnings(record=True):
+            self.assertNotEqual(api.API(force_stale=True)._get_tsv('gps/2/').tolist()[0][0], 1297956608)
+
+        cache.get_metadata_cache().invalidate()
+        api.API()._get_tsv('gps/2/')
+        self.assertEqual(mock_urlopen.call_count, 5)
+
 
 @unittest.skipUnless(api.API.check_connection(), 'Internet connection required')
 class APITestsLive(unittest.TestCase):
@@ -82,6 +117,8 @@ class APITestsLive(unittest.TestCase):
 @unittest.skipUnless(api.API.check_connection(), 'Internet connection required')
 class NetworkTests(unittest.TestCase):
     def setUp(self):
+        cache.get_metadata_cache().invalidate()
+        self.addCleanup(cache.get_metadata_cache().invalidate)
         self.network = api.Network(force_fresh=True, force_stale=False)
         self.keys = ['name', 'number']
 
@@ -332,6 +369,8 @@ class StaleNetworkTests(NetworkTests):
 @unittest.skipUnless(api.API.check_connection(), 'Internet connection required')
 class StationTests(unittest.TestCase):
     def setUp(self):
+        cache.get_metadata_cache().invalidate()
+        self.addCleanup(cache.get_metadata_cache().invalidate)
         self.station = api.Station(STATION, force_fresh=True, force_stale=False)
         self.alt_station = api.Station(ALT_STATION, force_fresh=True, force_stale=False)
 
@@ -618,6 +657,51 @@ class StationTests(unittest.TestCase):
         data = self.station.station_timing_offset(STATION)
         self.assertEqual(data, (0.0, 0.0))
 
+    def test_array_lookups(self):
+        """Vectorized lookups match the lookups for single timestamps"""
+
+        timestamps = [0, 1378771200, 1378771200, 1420070400, FUTURE]
+
+        data = self.station.voltage_array(timestamps)
+        self.assertEqual(len(data), len(timestamps))
+        self.assertEqual(data.dtype, self.station.voltages.dtype)
+        for ts, row in zip(timestamps, data):
+            self.assertEqual(self.station.voltage(ts), [row[f'voltage{i}'] for i in range(1, 5)])
+
+        data = self.station.current_array(timestamps)
+        for ts, row in zip(timestamps, data):
+            self.assertEqual(self.station.current(ts), [row[f'current{i}'] for i in range(1, 5)])
+
+        data = self.station.gps_location_array(timestamps)
+        for ts, row in zip(timestamps, data):
+            location = self.station.gps_location(ts)
+            self.assertEqual([location[key] for key in ('latitude', 'longitude', 'altitude')], list(row)[1:])
+
+        data = self.station.trigger_array(timestamps)
+        for ts, row in zip(timestamps, data):
+            thresholds, trigger = self.station.trigger(ts)
+            self.assertEqual(thresholds, [[row[f'low{i}'], row[f'high{i}']] for i in range(1, 5)])
+            self.assertEqual(trigger, [row['n_low'], row['n_high'], row['and_or'], row['external']])
+
+        data = self.station.station_layout_array(timestamps)
+        for ts, row in zip(timestamps, data):
+            layout = self.station.station_layout(ts)
+            self.assertEqual([value for detector in layout for value in detector], list(row)[1:])
+
+        data = self.station.detector_timing_offset_array(timestamps)
+        for ts, row in zip(timestamps, data):
+            assert_equal(self.station.detector_timing_offset(ts), [row[f'offset{i}'] for i in range(1, 5)])
+
+        data = self.station.station_timing_offset_array(ALT_STATION, timestamps)
+        for ts, row in zip(timestamps, data):
+            assert_equal(self.station.station_timing_offset(ALT_STATION, ts), (row['offset'], row['error']))
+
+        data = self.station.station_timing_offset_array(STATION, timestamps)
+        assert_equal(data['offset'], 0.0)
+        assert_equal(data['error'], 0.0)
+
+        self.assertEqual(len(self.station.voltage_array([])), 0)
+
     def laziness_of_attribute(self, attribute):
         with patch.object(api.API, '_get_tsv') as mock_get_tsv:
             self.assertFalse(mock_get_tsv.called)
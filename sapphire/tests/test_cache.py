@@ -0,0 +1,138 @@
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from unittest.mock import patch
+
+from sapphire import cache
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = cache.ResponseCache(self.directory)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('https://example.org/a'))
+        self.cache.set('https://example.org/a', b'response')
+        self.assertEqual(self.cache.get('https://example.org/a'), b'response')
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+        # Cache is persistent
+        other_cache = cache.ResponseCache(self.directory)
+        self.assertEqual(other_cache.get('https://example.org/a'), b'response')
+
+    @patch.object(cache.time, 'time')
+    def test_expiry(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.set('https://example.org/a', b'response', ttl=10)
+        self.cache.set('https://example.org/b', b'response')
+        mock_time.return_value = 1005
+        self.assertEqual(self.cache.get('https://example.org/a'), b'response')
+        mock_time.return_value = 1_000_000
+        self.assertIsNone(self.cache.get('https://example.org/a'))
+        self.assertEqual(self.cache.get('https://example.org/b'), b'response')
+
+    def test_corrupt_response(self):
+        self.cache.set('https://example.org/a', b'response')
+        connection = sqlite3.connect(self.cache.path)
+        with connection:
+            connection.execute('UPDATE responses SET checksum = 0')
+        connection.close()
+        self.assertIsNone(self.cache.get('https://example.org/a'))
+        self.assertEqual(self.cache.size, 0)
+
+    @patch.object(cache.time, 'time')
+    def test_lru_eviction(self, mock_time):
+        body = os.urandom(1000)
+        self.cache.max_size = 2500
+        for timestamp, url in enumerate(['a', 'b', 'c']):
+            mock_time.return_value = timestamp
+            self.cache.set(url, body)
+            if url == 'b':
+                # Access a, making b the least recently used
+                mock_time.return_value = 10
+                self.cache.get('a')
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertLessEqual(self.cache.size, 2500)
+
+    def test_invalidate(self):
+        self.cache.set('a', b'response')
+        self.cache.set('b', b'response')
+        self.cache.invalidate('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('b'))
+        self.cache.invalidate()
+        self.assertEqual(self.cache.size, 0)
+
+    def test_large_response_not_stored(self):
+        self.cache.max_response_size = 10
+        self.assertFalse(self.cache.set('a', b'long response'))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.set('b', b'response'))
+        self.assertEqual(self.cache.get('b'), b'response')
+
+    def test_write_error_ignored(self):
+        with patch.object(self.cache, '_connect', side_effect=sqlite3.OperationalError('database is locked')):
+            with self.assertLogs(cache.logger, 'WARNING'):
+                self.assertFalse(self.cache.set('a', b'response'))
+        self.assertIsNone(self.cache.get('a'))
+
+
+class MemoryCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = cache.MemoryCache(ttl=10)
+
+    @patch.object(cache.time, 'time')
+    def test_get_set(self, mock_time):
+        mock_time.return_value = 1000
+        self.assertIsNone(self.cache.get(('tsv', 501)))
+        self.cache.set(('tsv', 501), 'value')
+        self.cache.set(('tsv', 502), 'value', ttl=100)
+        self.assertEqual(self.cache.get(('tsv', 501)), 'value')
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+        mock_time.return_value = 1050
+        self.assertIsNone(self.cache.get(('tsv', 501)))
+        self.assertEqual(self.cache.get(('tsv', 502)), 'value')
+        self.assertEqual(len(self.cache), 1)
+
+    def test_invalidate(self):
+        self.cache.set('a', 'value')
+        self.cache.set('b', 'value')
+        self.cache.invalidate('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 'value')
+        self.cache.invalidate()
+        self.assertEqual(len(self.cache), 0)
+
+
+class CacheConfigurationTests(unittest.TestCase):
+    def test_get_response_cache(self):
+        with patch.dict(os.environ, {'SAPPHIRE_CACHE_DIR': ''}):
+            self.assertIsNone(cache.get_response_cache())
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with patch.dict(os.environ, {'SAPPHIRE_CACHE_DIR': directory, 'SAPPHIRE_CACHE_SIZE': '1000'}):
+            response_cache = cache.get_response_cache()
+            self.assertIsInstance(response_cache, cache.ResponseCache)
+            self.assertEqual(response_cache.max_size, 1000)
+            self.assertIs(cache.get_response_cache(), response_cache)
+
+    def test_get_metadata_cache(self):
+        self.assertIsInstance(cache.get_metadata_cache(), cache.MemoryCache)
+        self.assertIs(cache.get_metadata_cache(), cache.get_metadata_cache())
+
+    def test_interval_ttl(self):
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time(0, 0))
+        self.assertIsNone(cache.interval_ttl(today))
+        self.assertIsNone(cache.interval_ttl(datetime.datetime(2012, 1, 1)))
+        self.assertEqual(cache.interval_ttl(today + datetime.timedelta(hours=1)), cache.TODAY_TTL)
@@ -1,3 +1,4 @@
+import threading
 import unittest
 import warnings
 
@@ -5,9 +6,10 @@ from math import atan2, pi, sqrt
 from unittest.mock import Mock, patch, sentinel
 
 from numpy import array, nan
+from numpy import genfromtxt as numpy_genfromtxt
 from numpy.testing import assert_array_almost_equal
 
-from sapphire import clusters
+from sapphire import api, clusters
 
 
 class DetectorTests(unittest.TestCase):
@@ -634,6 +636,49 @@ class HiSPARCStationTests(unittest.TestCase):
         with self.assertRaises(KeyError):
             clusters.HiSPARCStations([0, 508, 510], skip_missing=False, force_stale=True)
 
+    def test_concurrent_equals_serial(self):
+        """Retrieving metadata concurrently gives the same cluster"""
+
+        stations = [0, 501, 502, 503, 505, 506, 508, 509, 510, 1001, 7001]
+        with warnings.catch_warnings(record=True) as warned_serial:
+            serial = clusters.HiSPARCStations(stations, skip_missing=True, force_stale=True, n_workers=1)
+        with warnings.catch_warnings(record=True) as warned:
+            cluster = clusters.HiSPARCStations(stations, skip_missing=True, force_stale=True, n_workers=4)
+        self.assertEqual(repr(cluster), repr(serial))
+        for station, serial_station in zip(cluster.stations, serial.stations):
+            self.assertEqual(station.get_coordinates(), serial_station.get_coordinates())
+            for detector, serial_detector in zip(station.detectors, serial_station.detectors):
+                self.assertEqual(detector.get_coordinates(), serial_detector.get_coordinates())
+        self.assertEqual(
+            [str(warning.message) for warning in warned if 'Could not get' in str(warning.message)],
+            [str(warning.message) for warning in warned_serial if 'Could not get' in str(warning.message)],
+        )
+
+    def test_metadata_parsed_in_calling_thread(self):
+        """The threads only request the metadata, the warnings filters are unchanged"""
+
+        requested = []
+        parsed = []
+
+        def retrieve_url(urlpath, base=None):
+            requested.append(threading.current_thread())
+            extension = 'tsv' if base == api.get_src_base() else 'json'
+            return (api.LOCAL_BASE / f'{urlpath}.{extension}').read_text()
+
+        def genfromtxt(*args, **kwargs):
+            parsed.append(threading.current_thread())
+            return numpy_genfromtxt(*args, **kwargs)
+
+        filters = list(warnings.filters)
+        with patch.object(api.API, '_retrieve_url', side_effect=retrieve_url):
+            with patch.object(api, 'genfromtxt', side_effect=genfromtxt):
+                cluster = clusters.HiSPARCStations([501, 502, 503], force_fresh=True, n_workers=3)
+        self.assertEqual(warnings.filters, filters)
+        self.assertEqual([station.number for station in cluster.stations], [501, 502, 503])
+        self.assertIn(True, [thread is not threading.current_thread() for thread in requested])
+        self.assertEqual(len(parsed), 6)
+        self.assertEqual(set(parsed), {threading.current_thread()})
+
     def test_zero_center_off_mass(self):
         center = self.cluster.calc_center_of_mass_coordinates()
         assert_array_almost_equal(center, [0.0, 0.0, 0.0])
@@ -1,21 +1,38 @@
+import csv
+import datetime
 import os
+import shutil
+import tempfile
+import threading
 import unittest
 
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
 from unittest.mock import ANY, MagicMock, patch, sentinel
+from urllib.parse import parse_qs, urlparse
 
+import numpy as np
 import tables
 
+from numpy.testing import assert_array_equal
+
 from sapphire import api, esd
 from sapphire.tests.esd_load_data import (
+    coincidences_source,
     create_tempfile_path,
+    events_source,
+    lightning_source,
     perform_download_coincidences,
     perform_esd_download_data,
     perform_load_coincidences,
     perform_load_data,
+    singles_source,
     test_data_coincidences_path,
     test_data_path,
+    weather_source,
 )
 from sapphire.tests.validate_results import validate_results
+from sapphire.transformations.clock import datetime_to_gps, gps_to_datetime
 
 
 class StaleNetwork(api.Network):
@@ -108,6 +125,7 @@ class ESDTest(unittest.TestCase):
 
         self.assertRaises(ValueError, esd.load_data, None, None, None, 'bad')
         self.assertRaises(ValueError, esd.download_data, None, None, 501, type='bad')
+        self.assertRaises(ValueError, esd.download_many, None, [501], type='bad')
 
     def test_start_end_values(self):
         """Check for RuntimeError for impossible end=value with start=None"""
@@ -132,6 +150,73 @@ class ESDTest(unittest.TestCase):
         validate_results(self, test_data_coincidences_path, output_path)
         os.remove(output_path)
 
+    @patch.object(esd.api, 'Network', side_effect=StaleNetwork)
+    def test_load_coincidences_in_small_batches(self, mock_esd_api_network):
+        """Storing coincidences in many small batches gives the same output"""
+
+        output_path = create_tempfile_path()
+        with tables.open_file(output_path, 'w', filters=tables.Filters(complevel=1)) as datafile:
+            esd.load_coincidences(datafile, coincidences_source, batch_size=4)
+        validate_results(self, test_data_coincidences_path, output_path)
+        os.remove(output_path)
+
+    def test_store_coincidence_unknown_station(self):
+        """Check for KeyError for stations without column or group"""
+
+        with tables.open_file('coincidences.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+            station_groups = {501: {'group': '/s501', 's_index': 0}, 510: {'group': '/s510', 's_index': 1}}
+            c_group = esd._create_coincidences_tables(data, '', station_groups)
+            del station_groups[510]
+            with esd.ReadLinesAndStoreCoincidenceClass(data, c_group, station_groups) as writer:
+                self.assertRaises(KeyError, writer.store_coincidence, [['0', '502']])
+                self.assertRaises(KeyError, writer.store_coincidence, [['0', '510']])
+
+    def test_store_lines_equals_store_line(self):
+        """Storing blocks of lines gives the same result as line by line"""
+
+        sources = [
+            (events_source, esd._create_events_table, esd.ReadLineAndStoreEventClass),
+            (weather_source, esd._create_weather_table, esd.ReadLineAndStoreWeatherClass),
+            (singles_source, esd._create_singles_table, esd.ReadLineAndStoreSinglesClass),
+            (lightning_source, esd._create_lightning_table, esd.ReadLineAndStoreLightningClass),
+        ]
+        with tables.open_file('store_lines.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+            for source, create_table, read_and_store_class in sources:
+                with open(source) as tsv:
+                    lines = [line for line in csv.reader(tsv, delimiter='\t') if line[0][0] != '#']
+                per_line = create_table(data, '/per_line')
+                per_block = create_table(data, '/per_block')
+                with read_and_store_class(per_line) as writer:
+                    for line in lines:
+                        writer.store_line(line)
+                with read_and_store_class(per_block) as writer:
+                    # Split lines in two blocks to check event_id numbering
+                    writer.store_lines(['\t'.join(line) for line in lines[:3]])
+                    timestamp = writer.store_lines(['\t'.join(line) for line in lines[3:]])
+                self.assertEqual(timestamp, int(lines[-1][2]))
+                assert_array_equal(per_line.read(), per_block.read())
+                per_line.remove()
+                per_block.remove()
+
+    def test_store_tsv_blocks(self):
+        """Check comment lines and last line when reading small blocks"""
+
+        writer = MagicMock()
+        writer.store_lines.return_value = sentinel.timestamp
+        callback = MagicMock()
+        data = BytesIO(b'# header\n#\n2017-01-01\t00:00:00\t1\n2017-01-01\t00:00:01\t2\n# Finished downloading.')
+        line = esd._store_tsv_blocks(data, writer, callback, block_size=30)
+        self.assertEqual(line, ['# Finished downloading.'])
+        stored_lines = [line for call in writer.store_lines.call_args_list for line in call.args[0]]
+        self.assertEqual(stored_lines, ['2017-01-01\t00:00:00\t1', '2017-01-01\t00:00:01\t2'])
+        callback.assert_called_with(sentinel.timestamp)
+
+        data = BytesIO(b'# header\n2017-01-01\t00:00:00\t1\n')
+        line = esd._store_tsv_blocks(data, writer, block_size=7)
+        self.assertEqual(line, ['2017-01-01', '00:00:00', '1'])
+
+        self.assertIsNone(esd._store_tsv_blocks(BytesIO(b''), writer))
+
     @patch.object(esd, 'download_data')
     @patch.object(tables, 'open_file')
     def test_quick_download(self, mock_open_file, mock_download_data):
@@ -159,3 +244,280 @@ class ESDTest(unittest.TestCase):
         perform_download_coincidences(output_path)
         validate_results(self, test_data_coincidences_path, output_path)
         os.remove(output_path)
+
+
+class LocalESDHandler(BaseHTTPRequestHandler):
+    """Serve the events test data for station 501, fail for other stations"""
+
+    requests = []
+    # Days for which station 504 sends an incomplete download
+    failing_days = set()
+
+    def do_GET(self):  # noqa: N802
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.requests.append((url.path, query))
+        if url.path == '/data/504/events/':
+            # The test data moved to the requested day
+            start = datetime.datetime.fromisoformat(query['start'][0])
+            end = datetime.datetime.fromisoformat(query['end'][0])
+            self.send_response(200)
+            self.end_headers()
+            with open(events_source) as tsv:
+                lines = [line for line in tsv if not line.startswith('#')]
+            lines = [self._move_line(line, start.date(), start, end) for line in lines]
+            if start.date() in self.failing_days:
+                lines = [line for line in lines if line][:10]
+            else:
+                lines.append('# Success\n')
+            self.wfile.write(''.join(line for line in lines if line).encode())
+        elif url.path == '/data/501/events/':
+            self.send_response(200)
+            self.end_headers()
+            with open(events_source, 'rb') as tsv:
+                self.wfile.write(tsv.read())
+        elif url.path == '/data/502/events/':
+            # Incomplete download, data but no success line
+            self.send_response(200)
+            self.end_headers()
+            with open(events_source, 'rb') as tsv:
+                self.wfile.write(tsv.read().rpartition(b'\n')[0])
+        else:
+            self.send_error(404)
+
+    @staticmethod
+    def _move_line(line, date, start, end):
+        """Move a line of the test data to another date, empty if outside the interval"""
+
+        values = line.split('\t')
+        offset = (date - datetime.date(2012, 1, 1)).days * 86400
+        values[0] = str(date)
+        values[2] = str(int(values[2]) + offset)
+        if not datetime_to_gps(start) <= int(values[2]) < datetime_to_gps(end):
+            return ''
+        return '\t'.join(values)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServerDownloadTest(unittest.TestCase):
+    def setUp(self):
+        LocalESDHandler.requests = []
+        self.server = HTTPServer(('localhost', 0), LocalESDHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        base = f'http://localhost:{self.server.server_port}'
+        patcher = patch.dict(os.environ, {'PUBLICDB_BASE': base})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_download_many(self):
+        """Download multiple days for multiple stations from a local server"""
+
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2012, 1, 3, 12)
+        with tables.open_file('download_many.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+            failed = esd.download_many(
+                data,
+                [501, 502, 503],
+                start,
+                end,
+                n_workers=3,
+                retries=1,
+                retry_delay=0,
+                progress=False,
+            )
+            days = [start, datetime.datetime(2012, 1, 2), datetime.datetime(2012, 1, 3)]
+            self.assertEqual(failed, [(station, day) for station in [502, 503] for day in days])
+
+            # Three days of the same test data stored in order
+            with tables.open_file(test_data_path) as expected:
+                expected_events = expected.root.events.read()
+            events = data.root.s501.events.read()
+            self.assertEqual(len(events), 3 * len(expected_events))
+            self.assertEqual(list(events['event_id']), list(range(len(events))))
+            for i in range(3):
+                part = events[i * len(expected_events) : (i + 1) * len(expected_events)]
+                assert_array_equal(part['ext_timestamp'], expected_events['ext_timestamp'])
+            self.assertNotIn('s502', data.root)
+            self.assertNotIn('s503', data.root)
+
+        # Every day is requested separately, failed days are retried once
+        requested = [(path, query['start'][0], query['end'][0]) for path, query in LocalESDHandler.requests]
+        self.assertEqual(len(requested), 3 + 2 * 3 * 2)
+        self.assertIn(('/data/501/events/', '2012-01-03 00:00:00', '2012-01-03 12:00:00'), requested)
+        self.assertEqual(requested.count(('/data/502/events/', '2012-01-01 00:00:00', '2012-01-02 00:00:00')), 2)
+
+    def test_download_array(self):
+        """Download data into memory, equal to the table from download_data"""
+
+        start = datetime.datetime(2012, 1, 1)
+        events = esd.download_array(501, start, progress=False)
+        with tables.open_file(test_data_path) as expected:
+            expected_events = expected.root.events.read()
+        self.assertEqual(events.dtype, expected_events.dtype)
+        assert_array_equal(events, expected_events)
+
+        with self.assertRaises(ValueError):
+            esd.download_array(502, start, progress=False)
+        with self.assertRaises(ValueError):
+            esd.download_array(501, start, type='foo')
+
+    def test_download_data_incremental(self):
+        """Complete a day of which the stored part is unknown and mark it as completed"""
+
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2012, 1, 2)
+        with open(events_source) as tsv:
+            lines = [line.rstrip('\n') for line in tsv if not line.startswith('#')]
+        with tables.open_file('incremental.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+            # Half-filled table, without a record of the covered interval
+            table = esd._create_events_table(data, '/s501')
+            with esd.ReadLineAndStoreEventClass(table) as writer:
+                writer.store_lines(lines[:10])
+
+            esd.download_data(data, None, 501, start, end, progress=False, incremental=True)
+            with tables.open_file(test_data_path) as expected:
+                assert_array_equal(table.read(), expected.root.events.read())
+            self.assertEqual(list(table.attrs.completed_days), [1325376000])
+            self.assertEqual(table.attrs.covered_intervals.tolist(), [[1325376000, 1325462400]])
+            # The whole day is downloaded again, stored events are skipped
+            path, query = LocalESDHandler.requests[-1]
+            self.assertEqual(query['start'], ['2012-01-01 00:00:00'])
+
+            # Nothing new is stored when downloading the same interval again
+            esd.download_data(data, None, 501, start, end, progress=False, incremental=True)
+            self.assertEqual(len(table), len(lines))
+
+            # Completed days are skipped entirely
+            n_requests = len(LocalESDHandler.requests)
+            failed = esd.download_many(data, [501], start, end, progress=False, incremental=True)
+            self.assertEqual(failed, [])
+            self.assertEqual(len(LocalESDHandler.requests), n_requests)
+
+    def test_download_many_incremental_refills_failed_day(self):
+        """A day which failed between stored days is downloaded on the next run"""
+
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2012, 1, 4)
+        self.addCleanup(LocalESDHandler.failing_days.clear)
+        LocalESDHandler.failing_days.add(datetime.date(2012, 1, 2))
+        with tables.open_file('refill.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+            failed = esd.download_many(data, [504], start, end, retries=0, progress=False, incremental=True)
+            self.assertEqual(failed, [(504, datetime.datetime(2012, 1, 2))])
+            table = data.root.s504.events
+            n_events = len(table)
+            self.assertEqual(list(table.attrs.completed_days), [1325376000, 1325548800])
+
+            LocalESDHandler.failing_days.clear()
+            n_requests = len(LocalESDHandler.requests)
+            failed = esd.download_many(data, [504], start, end, progress=False, incremental=True)
+            self.assertEqual(failed, [])
+            # Only the failed day is requested, from the start of the day
+            path, query = LocalESDHandler.requests[n_requests]
+            self.assertEqual(len(LocalESDHandler.requests), n_requests + 1)
+            self.assertEqual(query['start'], ['2012-01-02 00:00:00'])
+            self.assertEqual(len(table), 3 * n_events // 2)
+            self.assertEqual(list(table.attrs.completed_days), [1325376000, 1325462400, 1325548800])
+
+    def test_download_data_incremental_resumes_interrupted_day(self):
+        """An interrupted download resumes after the covered part of the day"""
+
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2012, 1, 2)
+        self.addCleanup(LocalESDHandler.failing_days.clear)
+        LocalESDHandler.failing_days.add(start.date())
+        with tables.open_file('interrupted.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+            with self.assertRaises(ValueError):
+                esd.download_data(data, '/s504', 504, start, end, progress=False, incremental=True)
+            table = data.root.s504.events
+            self.assertEqual(len(table), 10)
+            last_timestamp = int(table[-1]['timestamp'])
+            self.assertEqual(table.attrs.covered_intervals.tolist(), [[1325376000, last_timestamp]])
+            self.assertNotIn('completed_days', table.attrs)
+
+            LocalESDHandler.failing_days.clear()
+            esd.download_data(data, '/s504', 504, start, end, progress=False, incremental=True)
+            path, query = LocalESDHandler.requests[-1]
+            self.assertEqual(query['start'], [str(gps_to_datetime(last_timestamp))])
+            with tables.open_file(test_data_path) as expected:
+                assert_array_equal(table.col('ext_timestamp'), expected.root.events.col('ext_timestamp'))
+            self.assertEqual(list(table.attrs.completed_days), [1325376000])
+
+    def test_download_incremental_partial_day(self):
+        """A day with stored data which does not start at midnight is completed"""
+
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2012, 1, 2)
+        with tables.open_file(test_data_path) as expected:
+            expected_timestamps = expected.root.events.col('ext_timestamp')
+        for download in [esd.download_data, esd.download_many]:
+            with self.subTest(download=download.__name__):
+                with tables.open_file('partial.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+                    esd.download_data(data, '/s504', 504, start + datetime.timedelta(seconds=30), end, progress=False)
+                    table = data.root.s504.events
+                    n_partial = len(table)
+                    self.assertLess(n_partial, len(expected_timestamps))
+
+                    if download is esd.download_data:
+                        download(data, '/s504', 504, start, end, progress=False, incremental=True)
+                    else:
+                        self.assertEqual(download(data, [504], start, end, progress=False, incremental=True), [])
+                    path, query = LocalESDHandler.requests[-1]
+                    self.assertEqual(query['start'], ['2012-01-01 00:00:00'])
+                    self.assertEqual(len(table), len(expected_timestamps))
+                    assert_array_equal(np.sort(table.col('ext_timestamp')), expected_timestamps)
+                    assert_array_equal(table.col('event_id'), np.arange(len(table)))
+                    self.assertEqual(list(table.attrs.completed_days), [1325376000])
+
+    def test_download_data_cached(self):
+        """Complete downloads are read from the response cache"""
+
+        start = datetime.datetime(2012, 1, 1)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with patch.dict(os.environ, {'SAPPHIRE_CACHE_DIR': cache_dir}):
+            with tables.open_file('cached.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+                esd.download_data(data, '/first', 501, start, progress=False)
+                esd.download_data(data, '/second', 501, start, progress=False)
+                assert_array_equal(data.root.first.events.read(), data.root.second.events.read())
+                self.assertEqual(len(LocalESDHandler.requests), 1)
+
+                # Incomplete downloads are not cached
+                for _ in range(2):
+                    with self.assertRaises(ValueError):
+                        esd.download_data(data, '/s502', 502, start, progress=False)
+                self.assertEqual(len(LocalESDHandler.requests), 3)
+
+                failed = esd.download_many(data, [501], start, progress=False)
+                self.assertEqual(failed, [])
+                self.assertEqual(len(LocalESDHandler.requests), 3)
+
+    def test_download_data_not_cached_if_too_large(self):
+        """Responses larger than the maximum response size are not cached"""
+
+        start = datetime.datetime(2012, 1, 1)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with patch.dict(os.environ, {'SAPPHIRE_CACHE_DIR': cache_dir}):
+            response_cache = esd.get_response_cache()
+            with patch.object(response_cache, 'max_response_size', 1000):
+                with tables.open_file('large.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0) as data:
+                    esd.download_data(data, '/first', 501, start, progress=False)
+                    esd.download_data(data, '/second', 501, start, progress=False)
+                    with tables.open_file(test_data_path) as expected:
+                        assert_array_equal(data.root.first.events.read(), expected.root.events.read())
+                        assert_array_equal(data.root.second.events.read(), expected.root.events.read())
+                    self.assertEqual(len(LocalESDHandler.requests), 2)
+                    self.assertEqual(response_cache.size, 0)
+
+    def test_split_in_days(self):
+        start = datetime.datetime(2012, 1, 1, 12)
+        end = datetime.datetime(2012, 1, 3)
+        self.assertEqual(
+            list(esd._split_in_days(start, end)),
+            [(start, datetime.datetime(2012, 1, 2)), (datetime.datetime(2012, 1, 2), end)],
+        )
+        self.assertEqual(list(esd._split_in_days(end, end)), [])
@@ -4,7 +4,8 @@ import shutil
 import unittest
 
 from datetime import datetime
-from unittest.mock import Mock, patch, sentinel
+from unittest.mock import Mock, call, patch, sentinel
+from xmlrpc.client import Fault
 
 import tables
 
@@ -50,6 +51,40 @@ class DownloadDataTest(unittest.TestCase):
             get_blobs=sentinel.blobs,
         )
 
+    @patch.object(publicdb, '_store_data')
+    @patch.object(publicdb, 'urlretrieve')
+    @patch.object(publicdb, 'ServerProxy')
+    def test_download_data_concurrent(self, mock_server, mock_retrieve, mock_store):
+        """Days are downloaded concurrently but stored in order"""
+
+        start = datetime(2010, 1, 1, 11)
+        end = datetime(2010, 1, 5, 13)
+        days = list(publicdb.datetimerange(start, end))
+        mock_get_data_url = mock_server.return_value.hisparc.get_data_url
+
+        def get_data_url(station_id, t0, get_blobs):
+            if t0 == days[2][0]:
+                raise Fault(1, 'No data for this date')
+            return f'url_{t0}'
+
+        mock_get_data_url.side_effect = get_data_url
+        mock_retrieve.side_effect = lambda url: (f'path_{url}', sentinel.headers)
+        publicdb.download_data(sentinel.file, sentinel.group, sentinel.station_id, start, end, n_workers=3)
+        self.assertEqual(mock_get_data_url.call_count, len(days))
+        self.assertEqual(
+            mock_store.call_args_list,
+            [call(sentinel.file, sentinel.group, f'path_url_{t0}', t0, t1) for t0, t1 in days if t0 != days[2][0]],
+        )
+
+    def test__copy_blobs(self):
+        with tables.open_file(test_data_src_path, 'r') as src_file:
+            src_node = src_file.get_node('/station_501/blobs')
+            dst_node = []
+            dst = Mock()
+            dst.append.side_effect = dst_node.append
+            publicdb._copy_blobs(src_node, dst, chunksize=7)
+            self.assertEqual(dst_node, src_node.read())
+
     def test__store_data(self):
         # store data removes the source data when completed, so use a temp
         tmp_src_path = create_tempfile_path()
@@ -0,0 +1,196 @@
+import gzip
+import os
+import socket
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+
+from sapphire import transport
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    """Serve a few fixed responses over keep-alive connections"""
+
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    failures = 0
+
+    def do_GET(self):  # noqa: N802
+        LocalHandler.requests.append((self.path, self.client_address[1], self.headers.get('Accept-Encoding')))
+        # Requests to a proxy contain the complete url
+        path = urlsplit(self.path).path
+        if path == '/data':
+            self.send_body(b'line 1\nline 2\n')
+        elif path == '/gzip':
+            body = gzip.compress(b'compressed\n' * 100)
+            self.send_body(body, {'Content-Encoding': 'gzip'})
+        elif path == '/redirect':
+            self.send_body(b'', {'Location': '/data'}, status=302)
+        elif path == '/proxy-authorization':
+            self.send_body(self.headers.get('Proxy-Authorization', '').encode())
+        elif path == '/flaky' and LocalHandler.failures:
+            LocalHandler.failures -= 1
+            self.send_body(b'unavailable', status=503)
+        elif path == '/flaky':
+            self.send_body(b'ok')
+        else:
+            self.send_body(b'not found', status=404)
+
+    def send_body(self, body, headers=None, status=200):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPClientTests(unittest.TestCase):
+    def setUp(self):
+        LocalHandler.requests = []
+        LocalHandler.failures = 0
+        self.server = ThreadingHTTPServer(('localhost', 0), LocalHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f'http://localhost:{self.server.server_port}'
+        self.client = transport.HTTPClient(timeout=5, backoff=0, proxies={})
+        self.addCleanup(self.client.close)
+
+    def test_connection_reuse(self):
+        """Consecutive requests use the same connection"""
+
+        for _ in range(3):
+            self.assertEqual(self.client.open(self.base + '/data').read(), b'line 1\nline 2\n')
+        ports = {port for path, port, encoding in LocalHandler.requests}
+        self.assertEqual(len(LocalHandler.requests), 3)
+        self.assertEqual(len(ports), 1)
+
+    def test_unread_response_not_reused(self):
+        """A connection is only reused after the response was read"""
+
+        first = self.client.open(self.base + '/data')
+        self.client.open(self.base + '/data').read()
+        first.close()
+        self.client.open(self.base + '/data').read()
+        ports = [port for path, port, encoding in LocalHandler.requests]
+        self.assertNotEqual(ports[0], ports[1])
+        self.assertEqual(ports[1], ports[2])
+
+    def test_lines(self):
+        response = self.client.open(self.base + '/data')
+        self.assertEqual(list(response), [b'line 1\n', b'line 2\n'])
+        self.assertEqual(response.status, 200)
+
+    def test_gzip(self):
+        """Compressed responses are decompressed"""
+
+        self.assertEqual(self.client.open(self.base + '/gzip').read(), b'compressed\n' * 100)
+        self.assertEqual(LocalHandler.requests[-1][2], 'gzip')
+
+        client = transport.HTTPClient(gzip=False)
+        self.addCleanup(client.close)
+        client.open(self.base + '/data').read()
+        self.assertEqual(LocalHandler.requests[-1][2], 'identity')
+
+    def test_redirect(self):
+        response = self.client.open(self.base + '/redirect')
+        self.assertEqual(response.read(), b'line 1\nline 2\n')
+        self.assertEqual(response.geturl(), self.base + '/data')
+
+    def test_retries(self):
+        """Unavailable responses are retried"""
+
+        LocalHandler.failures = 2
+        self.assertEqual(self.client.open(self.base + '/flaky').read(), b'ok')
+        self.assertEqual(len(LocalHandler.requests), 3)
+
+        LocalHandler.failures = 2
+        with self.assertRaises(HTTPError) as context:
+            self.client.open(self.base + '/flaky', retries=1)
+        self.assertEqual(context.exception.code, 503)
+
+    def test_errors(self):
+        with self.assertRaises(HTTPError) as context:
+            self.client.open(self.base + '/foo')
+        self.assertEqual(context.exception.code, 404)
+        self.assertEqual(len(LocalHandler.requests), 1)
+
+        with self.assertRaises(URLError):
+            self.client.open('ftp://localhost/')
+        self.server.server_close()
+        with self.assertRaises(URLError):
+            self.client.open(f'http://localhost:{self.server.server_port}/data', retries=0)
+
+    def test_errors_not_retried(self):
+        """Refused connections and failed name lookups are not retried"""
+
+        self.server.shutdown()
+        self.server.server_close()
+        with patch.object(self.client, '_open', wraps=self.client._open) as mock_open:
+            with self.assertRaises(URLError):
+                self.client.open(f'http://localhost:{self.server.server_port}/data', retries=2)
+        self.assertEqual(mock_open.call_count, 1)
+        with patch.object(self.client, '_open', side_effect=socket.gaierror('Name or service not known')) as mock_open:
+            with self.assertRaises(URLError):
+                self.client.open('http://data.hisparc.nl/', retries=2)
+        self.assertEqual(mock_open.call_count, 1)
+
+    @patch.object(transport.time, 'sleep')
+    def test_errors_retried(self, mock_sleep):
+        """Timeouts and reset connections are retried"""
+
+        response = MagicMock(status=200)
+        with patch.object(self.client, '_open', side_effect=[socket.timeout(), ConnectionResetError(), response]):
+            self.assertIs(self.client.open('http://data.hisparc.nl/', retries=2), response)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_proxy(self):
+        """Requests are sent through the configured proxy"""
+
+        client = transport.HTTPClient(proxies={'http': f'user:secret@localhost:{self.server.server_port}'})
+        self.addCleanup(client.close)
+        self.assertEqual(client.open('http://data.hisparc.invalid/data').read(), b'line 1\nline 2\n')
+        self.assertEqual(LocalHandler.requests[-1][0], 'http://data.hisparc.invalid/data')
+        self.assertEqual(
+            client.open('http://data.hisparc.invalid/proxy-authorization').read(),
+            b'Basic dXNlcjpzZWNyZXQ=',
+        )
+
+        # Hosts in no_proxy are requested directly
+        client = transport.HTTPClient(proxies={'http': 'http://proxy.invalid:3128', 'no': 'localhost'})
+        self.addCleanup(client.close)
+        self.assertEqual(client.open(self.base + '/data').read(), b'line 1\nline 2\n')
+
+        with patch.dict(os.environ, {'http_proxy': 'http://proxy.invalid:3128'}):
+            self.assertEqual(transport.HTTPClient().proxies['http'], 'http://proxy.invalid:3128')
+
+    def test_shared_client(self):
+        self.addCleanup(transport.set_http_client, None)
+        transport.set_http_client(self.client)
+        self.assertIs(transport.get_http_client(), self.client)
+        self.assertEqual(transport.urlopen(self.base + '/data').read(), b'line 1\nline 2\n')
+
+        path, headers = transport.urlretrieve(self.base + '/gzip')
+        self.addCleanup(os.remove, path)
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), b'compressed\n' * 100)
+
+        transport.set_http_client(None)
+        self.assertIsInstance(transport.get_http_client(), transport.HTTPClient)
+        self.assertIsNot(transport.get_http_client(), self.client)
+
+    @patch.object(transport.time, 'sleep')
+    def test_backoff(self, mock_sleep):
+        client = transport.HTTPClient(retries=2, backoff=1)
+        self.addCleanup(client.close)
+        LocalHandler.failures = 2
+        client.open(self.base + '/flaky').read()
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [1, 2])
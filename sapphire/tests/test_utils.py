@@ -88,6 +88,15 @@ class ActiveIndexTests(unittest.TestCase):
         for idx, ts in [(0, 0.0), (0, 1.0), (0, 1.5), (1, 2.0), (1, 2.1), (3, 4.0), (3, 5.0)]:
             self.assertEqual(utils.get_active_index(timestamps, ts), idx)
 
+    def test_get_active_indices(self):
+        """Test if the vectorized lookup matches the bisection"""
+
+        timestamps = [1.0, 2.0, 3.0, 4.0]
+        values = [0.0, 1.0, 1.5, 2.0, 2.1, 4.0, 5.0]
+        indices = utils.get_active_indices(timestamps, values)
+        self.assertEqual(indices.tolist(), [utils.get_active_index(timestamps, ts) for ts in values])
+        self.assertEqual(utils.get_active_indices(timestamps, []).tolist(), [])
+
 
 class GaussTests(unittest.TestCase):
     """Test against explicit Gaussian"""
@@ -0,0 +1,403 @@
+"""Shared HTTP client for requests to the HiSPARC Public Database
+
+All downloads by :mod:`~sapphire.api`, :mod:`~sapphire.esd`, and
+:mod:`~sapphire.publicdb` go through a single process-wide
+:class:`HTTPClient`.  The client keeps connections open after a request
+(keep-alive) and reuses them for following requests to the same server,
+which avoids a new TCP and TLS handshake for every request.  For example,
+when getting the metadata of all stations in a network.
+
+The client retries requests which timed out, of which the connection was
+reset, or which got a response with one of the :data:`RETRY_STATUSES`.
+Other errors, like a failed name lookup or a refused connection when
+offline, are raised immediately.  The client requests gzip compressed
+responses and transparently decompresses those.  Like
+:func:`urllib.request.urlopen`, the proxies configured in the environment
+(for example ``http_proxy`` and ``https_proxy``) are used.  To use
+different settings, replace the shared client::
+
+    >>> from sapphire import transport
+    >>> transport.set_http_client(transport.HTTPClient(timeout=10, retries=5))
+
+The :func:`urlopen` and :func:`urlretrieve` functions mimic those from
+:mod:`urllib.request`, including the raised :class:`~urllib.error.HTTPError`
+and :class:`~urllib.error.URLError` exceptions.
+
+"""
+
+import base64
+import gzip
+import http.client
+import io
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from urllib.error import HTTPError, URLError
+from urllib.parse import unquote, urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass_environment
+
+#: Default timeout in seconds for connecting and reading from the server.
+DEFAULT_TIMEOUT = 60
+
+#: Default number of times a failed request is retried.
+DEFAULT_RETRIES = 2
+
+#: Default delay in seconds before the first retry, the delay doubles for
+#: each following retry.
+DEFAULT_BACKOFF = 0.5
+
+#: Maximum number of idle connections kept open per server.
+DEFAULT_MAX_CONNECTIONS = 10
+
+#: Response status codes for which a request is retried.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+#: Errors for which a request is retried, other errors are raised at once.
+RETRY_ERRORS = (
+    socket.timeout,
+    TimeoutError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+    http.client.IncompleteRead,
+)
+
+#: Response status codes of redirects which are followed.
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+#: Maximum number of redirects followed for a single request.
+MAX_REDIRECTS = 5
+
+_shared = {'client': None}
+_shared_lock = threading.Lock()
+
+
+def get_http_client():
+    """Get the shared HTTP client
+
+    :return: the :class:`HTTPClient` used for all requests, created with
+             the default settings on first use.
+
+    """
+    with _shared_lock:
+        if _shared['client'] is None:
+            _shared['client'] = HTTPClient()
+        return _shared['client']
+
+
+def set_http_client(client):
+    """Replace the shared HTTP client
+
+    :param client: :class:`HTTPClient` instance (or an object with the same
+                   :meth:`~HTTPClient.open` method) to use for all requests,
+                   None to return to a client with the default settings.
+
+    """
+    with _shared_lock:
+        previous, _shared['client'] = _shared['client'], client
+    if previous is not None and previous is not client:
+        previous.close()
+
+
+def urlopen(url, timeout=None, retries=None):
+    """Open a URL using the shared HTTP client
+
+    :param url: the url to open.
+    :param timeout: timeout in seconds, None to use the client default.
+    :param retries: number of retries, None to use the client default.
+    :return: binary file-like object with the response body.
+
+    """
+    return get_http_client().open(url, timeout=timeout, retries=retries)
+
+
+def urlretrieve(url, filename=None):
+    """Download a URL to a file using the shared HTTP client
+
+    :param url: the url to download.
+    :param filename: path of the destination file, if None a temporary
+                     file is created.
+    :return: tuple of the path to the file and the response headers.
+
+    """
+    with urlopen(url) as response:
+        if filename is None:
+            with tempfile.NamedTemporaryFile(delete=False) as file:
+                filename = file.name
+                shutil.copyfileobj(response, file)
+        else:
+            with open(filename, 'wb') as file:
+                shutil.copyfileobj(response, file)
+    return filename, response.headers
+
+
+class HTTPClient:
+    """HTTP client with a pool of keep-alive connections per server
+
+    The client can safely be used from multiple threads, each request uses
+    a connection which is not in use by other requests.
+
+    :param timeout: timeout in seconds for connecting and reading.
+    :param retries: number of times a request is retried after one of the
+                    :data:`RETRY_ERRORS` or a response with one of the
+                    :data:`RETRY_STATUSES`.
+    :param backoff: delay in seconds before the first retry, the delay
+                    doubles for each following retry.
+    :param gzip: if True request gzip compressed responses, compressed
+                 responses are decompressed while reading.
+    :param max_connections: maximum number of idle connections kept open
+                            per server.
+    :param proxies: dictionary mapping url schemes to proxy urls, with the
+                    same format as :func:`urllib.request.getproxies`.  If
+                    None, the proxies configured in the environment are
+                    used.
+
+    """
+
+    def __init__(
+        self,
+        timeout=DEFAULT_TIMEOUT,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        gzip=True,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        proxies=None,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.gzip = gzip
+        self.max_connections = max_connections
+        self.proxies = getproxies() if proxies is None else proxies
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def open(self, url, timeout=None, retries=None):
+        """Get a URL
+
+        Redirects are followed.
+
+        :param url: the url to get.
+        :param timeout: timeout in seconds, None to use the client default.
+        :param retries: number of retries, None to use the client default.
+        :return: :class:`Response` with the response body.
+        :raises urllib.error.HTTPError: if the response has an error status.
+        :raises urllib.error.URLError: if no response could be received.
+
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if retries is None:
+            retries = self.retries
+
+        for _ in range(MAX_REDIRECTS + 1):
+            scheme = urlsplit(url).scheme
+            if scheme not in ('http', 'https'):
+                raise URLError(f'Unsupported url scheme: {scheme}')
+            response = self._open_with_retries(url, timeout, retries)
+            if response.status in REDIRECT_STATUSES and response.headers.get('Location'):
+                response.read()
+                response.close()
+                url = urljoin(url, response.headers['Location'])
+            elif response.status >= 400:
+                raise HTTPError(url, response.status, response.reason, response.headers, response)
+            else:
+                return response
+        raise URLError(f'Too many redirects for the url: {url}')
+
+    def _open_with_retries(self, url, timeout, retries):
+        """Get a URL, retrying after some errors with increasing delays"""
+
+        for attempt in range(retries + 1):
+            try:
+                response = self._open(url, timeout)
+            except (OSError, http.client.HTTPException) as error:
+                if attempt == retries or not isinstance(error, RETRY_ERRORS):
+                    if isinstance(error, URLError):
+                        raise
+                    raise URLError(error) from error
+            else:
+                if response.status not in RETRY_STATUSES or attempt == retries:
+                    return response
+                response.close()
+            time.sleep(self.backoff * 2**attempt)
+
+    def _open(self, url, timeout):
+        """Send a single request, on an idle connection if available"""
+
+        parts = urlsplit(url)
+        proxy = self._get_proxy(parts)
+        key = (parts.scheme, parts.netloc, proxy)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = {'Accept-Encoding': 'gzip' if self.gzip else 'identity'}
+        if proxy is not None and parts.scheme == 'http':
+            # Send the complete url to the proxy
+            path = f'http://{parts.netloc}{path}'
+            headers.update(self._proxy_headers(proxy))
+
+        connection = self._get_idle_connection(key)
+        if connection is not None:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                return self._request(key, connection, path, headers, url)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed the idle connection, use a new one
+                pass
+
+        # Connect to the proxy instead of the server, without credentials
+        netloc = parts.netloc if proxy is None else urlsplit(proxy).netloc.rpartition('@')[2]
+        if parts.scheme == 'https':
+            connection = http.client.HTTPSConnection(netloc, timeout=timeout)
+            if proxy is not None:
+                # Tunnel the encrypted connection through the proxy
+                connection.set_tunnel(parts.netloc, headers=self._proxy_headers(proxy))
+        else:
+            connection = http.client.HTTPConnection(netloc, timeout=timeout)
+        return self._request(key, connection, path, headers, url)
+
+    def _get_proxy(self, parts):
+        """Get the url of the proxy to use for a url, None for no proxy"""
+
+        proxy = self.proxies.get(parts.scheme)
+        if not proxy or proxy_bypass_environment(parts.hostname or '', self.proxies):
+            return None
+        if '://' not in proxy:
+            proxy = 'http://' + proxy
+        return proxy
+
+    @staticmethod
+    def _proxy_headers(proxy):
+        """Get the headers to authenticate with a proxy"""
+
+        proxy = urlsplit(proxy)
+        if proxy.username is None:
+            return {}
+        credentials = f'{unquote(proxy.username)}:{unquote(proxy.password or "")}'
+        return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode()).decode('ascii')}
+
+    def _request(self, key, connection, path, headers, url):
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+        except BaseException:
+            connection.close()
+            raise
+        return Response(_Body(self, key, connection, response), response, url)
+
+    def _get_idle_connection(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def _release(self, key, connection):
+        """Return a connection to the pool after its response was read"""
+
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """Close all idle connections"""
+
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}(timeout={self.timeout!r}, retries={self.retries!r}, '
+            f'backoff={self.backoff!r}, gzip={self.gzip!r}, max_connections={self.max_connections!r})'
+        )
+
+
+class _Body(io.RawIOBase):
+    """Raw stream of a response body
+
+    Decompresses gzip encoded bodies.  When the body has been read
+    completely the connection is returned to the pool of the client.
+
+    """
+
+    def __init__(self, client, key, connection, response):
+        self.client = client
+        self.key = key
+        self.connection = connection
+        self.response = response
+        if response.getheader('Content-Encoding', '').lower() == 'gzip':
+            self.stream = gzip.GzipFile(fileobj=response)
+        else:
+            self.stream = response
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.connection is None:
+            return 0
+        data = self.stream.read(len(buffer))
+        buffer[: len(data)] = data
+        if not data:
+            self._release()
+        return len(data)
+
+    def _release(self):
+        connection, self.connection = self.connection, None
+        if connection is None:
+            return
+        if self.response.isclosed() and not self.response.will_close:
+            self.client._release(self.key, connection)
+        else:
+            connection.close()
+
+    def close(self):
+        self._release()
+        super().close()
+
+
+class Response(io.BufferedReader):
+    """Buffered binary file-like object with a response body
+
+    .. attribute:: status
+
+        the HTTP status code of the response.
+
+    .. attribute:: reason
+
+        the reason phrase of the response status.
+
+    .. attribute:: headers
+
+        the response headers, a :class:`http.client.HTTPMessage`.
+
+    .. attribute:: url
+
+        the requested url.
+
+    """
+
+    def __init__(self, body, response, url):
+        super().__init__(body)
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.url = url
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self.url
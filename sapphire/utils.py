@@ -10,7 +10,7 @@ from distutils.spawn import find_executable
 from functools import wraps
 from os import environ
 
-from numpy import arcsin, ceil, floor, pi, round, sin, sqrt
+from numpy import arcsin, ceil, floor, maximum, pi, round, searchsorted, sin, sqrt
 from progressbar import ETA, Bar, Percentage, ProgressBar
 from scipy.stats import norm
 
@@ -96,6 +96,22 @@ def get_active_index(values, value):
     return idx - 1
 
 
+def get_active_indices(values, new_values):
+    """Get the indices where the values fit.
+
+    Vectorized version of :func:`get_active_index`, the values are
+    looked up in a single pass.
+
+    :param values: sorted list of values (e.g. list of timestamps).
+    :param new_values: array of values for which to find the positions
+        (e.g. the timestamps of events).
+    :return: array of indices into the values list.
+
+    """
+    idx = searchsorted(values, new_values, side='right')
+    return maximum(idx, 1) - 1
+
+
 def gauss(x, n, mu, sigma):
     """Gaussian distribution
 
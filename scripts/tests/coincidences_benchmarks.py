@@ -0,0 +1,105 @@
+"""Compare the previous loop and the array based coincidence search
+
+Synthetic event timestamps for a number of stations are merged and
+searched for coincidences using the sorted list of tuples and nested loop
+previously used by :class:`sapphire.analysis.coincidences.Coincidences`,
+and using the array engine
+(:meth:`~sapphire.analysis.coincidences.Coincidences._retrieve_timestamp_array`
+and :meth:`~sapphire.analysis.coincidences.Coincidences._search_coincidence_arrays`).
+Both are checked to find the same coincidences.
+
+"""
+
+import time
+
+import numpy as np
+
+from sapphire.analysis.coincidences import Coincidences
+
+N_STATIONS = 20
+N_EVENTS = 20_000
+WINDOW = 10_000
+
+
+class EventTable:
+    """Stand-in for an events table with only timestamps"""
+
+    def __init__(self, ext_timestamps):
+        self.ext_timestamps = ext_timestamps
+
+    def col(self, name):
+        return self.ext_timestamps
+
+
+def create_event_tables(seed):
+    """Create event tables with a trigger rate of about 1 Hz per station
+
+    A tenth of the events are caused by showers detected by several
+    stations within a few microseconds.
+
+    """
+    rng = np.random.default_rng(seed)
+    start = 1_700_000_000 * 1_000_000_000
+    duration = N_EVENTS * 1_000_000_000
+    showers = start + rng.integers(0, duration, N_EVENTS // 5)
+    event_tables = []
+    for _ in range(N_STATIONS):
+        shower_events = rng.choice(showers, N_EVENTS // 10, replace=False) + rng.integers(0, 3_000, N_EVENTS // 10)
+        single_events = start + rng.integers(0, duration, N_EVENTS - N_EVENTS // 10)
+        event_tables.append(EventTable(np.sort(np.concatenate([shower_events, single_events])).astype(np.uint64)))
+    return event_tables
+
+
+def retrieve_timestamps_loop(event_tables):
+    timestamps = []
+    for s_id, event_table in enumerate(event_tables):
+        timestamps.extend((x, s_id, j) for j, x in enumerate(event_table.col('ext_timestamp')))
+    timestamps.sort()
+    return timestamps
+
+
+def search_coincidences_loop(timestamps, window):
+    coincidences = []
+    prev_coincidence = []
+    for i in range(len(timestamps)):
+        c = [i]
+        t0 = timestamps[i][0]
+        for j in range(i + 1, len(timestamps)):
+            if timestamps[j][0] - t0 < window:
+                c.append(j)
+            else:
+                break
+        if len(c) > 1:
+            is_part_of_prev = np.array([u in prev_coincidence for u in c]).all()
+            if not is_part_of_prev:
+                coincidences.append(c)
+                prev_coincidence = c
+    return coincidences
+
+
+def main():
+    event_tables = create_event_tables(0)
+
+    t0 = time.time()
+    timestamps = retrieve_timestamps_loop(event_tables)
+    coincidences = search_coincidences_loop(timestamps, WINDOW)
+    t_loop = time.time() - t0
+
+    coin = Coincidences.__new__(Coincidences)
+
+    t0 = time.time()
+    timestamp_array = coin._retrieve_timestamp_array(event_tables)
+    offsets, indices = coin._search_coincidence_arrays(timestamp_array['timestamp'], WINDOW)
+    t_arrays = time.time() - t0
+
+    assert timestamp_array.tolist() == timestamps
+    assert [indices[start:stop].tolist() for start, stop in zip(offsets[:-1], offsets[1:])] == coincidences
+
+    print(f'{N_STATIONS * N_EVENTS} events, {len(coincidences)} coincidences')
+    print(f'Loop:    {t_loop:6.2f} s')
+    print(f'Arrays:  {t_arrays:6.2f} s')
+    print(f'Speedup: {t_loop / t_arrays:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
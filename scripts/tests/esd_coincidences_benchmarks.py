@@ -0,0 +1,104 @@
+"""Compare storing ESD coincidences one by one and in batches
+
+Create synthetic coincidences and store them, once per coincidence using
+:func:`sapphire.esd._read_lines_and_store_coincidence` with a flush after
+each coincidence (the previous behaviour of
+:func:`sapphire.esd.download_coincidences`), and once in batches using
+:class:`sapphire.esd.ReadLinesAndStoreCoincidenceClass`.  Both results are
+checked to be identical.
+
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import tables
+
+from sapphire import esd
+
+N_COINCIDENCES = 100_000
+STATIONS = [501, 502, 503, 504, 505, 506, 508, 509, 510, 511]
+
+
+def create_coincidences(n_coincidences):
+    coincidences = []
+    timestamps = 1_457_568_000 + np.sort(np.random.randint(0, 86400, n_coincidences))
+    for coincidence_id, timestamp in enumerate(timestamps):
+        n = np.random.randint(2, 5)
+        stations = sorted(np.random.choice(STATIONS, n, replace=False))
+        nanoseconds = np.random.randint(0, 999_000_000)
+        coincidence = []
+        for station in stations:
+            event = [str(coincidence_id), str(station), '2016-03-10', '00:00:00', str(timestamp)]
+            event.append(str(nanoseconds + np.random.randint(0, 1000)))
+            event.extend(str(v) for v in np.random.randint(0, 2000, 8))
+            event.extend(str(v) for v in np.round(np.random.random(4) * 5, 4))
+            event.extend(str(v) for v in np.random.randint(0, 40, 5) * 2.5)
+            event.extend(['-999', '-999'])
+            coincidence.append(event)
+        coincidences.append(coincidence)
+    return coincidences
+
+
+def create_file(path):
+    data = tables.open_file(path, 'w')
+    station_groups = {
+        station: {'group': '/station_%d' % station, 's_index': s_index} for s_index, station in enumerate(STATIONS)
+    }
+    c_group = esd._create_coincidences_tables(data, '', station_groups)
+    return data, c_group, station_groups
+
+
+def store_per_coincidence(path, coincidences):
+    data, c_group, station_groups = create_file(path)
+    for coincidence in coincidences:
+        esd._read_lines_and_store_coincidence(data, c_group, coincidence, station_groups)
+        data.flush()
+    return data
+
+
+def store_in_batches(path, coincidences):
+    data, c_group, station_groups = create_file(path)
+    with esd.ReadLinesAndStoreCoincidenceClass(data, c_group, station_groups) as writer:
+        for coincidence in coincidences:
+            writer.store_coincidence(coincidence)
+    return data
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    per_coincidence_path = os.path.join(tmp_dir, 'per_coincidence.h5')
+    batches_path = os.path.join(tmp_dir, 'batches.h5')
+    coincidences = create_coincidences(N_COINCIDENCES)
+
+    t0 = time.time()
+    per_coincidence = store_per_coincidence(per_coincidence_path, coincidences)
+    t_per_coincidence = time.time() - t0
+
+    t0 = time.time()
+    batches = store_in_batches(batches_path, coincidences)
+    t_batches = time.time() - t0
+
+    assert (per_coincidence.root.coincidences.coincidences.read() == batches.root.coincidences.coincidences.read()).all()
+    for expected, actual in zip(per_coincidence.root.coincidences.c_index, batches.root.coincidences.c_index):
+        assert (expected == actual).all()
+    for station in STATIONS:
+        group = '/station_%d/events' % station
+        assert (per_coincidence.get_node(group).read() == batches.get_node(group).read()).all()
+    per_coincidence.close()
+    batches.close()
+
+    print(f'Storing {N_COINCIDENCES} coincidences')
+    print(f'Per coincidence: {t_per_coincidence:.2f} s ({N_COINCIDENCES / t_per_coincidence:.0f} coincidences/s)')
+    print(f'In batches:      {t_batches:.2f} s ({N_COINCIDENCES / t_batches:.0f} coincidences/s)')
+    print(f'Speedup:         {t_per_coincidence / t_batches:.1f}x')
+
+    os.remove(per_coincidence_path)
+    os.remove(batches_path)
+    os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Compare the per-line and block ingest of ESD event data
+
+Create a synthetic events TSV file and load it into a PyTables file,
+once line by line using
+:meth:`sapphire.esd.ReadLineAndStoreEventClass.store_line`, and once in
+blocks using :func:`sapphire.esd.load_data`.  Both results are checked to
+be identical.
+
+"""
+
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+import tables
+
+from sapphire import esd
+
+N_EVENTS = 100_000
+
+
+def create_events_tsv(path, n_events):
+    timestamps = 1_325_376_000 + np.sort(np.random.randint(0, 86400, n_events))
+    with open(path, 'w') as tsv:
+        tsv.write('# Event Summary Data\n#\n')
+        for timestamp in timestamps:
+            ph = np.random.randint(0, 2000, 4)
+            integrals = np.random.randint(0, 30000, 4)
+            n = np.round(np.random.random(4) * 5, 4)
+            t = np.random.randint(0, 40, 4) * 2.5
+            tsv.write(
+                '2012-01-01\t00:00:00\t%d\t%d\t%s\t%s\t%s\t%s\t%.1f\t-999\t-999\n'
+                % (
+                    timestamp,
+                    np.random.randint(0, 1_000_000_000),
+                    '\t'.join(str(v) for v in ph),
+                    '\t'.join(str(v) for v in integrals),
+                    '\t'.join(str(v) for v in n),
+                    '\t'.join(str(v) for v in t),
+                    t.max(),
+                ),
+            )
+        tsv.write('# Finished downloading.')
+
+
+def load_per_line(data, tsv_path):
+    table = esd._create_events_table(data, '/per_line')
+    with open(tsv_path) as tsv, esd.ReadLineAndStoreEventClass(table) as writer:
+        for line in csv.reader(tsv, delimiter='\t'):
+            writer.store_line(line)
+    return table
+
+
+def load_per_block(data, tsv_path):
+    esd.load_data(data, '/per_block', tsv_path, 'events')
+    return data.get_node('/per_block/events')
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    tsv_path = os.path.join(tmp_dir, 'events.tsv')
+    h5_path = os.path.join(tmp_dir, 'events.h5')
+    create_events_tsv(tsv_path, N_EVENTS)
+
+    with tables.open_file(h5_path, 'w') as data:
+        t0 = time.time()
+        per_line = load_per_line(data, tsv_path)
+        t_line = time.time() - t0
+
+        t0 = time.time()
+        per_block = load_per_block(data, tsv_path)
+        t_block = time.time() - t0
+
+        assert (per_line.read() == per_block.read()).all()
+
+    print(f'Loading {N_EVENTS} events')
+    print(f'Per line:  {t_line:.2f} s ({N_EVENTS / t_line:.0f} events/s)')
+    print(f'Per block: {t_block:.2f} s ({N_EVENTS / t_block:.0f} events/s)')
+    print(f'Speedup:   {t_line / t_block:.1f}x')
+
+    os.remove(tsv_path)
+    os.remove(h5_path)
+    os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
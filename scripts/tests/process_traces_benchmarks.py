@@ -0,0 +1,104 @@
+"""Compare the per-trace and the block methods of MeanFilter and DataReduction
+
+Synthetic raw traces are filtered using the per-sample loops of
+:meth:`sapphire.analysis.process_traces.MeanFilter.filter_trace` and the
+array kernels of
+:meth:`sapphire.analysis.process_traces.MeanFilter.filter_trace_block`.
+Similarly, events are data reduced one by one using
+:meth:`~sapphire.analysis.process_traces.DataReduction.reduce_traces` and
+in blocks using
+:meth:`~sapphire.analysis.process_traces.DataReduction.reduce_trace_block`.
+
+The block methods process all N_TRACES traces.  The per-trace methods are
+much slower, so they are timed on the first LOOP_TRACES traces and the
+throughput is compared.  Both are checked to give the same results.
+
+"""
+
+import time
+
+import numpy as np
+
+from sapphire.analysis.process_traces import DataReduction, MeanFilter
+
+N_TRACES = 100_000
+N_SAMPLES = 2400
+N_DETECTORS = 4
+BLOCK_SIZE = 4_000
+LOOP_TRACES = 1_000
+
+
+def create_traces(n_traces, seed):
+    """Create raw traces with noise, an even/odd offset and a pulse"""
+
+    rng = np.random.default_rng(seed)
+    traces = 200 + rng.normal(0, 2, (n_traces, N_SAMPLES)).round().astype(np.int16)
+    traces[:, ::2] += 3
+    starts = rng.integers(400, 800, n_traces)
+    heights = rng.exponential(200, n_traces)
+    pulse = np.exp(-np.arange(40) / 10)
+    for trace, start, height in zip(traces, starts, heights):
+        trace[start : start + 40] += (height * pulse).astype(np.int16)
+    return traces
+
+
+def benchmark_mean_filter(mean_filter):
+    t_block = 0
+    for start in range(0, N_TRACES, BLOCK_SIZE):
+        traces = create_traces(BLOCK_SIZE, start)
+        t0 = time.time()
+        filtered = mean_filter.filter_trace_block(traces)
+        t_block += time.time() - t0
+        if start == 0:
+            expected_filtered = filtered[:LOOP_TRACES]
+            loop_traces = traces[:LOOP_TRACES]
+
+    t0 = time.time()
+    loop_filtered = [mean_filter.filter_trace(trace) for trace in loop_traces]
+    t_loop = time.time() - t0
+    assert (np.array(loop_filtered) == expected_filtered).all()
+
+    return t_loop, t_block
+
+
+def benchmark_data_reduction(data_reduction):
+    n_events = BLOCK_SIZE // N_DETECTORS
+    loop_events = LOOP_TRACES // N_DETECTORS
+    t_block = 0
+    for start in range(0, N_TRACES, BLOCK_SIZE):
+        traces = create_traces(BLOCK_SIZE, start).reshape(n_events, N_DETECTORS, N_SAMPLES).transpose(0, 2, 1)
+        t0 = time.time()
+        reduced, left = data_reduction.reduce_trace_block(traces)
+        t_block += time.time() - t0
+        if start == 0:
+            expected = list(zip(reduced[:loop_events], left[:loop_events]))
+            loop_traces = traces[:loop_events]
+
+    t0 = time.time()
+    loop_reduced = [data_reduction.reduce_traces(event_traces, return_offset=True) for event_traces in loop_traces]
+    t_loop = time.time() - t0
+    for (reduced, left), (expected_reduced, expected_left) in zip(loop_reduced, expected):
+        assert left == expected_left
+        assert (reduced == expected_reduced).all()
+
+    return t_loop, t_block
+
+
+def print_result(name, t_loop, t_block):
+    loop_rate = LOOP_TRACES / t_loop
+    block_rate = N_TRACES / t_block
+    print(f'{name}:')
+    print(f'    per trace: {LOOP_TRACES:7d} traces in {t_loop:6.2f} s ({loop_rate:8.0f} traces/s)')
+    print(f'    in blocks: {N_TRACES:7d} traces in {t_block:6.2f} s ({block_rate:8.0f} traces/s)')
+    print(f'    speedup:   {block_rate / loop_rate:.0f}x')
+
+
+def main():
+    print(f'Traces of {N_SAMPLES} samples, blocks of {BLOCK_SIZE} traces')
+    print_result('MeanFilter with threshold', *benchmark_mean_filter(MeanFilter(use_threshold=True)))
+    print_result('MeanFilter without threshold', *benchmark_mean_filter(MeanFilter(use_threshold=False)))
+    print_result('DataReduction', *benchmark_data_reduction(DataReduction()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Compare reading traces from the blobs and from the binary trace store
+
+Create a file with synthetic traces stored as zlib compressed CSV blobs,
+like the data from the public database, and convert them into a binary
+trace store using :func:`sapphire.analysis.trace_store.create_trace_store`.
+The decode throughput and the file sizes of both formats are compared.
+Both formats are checked to contain the same traces.
+
+"""
+
+import os
+import tempfile
+import time
+import zlib
+
+import numpy as np
+import tables
+
+from sapphire.analysis import trace_store
+
+N_EVENTS = 5_000
+N_SAMPLES = 2400
+BATCH_SIZE = 400
+
+
+class Event(tables.IsDescription):
+    traces = tables.Int32Col(shape=4, dflt=-1)
+
+
+def create_blobs_file(path, n_events):
+    """Create a file with a blobs array and an events table"""
+
+    rng = np.random.default_rng(0)
+    filters = tables.Filters(complevel=9, complib='blosc', shuffle=True)
+    with tables.open_file(path, 'w', filters=filters) as data:
+        group = data.create_group('/', 'station_501', createparents=True)
+        blobs = data.create_vlarray(group, 'blobs', tables.VLStringAtom(), 'HiSPARC binary data')
+        events = data.create_table(group, 'events', Event)
+        for event_id in range(n_events):
+            for _ in range(4):
+                trace = 200 + rng.normal(0, 1.5, N_SAMPLES).round().astype(int)
+                start = rng.integers(400, 800)
+                trace[start : start + 40] += (rng.exponential(300) * np.exp(-np.arange(40) / 10)).astype(int)
+                blobs.append(zlib.compress(','.join(str(value) for value in trace).encode()))
+            events.row['traces'] = np.arange(4) + 4 * event_id
+            events.row.append()
+        events.flush()
+
+
+def read_from_blobs(group, indices):
+    blobs = group.blobs
+    return [trace_store.decode_trace(blobs[idx]) for idx in indices]
+
+
+def read_from_store(group, indices):
+    store = trace_store.TraceStore(group)
+    return [store[idx] for idx in indices]
+
+
+def read_batches_from_store(group, indices):
+    store = trace_store.TraceStore(group)
+    traces = []
+    for start in range(0, len(indices), BATCH_SIZE):
+        traces.extend(store.read_traces(indices[start : start + BATCH_SIZE]))
+    return traces
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    blobs_path = os.path.join(tmp_dir, 'blobs.h5')
+    store_path = os.path.join(tmp_dir, 'store.h5')
+    create_blobs_file(blobs_path, N_EVENTS)
+    blobs_size = os.path.getsize(blobs_path)
+
+    with tables.open_file(blobs_path, 'a') as data:
+        t0 = time.time()
+        trace_store.create_trace_store(data, '/station_501', progress=False)
+        t_convert = time.time() - t0
+
+        # Copy the trace store to a separate file to determine its size
+        with tables.open_file(store_path, 'w') as store_data:
+            group = store_data.create_group('/', 'station_501')
+            for name in ['events', trace_store.SAMPLES_NODE, trace_store.INDEX_NODE]:
+                data.get_node('/station_501', name).copy(group)
+
+    with tables.open_file(blobs_path, 'r') as data, tables.open_file(store_path, 'r') as store_data:
+        indices = np.arange(4 * N_EVENTS)
+        timings = {}
+        for name, func, group in [
+            ('Blobs', read_from_blobs, data.root.station_501),
+            ('Store, per trace', read_from_store, store_data.root.station_501),
+            ('Store, batches', read_batches_from_store, store_data.root.station_501),
+        ]:
+            t0 = time.time()
+            traces = func(group, indices)
+            timings[name] = (time.time() - t0, traces)
+
+        expected = timings['Blobs'][1]
+        for _, traces in timings.values():
+            assert all((trace == expected_trace).all() for trace, expected_trace in zip(traces, expected))
+
+    print(f'Reading {len(indices)} traces of {N_SAMPLES} samples')
+    for name, (duration, _) in timings.items():
+        print(f'{name + ":":18} {duration:.2f} s ({len(indices) / duration:.0f} traces/s)')
+    print(f'Conversion:        {t_convert:.2f} s')
+    print(f'Blobs file size:   {blobs_size / 1e6:.1f} MB')
+    print(f'Store file size:   {os.path.getsize(store_path) / 1e6:.1f} MB')
+
+    os.remove(blobs_path)
+    os.remove(store_path)
+    os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()